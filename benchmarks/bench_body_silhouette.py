@@ -0,0 +1,72 @@
+# benchmarks/bench_body_silhouette.py
+# Uso: python -m benchmarks.bench_body_silhouette
+import time
+from io import BytesIO
+import cv2
+import numpy as np
+from PIL import Image
+
+import utils.body_silhouette as silhouette
+
+
+def make_body_photo(width: int, height: int, shoulders: float, waist: float, hips: float, seed: int = 0) -> bytes:
+    """JPEG sintético: figura (cabeza + cuello + torso + piernas) sobre fondo liso con ruido."""
+    rng = np.random.default_rng(seed)
+    pixels = np.full((height, width, 3), (225, 222, 215), np.uint8)
+    cx = width // 2
+    top, bottom = int(height * 0.06), int(height * 0.96)
+    span = bottom - top
+
+    def y(f: float) -> int:
+        return top + int(f * span)
+
+    color = (60, 70, 120)
+    cv2.ellipse(pixels, (cx, y(0.07)), (int(span * 0.05), int(span * 0.07)), 0, 0, 360, color, -1)
+    cv2.rectangle(pixels, (cx - int(span * 0.025), y(0.12)), (cx + int(span * 0.025), y(0.19)), color, -1)
+    outline = np.array([
+        (cx - shoulders / 2, y(0.18)), (cx - waist / 2, y(0.42)), (cx - hips / 2, y(0.54)),
+        (cx - hips / 2.6, y(1.0)), (cx + hips / 2.6, y(1.0)),
+        (cx + hips / 2, y(0.54)), (cx + waist / 2, y(0.42)), (cx + shoulders / 2, y(0.18)),
+    ], np.int32)
+    cv2.fillPoly(pixels, [outline], color)
+    pixels = np.clip(pixels + rng.normal(0, 5, pixels.shape), 0, 255).astype(np.uint8)
+
+    buffer = BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def measure(fn, runs: int = 10) -> float:
+    fn()
+    start = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    return (time.perf_counter() - start) / runs * 1000
+
+
+def main():
+    w, h = 3000, 4000
+    shapes = [(900, 600, 820), (800, 620, 700), (1000, 560, 1000), (700, 520, 640)]
+    photos = [make_body_photo(w, h, *shape, seed=i) for i, shape in enumerate(shapes)]
+    print(f"12MP JPEG inputs: {len(photos)} x ~{len(photos[0]) / 1e6:.1f} MB\n")
+
+    for (s, wa, hi), data in zip(shapes, photos):
+        result = silhouette.analyze_silhouette_bytes(data)
+        m = result["estimated_measurements"] if result else {}
+        print(f"  expected s/w {s / wa:.2f} h/w {hi / wa:.2f} -> measured s/w {m.get('shoulders')} h/w {m.get('hips')}")
+
+    ms = measure(lambda: silhouette.load_rgb(photos[0]))
+    print(f"\n  {'decode (draft -> 256 px)':<34} {ms:8.1f} ms")
+
+    rgbs = [silhouette.load_rgb(p) for p in photos]
+    for method in ("threshold", "grabcut"):
+        ms = measure(lambda: silhouette.analyze_silhouette(rgbs[0], method), runs=5)
+        print(f"  {f'analyze ({method})':<34} {ms:8.1f} ms")
+
+    batch = rgbs * 8
+    ms = measure(lambda: silhouette.analyze_silhouettes(batch, "threshold"), runs=5)
+    print(f"  {f'batch x{len(batch)} (threshold)':<34} {ms / len(batch):8.1f} ms/img")
+
+
+if __name__ == "__main__":
+    main()
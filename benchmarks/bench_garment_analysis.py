@@ -0,0 +1,105 @@
+# benchmarks/bench_garment_analysis.py
+# Uso: python -m benchmarks.bench_garment_analysis [--live] [--runs 3] [--image prenda.jpg]
+#
+# Compara la imagen que recibe el modelo de visión al analizar una prenda:
+# payload (bytes del data URL) y tiempo de preparación siempre; con --live
+# (requiere OPENAI_API_KEY) también latencia y tokens de entrada reales.
+import os
+import time
+import base64
+import asyncio
+import argparse
+
+from benchmarks.bench_image_ingest import make_photo
+import utils.image_ingest as ingest
+
+PROMPT = (
+    "Analyze this clothing item for virtual try-on.\n"
+    "Describe ONLY visual characteristics.\n"
+    "MANDATORY: include garment type and EXACT main color.\n"
+    "Include fit/model, length, sleeves, neckline, texture or pattern.\n"
+    "Do NOT invent colors.\n"
+    "Do NOT mention brand, price, person or background."
+)
+
+# (etiqueta, tamaño, formato, detail); tamaño None = bytes del cliente sin tocar
+CONFIGS = [
+    ("before web (raw, auto)", None, None, "auto"),
+    ("before mobile (1024 png, auto)", 1024, "png", "auto"),
+    ("512 jpeg, high", 512, "jpeg", "high"),
+    ("512 jpeg, low", 512, "jpeg", "low"),
+    ("512 webp, low", 512, "webp", "low"),
+    ("384 jpeg, low", 384, "jpeg", "low"),
+]
+
+
+def prepare(data: bytes, size: int | None, fmt: str | None) -> str:
+    """Data URL tal como se envía en input_image."""
+    if size is None:
+        return f"data:image/jpeg;base64,{base64.b64encode(data).decode('utf-8')}"
+    tile = ingest.normalize_image(data, size, "fit", fmt)
+    return f"data:{ingest.image_mime(fmt)};base64,{base64.b64encode(tile).decode('utf-8')}"
+
+
+def measure_prepare(data: bytes, size: int | None, fmt: str | None, runs: int) -> tuple[float, str]:
+    url = prepare(data, size, fmt)
+    start = time.perf_counter()
+    for _ in range(runs):
+        prepare(data, size, fmt)
+    return (time.perf_counter() - start) / runs * 1000, url
+
+
+async def measure_live(client, url: str, detail: str, runs: int) -> tuple[float, int]:
+    latencies, tokens = [], 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        response = await client.responses.create(
+            model="gpt-4.1-mini",
+            input=[{
+                "role": "user",
+                "content": [
+                    {"type": "input_text", "text": PROMPT},
+                    {"type": "input_image", "image_url": url, "detail": detail},
+                ]
+            }]
+        )
+        latencies.append((time.perf_counter() - start) * 1000)
+        tokens = response.usage.input_tokens
+    return sorted(latencies)[len(latencies) // 2], tokens
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Garment analysis image size / detail benchmark")
+    parser.add_argument("--live", action="store_true", help="call the vision model (needs OPENAI_API_KEY)")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--image", help="garment photo to use instead of a synthetic 12MP JPEG")
+    args = parser.parse_args()
+
+    if args.image:
+        with open(args.image, "rb") as f:
+            data = f.read()
+    else:
+        data = make_photo(3000, 4000)
+    print(f"input: {len(data) / 1e6:.2f} MB")
+
+    client = None
+    if args.live:
+        from openai import AsyncOpenAI
+        client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+    header = f"  {'config':<32} {'prep ms':>8} {'payload KB':>11}"
+    print(header + (f" {'p50 ms':>8} {'in tokens':>10}" if client else ""))
+    for label, size, fmt, detail in CONFIGS:
+        prep_ms, url = measure_prepare(data, size, fmt, args.runs)
+        line = f"  {label:<32} {prep_ms:8.1f} {len(url) / 1024:11.1f}"
+        if client:
+            p50, tokens = await measure_live(client, url, detail, args.runs)
+            line += f" {p50:8.0f} {tokens:10d}"
+        print(line)
+
+    if client:
+        await client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,78 @@
+# benchmarks/bench_garment_colors.py
+# Uso: python -m benchmarks.bench_garment_colors
+import time
+from io import BytesIO
+import cv2
+import numpy as np
+from PIL import Image
+
+import utils.garment_colors as garment_colors
+
+
+def make_garment_photo(
+    color: tuple,
+    stripes: tuple | None = None,
+    plaid: bool = False,
+    width: int = 1200,
+    height: int = 1600,
+    seed: int = 0,
+) -> bytes:
+    """JPEG sintético tipo foto de producto: camiseta centrada sobre fondo claro."""
+    rng = np.random.default_rng(seed)
+    pixels = np.full((height, width, 3), (240, 240, 238), np.uint8)
+    outline = np.array([
+        (0.30, 0.15), (0.70, 0.15), (0.90, 0.30), (0.78, 0.38), (0.72, 0.33),
+        (0.72, 0.88), (0.28, 0.88), (0.28, 0.33), (0.22, 0.38), (0.10, 0.30),
+    ]) * (width, height)
+    mask = np.zeros((height, width), np.uint8)
+    cv2.fillPoly(mask, [outline.astype(np.int32)], 1)
+
+    garment = np.full((height, width, 3), color, np.uint8)
+    rows = (np.arange(height) // 30) % 2 == 1
+    cols = (np.arange(width) // 40) % 2 == 1
+    if stripes:
+        garment[rows] = stripes
+    if plaid:
+        garment[rows] = (garment[rows] * 0.5).astype(np.uint8)
+        garment[:, cols] = (garment[:, cols] * 0.6).astype(np.uint8)
+    pixels[mask == 1] = garment[mask == 1]
+    pixels = np.clip(pixels + rng.normal(0, 4, pixels.shape), 0, 255).astype(np.uint8)
+
+    buffer = BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def measure(fn, runs: int = 10) -> float:
+    fn()
+    start = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    return (time.perf_counter() - start) / runs * 1000
+
+
+def main():
+    garments = {
+        "red solid": make_garment_photo((200, 30, 35)),
+        "navy / white stripes": make_garment_photo((25, 35, 80), stripes=(245, 245, 245), seed=1),
+        "red / blue stripes": make_garment_photo((200, 30, 35), stripes=(40, 90, 200), seed=4),
+        "red plaid": make_garment_photo((200, 30, 35), plaid=True, seed=2),
+        "beige solid": make_garment_photo((215, 190, 150), seed=3),
+    }
+    photos = list(garments.values())
+
+    for label, result in zip(garments, garment_colors.analyze_garment_colors_bytes(photos)):
+        print(f"  {label:<22} -> {garment_colors.color_hint(result)}")
+
+    decoded = [garment_colors.load_garment_rgb(p) for p in photos]
+    ms_decode = measure(lambda: [garment_colors.load_garment_rgb(p) for p in photos])
+    ms_single = measure(lambda: [garment_colors.analyze_garment_colors([rgb]) for rgb in decoded])
+    ms_batch = measure(lambda: garment_colors.analyze_garment_colors(decoded))
+    print(f"\n{len(photos)} garments ({garment_colors.GARMENT_COLOR_SIZE}px)")
+    print(f"  decode (draft)        {ms_decode:8.1f} ms")
+    print(f"  analysis one by one   {ms_single:8.1f} ms")
+    print(f"  analysis batch        {ms_batch:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+# benchmarks/bench_garment_index.py
+# Uso: python -m benchmarks.bench_garment_index [n_items]
+import sys
+import time
+import random
+import numpy as np
+
+from utils.garment_index import GARMENT_COLOR_GRID, GarmentHashIndex
+
+
+def main(n_items: int = 300_000, n_queries: int = 2_000):
+    index = GarmentHashIndex(max_items=n_items)
+    rng = np.random.default_rng(0)
+    values = rng.integers(0, 2**63, size=n_items, dtype=np.int64).astype(np.uint64)
+    cells = GARMENT_COLOR_GRID ** 2
+    colors = rng.uniform([0, -80, -80], [100, 80, 80], size=(n_items, cells, 3)).reshape(n_items, -1).astype(np.float32)
+
+    start = time.perf_counter()
+    for i, value in enumerate(values):
+        index.add(int(value), colors[i], f"garment {i}")
+    build_s = time.perf_counter() - start
+
+    found = 0
+    start = time.perf_counter()
+    for i in range(n_queries):
+        item = random.randrange(n_items)
+        value = int(values[item])
+        for bit in random.sample(range(64), random.randint(0, index.threshold)):
+            value ^= 1 << bit
+        color = colors[item] + rng.normal(0, 2, colors.shape[1]).astype(np.float32)
+        found += index.lookup(value, color) is not None
+    lookup_ms = (time.perf_counter() - start) / n_queries * 1000
+
+    print(f"items={n_items} build={build_s:.2f}s")
+    print(f"near-dup lookups: {found}/{n_queries} found, {lookup_ms:.3f} ms/query")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 300_000)
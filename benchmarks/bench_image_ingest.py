@@ -0,0 +1,59 @@
+# benchmarks/bench_image_ingest.py
+# Uso: python -m benchmarks.bench_image_ingest
+import time
+from io import BytesIO
+import numpy as np
+from PIL import Image
+
+import utils.image_ingest as ingest
+
+
+def make_photo(width: int, height: int) -> bytes:
+    """JPEG sintético tipo foto de móvil: gradientes suaves + ruido de sensor."""
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([
+        128 + 100 * np.sin(x / width * 6.0),
+        128 + 100 * np.cos(y / height * 4.0),
+        128 + 60 * np.sin((x + y) / (width + height) * 10.0),
+    ], axis=-1)
+    noise = rng.normal(0, 6, size=(height, width, 3))
+    pixels = np.clip(base + noise, 0, 255).astype(np.uint8)
+    buffer = BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=92)
+    return buffer.getvalue()
+
+
+def baseline(data: bytes, size: int = 1024) -> bytes:
+    """Camino anterior: decode completo, thumbnail por defecto, PNG nivel 6."""
+    image = Image.open(BytesIO(data)).convert("RGB")
+    image.thumbnail((size, size))
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def measure(fn, data: bytes, runs: int = 5) -> tuple[float, int]:
+    out = fn(data)
+    start = time.perf_counter()
+    for _ in range(runs):
+        fn(data)
+    return (time.perf_counter() - start) / runs * 1000, len(out)
+
+
+def main():
+    for label, (w, h) in {"12MP": (4000, 3000), "48MP": (8000, 6000)}.items():
+        data = make_photo(w, h)
+        print(f"\n{label} JPEG input: {len(data) / 1e6:.1f} MB")
+
+        ms, size = measure(baseline, data)
+        print(f"  {'before (full decode, PNG lvl 6)':<34} {ms:8.1f} ms {size / 1e6:6.2f} MB")
+
+        for fmt in ("png", "jpeg", "webp"):
+            ms, size = measure(lambda d: ingest.normalize_image(d, 1024, "fit", fmt), data)
+            detail = f"lvl {ingest.IMAGE_PNG_COMPRESS_LEVEL}" if fmt == "png" else "q90"
+            print(f"  {f'after (draft, {fmt} {detail})':<34} {ms:8.1f} ms {size / 1e6:6.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,38 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from utils.upstream import init_upstream, close_upstream
+from utils.garment_cache import garment_cache
+from utils.garment_index import garment_index
+from utils.recommendation_cache import recommendation_cache
+from utils.outfit_prefetch import outfit_prefetcher
+from utils.jobs import job_manager
+from utils.image_ingest import shutdown_image_pool
+from utils.result_store import result_store
+from utils.base_image_store import base_image_store
+from utils.single_flight import single_flight_stats
+from utils.admission import admission_stats
+from utils.provider_router import provider_stats
+
+# =========================
+# Lifespan – shared upstream clients
+# =========================
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.upstream = await init_upstream()
+    await job_manager.start()
+    yield
+    await outfit_prefetcher.stop()
+    await job_manager.stop()
+    await close_upstream()
+    shutdown_image_pool()
+
 app = FastAPI(
     title="AI Outfit Backend",
     version="2.1",
-    description="AI Stylist + Clothing Analysis + Virtual Try-On (Demo)"
+    description="AI Stylist + Clothing Analysis + Virtual Try-On (Demo)",
+    lifespan=lifespan
 )
 
 # =========================
@@ -38,6 +66,9 @@ from routers.analyze_body_web import router as analyze_web_router
 from routers.generate_outfits_from_body_photo_web import router as body_photo_web_router
 from routers.image_to_image_web import router as image_to_image_web_router
 from routers.keep_alive import router as keep_alive_router
+from routers.jobs import router as jobs_router
+from routers.results import router as results_router
+from routers.base_images import router as base_images_router
 
 # =========================
 # Routers – CLOTHING ANALYSIS & TRY-ON (DEMO)
@@ -64,6 +95,9 @@ app.include_router(analyze_clothes_web_router, prefix="/api")
 app.include_router(generate_tryon_router, prefix="/api")
 app.include_router(generate_tryon_web_router, prefix="/api")
 app.include_router(keep_alive_router, prefix="/api")
+app.include_router(jobs_router, prefix="/api")
+app.include_router(results_router, prefix="/api")
+app.include_router(base_images_router, prefix="/api")
 
 # =========================
 # Root / Health
@@ -85,5 +119,14 @@ def health():
             "AI Stylist",
             "Clothing analysis (1–2 items)",
             "Virtual Try-On (demo)",
-        ]
+        ],
+        "garment_cache": garment_cache.stats(),
+        "garment_index": garment_index.stats() if garment_index is not None else None,
+        "recommendation_cache": recommendation_cache.stats(),
+        "outfit_prefetch": outfit_prefetcher.stats(),
+        "result_store": result_store.stats(),
+        "base_images": base_image_store.stats(),
+        "single_flight": single_flight_stats(),
+        "admission": admission_stats(),
+        "providers": provider_stats()
     }
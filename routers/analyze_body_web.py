@@ -1,9 +1,8 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from PIL import Image
-from io import BytesIO
-import base64
 from typing import Dict
+from utils.image_ingest import read_image_header_b64, thumbnail_size, run_image_task
+from utils.body_silhouette import BODY_ANALYZER, analyze_silhouette_bytes, apply_silhouette
 
 router = APIRouter()
 
@@ -25,8 +24,8 @@ def normalize_gender(value: str) -> str:
         return "female"
     return "female"
 
-def extract_body_features(image: Image.Image, gender: str) -> Dict:
-    width, height = image.size
+def extract_body_features(size: tuple[int, int], gender: str) -> Dict:
+    width, height = size
     aspect_ratio = round(height / width, 2)
 
     if aspect_ratio > 1.7:
@@ -66,17 +65,18 @@ async def analyze_body_web(request: AnalyzeBodyWebRequest):
     try:
         gender = normalize_gender(request.gender_hint)
         try:
-            image_bytes = base64.b64decode(request.image_base64)
+            # Solo cabecera: tamaño + orientación EXIF, sin decodificar píxeles
+            width, height = read_image_header_b64(request.image_base64)
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Invalid base64 image: {str(e)}")
 
-        image = Image.open(BytesIO(image_bytes)).convert("RGB")
-
         MAX_SIZE = 1024
-        if max(image.size) > MAX_SIZE:
-            image.thumbnail((MAX_SIZE, MAX_SIZE))
+        traits = extract_body_features(thumbnail_size(width, height, MAX_SIZE), gender)
 
-        traits = extract_body_features(image, gender)
+        if BODY_ANALYZER == "silhouette":
+            # Decodifica (reducida) y mide la silueta real en el pool de imágenes
+            silhouette = await run_image_task(analyze_silhouette_bytes, request.image_base64)
+            traits = apply_silhouette(traits, silhouette)
 
         return {
             "status": "ok",
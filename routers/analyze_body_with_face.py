@@ -1,7 +1,7 @@
 from fastapi import APIRouter, HTTPException, UploadFile, File, Form
-from PIL import Image
-from io import BytesIO
 from typing import Dict
+from utils.image_ingest import read_image_header, thumbnail_size, run_image_task
+from utils.body_silhouette import BODY_ANALYZER, analyze_silhouette_bytes, apply_silhouette
 
 router = APIRouter()
 
@@ -18,14 +18,15 @@ def normalize_gender(value: str) -> str:
     return "female"
 
 
-def extract_body_features(image: Image.Image, gender: str) -> Dict:
+def extract_body_features(size: tuple[int, int], gender: str) -> Dict:
     """
     Demo body analyzer.
     No IA, no ML, no dependencias externas.
     Devuelve valores aproximados y consistentes.
+    Solo necesita el tamaño de la imagen (ancho, alto).
     """
 
-    width, height = image.size
+    width, height = size
     aspect_ratio = round(height / width, 2)
 
     # Heurísticas simples solo para demo
@@ -81,13 +82,16 @@ async def analyze_body_with_face(
         gender = normalize_gender(gender_hint)
 
         image_bytes = await image_file.read()
-        image = Image.open(BytesIO(image_bytes)).convert("RGB")
+        # Solo cabecera: tamaño + orientación EXIF, sin decodificar píxeles
+        width, height = read_image_header(image_bytes)
 
         MAX_SIZE = 1024
-        if max(image.size) > MAX_SIZE:
-            image.thumbnail((MAX_SIZE, MAX_SIZE))
+        traits = extract_body_features(thumbnail_size(width, height, MAX_SIZE), gender)
 
-        traits = extract_body_features(image, gender)
+        if BODY_ANALYZER == "silhouette":
+            # Decodifica (reducida) y mide la silueta real en el pool de imágenes
+            silhouette = await run_image_task(analyze_silhouette_bytes, image_bytes)
+            traits = apply_silhouette(traits, silhouette)
 
         return {
             "status": "ok",
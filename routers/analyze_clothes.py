@@ -1,38 +1,110 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from openai import OpenAI
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Query, Header
+from openai import AsyncOpenAI
+from utils.upstream import get_openai_client
+from utils.request_guard import RequestGuard, request_guard
+from utils.image_providers import image_edit_router
+from utils.admission import limited
+from utils.garment_cache import garment_cache, garment_cache_key
+from utils.garment_index import find_similar_garment, index_garment
+from utils.garment_batch import analyze_garments
+from utils.garment_vision import garment_image_part
+from utils.single_flight import garment_analysis_flight, idempotent
+from utils.progress import emit, staged
+from utils.base_image_store import BaseImageRef, base_image_ref
+from utils.jobs import run_or_submit, detach_upload
+from utils.image_ingest import ingest_image, image_filename, image_mime
+from utils.image_transport import ResponseFormat, image_result_response, image_result_stream, upstream_output_format
 from io import BytesIO
-from PIL import Image
-import base64
-import os
+import asyncio
 import uuid
 import logging
 import json
 
 router = APIRouter()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 logging.basicConfig(level=logging.INFO)
 
 # =========================
 # Helpers
 # =========================
-def upload_to_png(upload: UploadFile, size: int = 1024) -> BytesIO:
+async def upload_to_png(upload: UploadFile | BaseImageRef, size: int = 1024) -> BytesIO:
     """
     Convierte cualquier imagen subida a PNG, manteniendo proporciones,
     y la redimensiona a un máximo de 'size' x 'size'.
     Devuelve un BytesIO listo para enviarse a la IA.
+    El decode/resize/encode corre en el pool de ingestión de imágenes.
+    Con un handle de sesión se reutiliza la variante ya preparada.
     """
-    # Abrir imagen y convertir a RGB
-    image = Image.open(upload.file).convert("RGB")
-    
-    # Mantener proporciones usando thumbnail
-    image.thumbnail((size, size))
-    
-    # Guardar en buffer PNG
-    buffer = BytesIO()
-    image.save(buffer, format="PNG")
-    buffer.seek(0)
-    
-    return buffer
+    if isinstance(upload, BaseImageRef):
+        return BytesIO(await upload.prepared(size))
+    data = await upload.read()
+    return BytesIO(await ingest_image(data, size))
+
+
+async def analyze_garment(client: AsyncOpenAI, idx: int, cat: str, image: bytes) -> str:
+    """
+    Analiza una prenda (bytes tal como se subieron) con el modelo de visión (o la toma de la cache).
+    Al modelo solo le llega la versión reducida de utils.garment_vision.
+    Cualquier fallo se reporta como HTTPException con el índice de la prenda en el log.
+    """
+    try:
+        cache_key = garment_cache_key(image, cat)
+        cached = await garment_cache.aget(cache_key)
+        if cached:
+            logging.info(f"[MOBILE][CACHE HIT] Garment {idx + 1}: {cached}")
+            emit("garment_analyzed", index=idx, category=cat, description=cached)
+            return cached
+
+        # Peticiones idénticas en vuelo comparten la misma llamada al modelo
+        async def describe() -> str:
+            similar, phash = await find_similar_garment(image, cat)
+            if similar:
+                await garment_cache.aput(cache_key, similar)
+                logging.info(f"[MOBILE][NEAR-DUP HIT] Garment {idx + 1}: {similar}")
+                return similar
+
+            response = await limited("openai", "gpt-4.1-mini", client.responses.create(
+                model="gpt-4.1-mini",
+                input=[{
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "input_text",
+                            "text": (
+                                "Analyze this clothing item for virtual try-on.\n"
+                                f"Category: {cat}\n"
+                                "Describe ONLY visual characteristics.\n"
+                                "MANDATORY: include garment type and EXACT main color.\n"
+                                "Include fit/model, length, sleeves, neckline, texture or pattern.\n"
+                                "Do NOT invent colors.\n"
+                                "Do NOT mention brand, price, person or background."
+                            )
+                        },
+                        await garment_image_part(image)
+                    ]
+                }]
+            ))
+
+            desc = response.output_text.strip()
+            if not desc:
+                raise ValueError("Empty description returned")
+
+            await garment_cache.aput(cache_key, desc)
+            index_garment(phash, desc, cat)
+            logging.info(f"[MOBILE][OK] Garment {idx + 1}: {desc}")
+            return desc
+
+        desc = await garment_analysis_flight.do(cache_key, describe)
+        emit("garment_analyzed", index=idx, category=cat, description=desc)
+        return desc
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"[MOBILE][ANALYSIS FAILED] Garment {idx + 1}: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to analyze one clothing item"
+        )
 
 
 def combine_clothes_prompt(descriptions: list[str]) -> str:
@@ -62,16 +134,84 @@ STRICT RULES:
 - Photorealistic fashion photo.
 """
 
+# =========================
+# Pipeline
+# =========================
+async def run_combine_clothes(
+    client: AsyncOpenAI,
+    request_id: str,
+    base_image_file: UploadFile | BaseImageRef,
+    clothes_files: list[UploadFile],
+    categories: list[str],
+    output_format: str = "png"
+) -> dict:
+    try:
+        # =========================
+        # 1️⃣ ANALYZE GARMENTS (una petición batch, mientras se prepara la base)
+        # =========================
+        base_task = asyncio.create_task(staged("image_normalized", upload_to_png(base_image_file)))
+
+        async def analyze_all() -> list[str]:
+            images = [await cloth.read() for cloth in clothes_files]
+            return await analyze_garments(
+                client, images, categories,
+                lambda idx: analyze_garment(client, idx, categories[idx], images[idx])
+            )
+
+        analysis_task = asyncio.create_task(analyze_all())
+        try:
+            descriptions: list[str] = await analysis_task
+        except BaseException:
+            for task in [analysis_task, base_task]:
+                task.cancel()
+            raise
+
+        # =========================
+        # 2️⃣ GENERATE FINAL IMAGE
+        # =========================
+        base_img = await base_task
+        final_prompt = combine_clothes_prompt(descriptions)
+
+        image_b64 = await image_edit_router.run(
+            client=client,
+            model="gpt-image-1-mini",
+            image=(image_filename("base"), base_img.read(), image_mime()),
+            prompt=final_prompt,
+            size="1024x1024",
+            output_format=output_format
+        )
+
+        return {
+            "status": "ok",
+            "request_id": request_id,
+            "descriptions": descriptions,  # 👈 útil para debug si lo necesitas
+            "image": image_b64
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"[COMBINE-CLOTHES-MOBILE][ERROR] {e}")
+        raise HTTPException(status_code=500, detail="Combine clothes failed")
+
+
 # =========================
 # Endpoint MOBILE FINAL
 # =========================
 @router.post("/ai/combine-clothes")
 async def combine_clothes(
-    base_image_file: UploadFile = File(...),
     clothes_files: list[UploadFile] = File(...),
+    base_image_file: UploadFile | None = File(None),
+    base_image_handle: str | None = Form(None),
     gender: str = Form(...),
     style: str = Form(...),
-    clothes_categories: str = Form(...)
+    clothes_categories: str = Form(...),
+    job: bool = Query(False),
+    stream: bool = Query(False),
+    response_format: ResponseFormat = Query("json"),
+    idempotency_key: str | None = Header(None),
+    client: AsyncOpenAI = Depends(get_openai_client),
+    guard: RequestGuard = Depends(request_guard)
 ):
     request_id = str(uuid.uuid4())
     logging.info(f"[COMBINE-CLOTHES-MOBILE] {request_id}")
@@ -88,77 +228,36 @@ async def combine_clothes(
         if len(clothes_files) != len(categories):
             raise HTTPException(status_code=400, detail="Mismatch clothes vs categories")
 
-        descriptions: list[str] = []
+        if base_image_handle:
+            base_image_file = await base_image_ref(base_image_handle)
+        elif base_image_file is None:
+            raise HTTPException(status_code=400, detail="Provide 'base_image_file' (file) or 'base_image_handle'")
+        elif job or stream:
+            base_image_file = await detach_upload(base_image_file)
 
-        # =========================
-        # 1️⃣ ANALYZE GARMENTS
-        # =========================
-        for idx, (cat, cloth) in enumerate(zip(categories, clothes_files)):
-            try:
-                png_buf = upload_to_png(cloth)
-                img_b64 = base64.b64encode(png_buf.read()).decode("utf-8")
-
-                response = client.responses.create(
-                    model="gpt-4.1-mini",
-                    input=[{
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "input_text",
-                                "text": (
-                                    "Analyze this clothing item for virtual try-on.\n"
-                                    f"Category: {cat}\n"
-                                    "Describe ONLY visual characteristics.\n"
-                                    "MANDATORY: include garment type and EXACT main color.\n"
-                                    "Include fit/model, length, sleeves, neckline, texture or pattern.\n"
-                                    "Do NOT invent colors.\n"
-                                    "Do NOT mention brand, price, person or background."
-                                )
-                            },
-                            {
-                                "type": "input_image",
-                                "image_url": f"data:image/png;base64,{img_b64}"
-                            }
-                        ]
-                    }]
-                )
-
-                desc = response.output_text.strip()
-                if not desc:
-                    raise ValueError("Empty description returned")
-
-                descriptions.append(desc)
-                logging.info(f"[MOBILE][OK] Garment {idx + 1}: {desc}")
-
-            except Exception as e:
-                logging.error(f"[MOBILE][ANALYSIS FAILED] Garment {idx + 1}: {e}")
-                raise HTTPException(
-                    status_code=500,
-                    detail="Failed to analyze one clothing item"
-                )
-
-        # =========================
-        # 2️⃣ GENERATE FINAL IMAGE
-        # =========================
-        base_img = upload_to_png(base_image_file)
-        final_prompt = combine_clothes_prompt(descriptions)
-
-        result = client.images.edit(
-            model="gpt-image-1-mini",
-            image=("base.png", base_img.read(), "image/png"),
-            prompt=final_prompt,
-            size="1024x1024"
-        )
-
-        return {
-            "status": "ok",
-            "request_id": request_id,
-            "descriptions": descriptions,  # 👈 útil para debug si lo necesitas
-            "image": result.data[0].b64_json
-        }
+        if job or stream:
+            clothes_files = [await detach_upload(cloth) for cloth in clothes_files]
 
     except HTTPException:
         raise
     except Exception as e:
         logging.error(f"[COMBINE-CLOTHES-MOBILE][ERROR] {e}")
         raise HTTPException(status_code=500, detail="Combine clothes failed")
+
+    output_format = upstream_output_format(response_format)
+
+    if stream:
+        return image_result_stream(
+            lambda: run_combine_clothes(client, request_id, base_image_file, clothes_files, categories, output_format),
+            response_format, guard.timeout
+        )
+
+    result = await guard.run(idempotent(
+        idempotency_key, "combine-clothes",
+        lambda: run_or_submit(
+            job, "combine-clothes",
+            lambda: run_combine_clothes(client, request_id, base_image_file, clothes_files, categories, output_format)
+        ),
+        inputs=(base_image_file, clothes_files, clothes_categories, gender, style, output_format, job)
+    ))
+    return await image_result_response(result, response_format)
@@ -1,28 +1,119 @@
-from fastapi import APIRouter, Form, HTTPException
-from openai import OpenAI
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Query, Header
+from openai import AsyncOpenAI
+from utils.upstream import get_openai_client
+from utils.request_guard import RequestGuard, request_guard
+from utils.image_providers import image_edit_router
+from utils.admission import limited
+from utils.garment_cache import garment_cache, garment_cache_key
+from utils.garment_index import find_similar_garment, index_garment
+from utils.garment_batch import analyze_garments
+from utils.garment_vision import garment_image_part
+from utils.single_flight import garment_analysis_flight, idempotent
+from utils.progress import emit, staged
+from utils.base_image_store import BaseImageRef, base_image_ref
+from utils.jobs import run_or_submit
+from utils.image_ingest import ingest_image, image_filename, image_mime
+from utils.image_transport import (
+    ResponseFormat, image_input, image_result_response, image_result_stream, upstream_output_format, image_bytes
+)
 from io import BytesIO
-from PIL import Image
-import base64
-import os
+import asyncio
 import uuid
 import logging
 import json
 
 router = APIRouter()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 logging.basicConfig(level=logging.INFO)
 
 # =========================
 # Helpers
 # =========================
-def prepare_image_from_b64(image_b64: str, size: int = 1024) -> BytesIO:
-    image_bytes = base64.b64decode(image_b64)
-    image = Image.open(BytesIO(image_bytes)).convert("RGB")
-    image = image.resize((size, size))
-    buffer = BytesIO()
-    image.save(buffer, format="PNG")
-    buffer.seek(0)
-    return buffer
+async def prepare_image_from_b64(image: bytes | str | BaseImageRef, size: int = 1024) -> BytesIO:
+    if isinstance(image, BaseImageRef):
+        return BytesIO(await image.prepared(size, mode="square"))
+    return BytesIO(await ingest_image(image, size, mode="square"))
+
+
+async def analyze_garment(client: AsyncOpenAI, idx: int, raw: bytes, cat: str | None = None) -> str:
+    """
+    Analiza una prenda (bytes del archivo o del base64 del cliente) con el modelo de visión (o la toma de la cache).
+    Al modelo solo le llega la versión reducida de utils.garment_vision.
+    Cualquier fallo se reporta como HTTPException con el índice de la prenda en el log.
+    """
+    try:
+        cache_key = garment_cache_key(raw, cat)
+        cached = await garment_cache.aget(cache_key)
+        if cached:
+            logging.info(f"[ANALYSIS][CACHE HIT] Garment {idx + 1}: {cached}")
+            emit("garment_analyzed", index=idx, category=cat, description=cached)
+            return cached
+
+        # Peticiones idénticas en vuelo comparten la misma llamada al modelo
+        async def describe() -> str:
+            similar, phash = await find_similar_garment(raw, cat)
+            if similar:
+                await garment_cache.aput(cache_key, similar)
+                logging.info(f"[ANALYSIS][NEAR-DUP HIT] Garment {idx + 1}: {similar}")
+                return similar
+
+            response = await limited("openai", "gpt-4.1-mini", client.responses.create(
+                model="gpt-4.1-mini",
+                input=[{
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "input_text",
+                            "text": (
+                                "Analyze this clothing item for virtual try-on.\n"
+                                + (f"Category: {cat}\n" if cat else "") +
+                                "Describe ONLY visual characteristics.\n"
+                                "MANDATORY: include garment type and EXACT main color.\n"
+                                "Include fit/model, length, sleeves, neckline, texture or pattern.\n"
+                                "Do NOT invent colors.\n"
+                                "Do NOT mention brand, price, person, or background."
+                            )
+                        },
+                        await garment_image_part(raw)
+                    ]
+                }]
+            ))
+
+            desc = response.output_text.strip()
+
+            if not desc:
+                raise ValueError("Empty description returned")
+
+            await garment_cache.aput(cache_key, desc)
+            index_garment(phash, desc, cat)
+            logging.info(f"[ANALYSIS][OK] Garment {idx + 1}: {desc}")
+            return desc
+
+        desc = await garment_analysis_flight.do(cache_key, describe)
+        emit("garment_analyzed", index=idx, category=cat, description=desc)
+        return desc
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"[ANALYSIS][FAILED] Garment {idx + 1}: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to analyze one clothing item"
+        )
+
+
+def parse_categories(raw: str, count: int) -> list[str | None]:
+    """
+    clothes_categories del cliente web; si no es una lista de textos alineada
+    con las prendas se ignora (antes no se usaba y no se validaba).
+    """
+    try:
+        categories = json.loads(raw)
+    except ValueError:
+        return [None] * count
+    if not isinstance(categories, list) or len(categories) != count:
+        return [None] * count
+    return [(c.strip() or None) if isinstance(c, str) else None for c in categories]
 
 
 def combine_clothes_prompt(descriptions: list[str]) -> str:
@@ -54,92 +145,54 @@ STRICT RULES:
 """
 
 # =========================
-# Endpoint WEB + MOBILE
+# Pipeline
 # =========================
-@router.post("/ai/combine-clothes-web")
-async def combine_clothes_web(
-    base_image_b64: str = Form(...),
-    clothes_images_b64: str = Form(...),
-    gender: str = Form(...),
-    style: str = Form(...),
-    clothes_categories: str = Form(...)
-):
-    request_id = str(uuid.uuid4())
-    logging.info(f"[COMBINE-CLOTHES] {request_id}")
-
+async def run_combine_clothes_web(
+    client: AsyncOpenAI,
+    request_id: str,
+    base_image: bytes | str | BaseImageRef,
+    clothes_list: list[bytes | str],
+    output_format: str = "png",
+    categories: list[str | None] | None = None
+) -> dict:
     try:
-        clothes_list = json.loads(clothes_images_b64)
-
-        if not isinstance(clothes_list, list) or len(clothes_list) == 0:
-            raise HTTPException(status_code=400, detail="No clothing images provided")
-
-        if len(clothes_list) > 2:
-            raise HTTPException(status_code=400, detail="Maximum 2 garments allowed")
-
-        descriptions: list[str] = []
-
         # =========================
-        # 1️⃣ ANALYZE EACH GARMENT
+        # 1️⃣ ANALYZE GARMENTS (una petición batch, mientras se prepara la base)
         # =========================
-        for idx, img_b64 in enumerate(clothes_list):
-            try:
-                response = client.responses.create(
-                    model="gpt-4.1-mini",
-                    input=[{
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "input_text",
-                                "text": (
-                                    "Analyze this clothing item for virtual try-on.\n"
-                                    "Describe ONLY visual characteristics.\n"
-                                    "MANDATORY: include garment type and EXACT main color.\n"
-                                    "Include fit/model, length, sleeves, neckline, texture or pattern.\n"
-                                    "Do NOT invent colors.\n"
-                                    "Do NOT mention brand, price, person, or background."
-                                )
-                            },
-                            {
-                                "type": "input_image",
-                                "image_url": f"data:image/png;base64,{img_b64}"
-                            }
-                        ]
-                    }]
-                )
-
-                desc = response.output_text.strip()
-
-                if not desc:
-                    raise ValueError("Empty description returned")
-
-                descriptions.append(desc)
-                logging.info(f"[ANALYSIS][OK] Garment {idx + 1}: {desc}")
-
-            except Exception as e:
-                logging.error(f"[ANALYSIS][FAILED] Garment {idx + 1}: {e}")
-                raise HTTPException(
-                    status_code=500,
-                    detail="Failed to analyze one clothing item"
-                )
+        base_task = asyncio.create_task(staged("image_normalized", prepare_image_from_b64(base_image)))
+        raws = [image_bytes(cloth) for cloth in clothes_list]
+        categories = categories or [None] * len(raws)
+        analysis_task = asyncio.create_task(analyze_garments(
+            client, raws, categories,
+            lambda idx: analyze_garment(client, idx, raws[idx], categories[idx])
+        ))
+        try:
+            descriptions: list[str] = await analysis_task
+        except BaseException:
+            for task in [analysis_task, base_task]:
+                task.cancel()
+            raise
 
         # =========================
         # 2️⃣ GENERATE FINAL IMAGE
         # =========================
-        base_img = prepare_image_from_b64(base_image_b64)
+        base_img = await base_task
         final_prompt = combine_clothes_prompt(descriptions)
 
-        result = client.images.edit(
+        image_b64 = await image_edit_router.run(
+            client=client,
             model="gpt-image-1-mini",
-            image=("base.png", base_img.read(), "image/png"),
+            image=(image_filename("base"), base_img.read(), image_mime()),
             prompt=final_prompt,
-            size="1024x1024"
+            size="1024x1024",
+            output_format=output_format
         )
 
         return {
             "status": "ok",
             "request_id": request_id,
             "descriptions": descriptions,  # 👈 útil para debug (web + mobile)
-            "image": result.data[0].b64_json
+            "image": image_b64
         }
 
     except HTTPException:
@@ -147,3 +200,69 @@ async def combine_clothes_web(
     except Exception as e:
         logging.error(f"[COMBINE-CLOTHES][ERROR] {e}")
         raise HTTPException(status_code=500, detail="Combine clothes failed")
+
+
+# =========================
+# Endpoint WEB + MOBILE
+# =========================
+@router.post("/ai/combine-clothes-web")
+async def combine_clothes_web(
+    gender: str = Form(...),
+    style: str = Form(...),
+    clothes_categories: str = Form(...),
+    base_image: UploadFile | None = File(None),
+    base_image_b64: str | None = Form(None),
+    base_image_handle: str | None = Form(None),
+    clothes_images: list[UploadFile] = File([]),
+    clothes_images_b64: str | None = Form(None),
+    job: bool = Query(False),
+    stream: bool = Query(False),
+    response_format: ResponseFormat = Query("json"),
+    idempotency_key: str | None = Header(None),
+    client: AsyncOpenAI = Depends(get_openai_client),
+    guard: RequestGuard = Depends(request_guard)
+):
+    request_id = str(uuid.uuid4())
+    logging.info(f"[COMBINE-CLOTHES] {request_id}")
+
+    try:
+        if clothes_images:
+            clothes_list = [await cloth.read() for cloth in clothes_images]
+        else:
+            clothes_list = json.loads(clothes_images_b64 or "[]")
+
+        if not isinstance(clothes_list, list) or len(clothes_list) == 0:
+            raise HTTPException(status_code=400, detail="No clothing images provided")
+
+        if len(clothes_list) > 2:
+            raise HTTPException(status_code=400, detail="Maximum 2 garments allowed")
+
+        categories = parse_categories(clothes_categories, len(clothes_list))
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"[COMBINE-CLOTHES][ERROR] {e}")
+        raise HTTPException(status_code=500, detail="Combine clothes failed")
+
+    if base_image_handle:
+        image = await base_image_ref(base_image_handle)
+    else:
+        image = await image_input(base_image, base_image_b64, "base_image")
+    output_format = upstream_output_format(response_format)
+
+    if stream:
+        return image_result_stream(
+            lambda: run_combine_clothes_web(client, request_id, image, clothes_list, output_format, categories),
+            response_format, guard.timeout
+        )
+
+    result = await guard.run(idempotent(
+        idempotency_key, "combine-clothes-web",
+        lambda: run_or_submit(
+            job, "combine-clothes-web",
+            lambda: run_combine_clothes_web(client, request_id, image, clothes_list, output_format, categories)
+        ),
+        inputs=(image, clothes_list, clothes_categories, gender, style, output_format, job)
+    ))
+    return await image_result_response(result, response_format)
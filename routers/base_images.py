@@ -0,0 +1,37 @@
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from utils.base_image_store import base_image_store, valid_handle, BASE_IMAGE_TTL
+from utils.image_transport import image_input, image_bytes
+import logging
+
+router = APIRouter()
+
+# =========================
+# Foto base de la sesión
+# =========================
+@router.post("/ai/base-image")
+async def upload_base_image(
+    image: UploadFile | None = File(None),
+    image_b64: str | None = Form(None)
+):
+    """
+    Sube y normaliza la foto base una vez. El handle devuelto sustituye a la
+    imagen (base_image_handle) en generate-tryon(-web) y combine-clothes(-web).
+    """
+    data = await image_input(image, image_b64, "image")
+    try:
+        handle = await base_image_store.put(image_bytes(data))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"[BASE-IMAGE] Invalid image: {e}")
+        raise HTTPException(status_code=400, detail="Invalid image")
+
+    return {"status": "ok", "base_image_handle": handle, "expires_in": int(BASE_IMAGE_TTL)}
+
+
+@router.delete("/ai/base-image/{handle}")
+async def delete_base_image(handle: str):
+    if not valid_handle(handle):
+        raise HTTPException(status_code=404, detail="Unknown or expired base_image_handle")
+    base_image_store.delete(handle)
+    return {"status": "ok"}
@@ -1,23 +1,71 @@
 # routers/generate_outfit_demo.py
-import os
-import base64
 import httpx
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Request, Depends, HTTPException
 from fastapi.responses import JSONResponse
+from utils.upstream import get_http_client, get_cloudflare_client
+from utils.request_guard import RequestGuard, request_guard
+from utils.admission import limited
+from utils.provider_router import Provider, ProviderRouter, register_router
 
 router = APIRouter()
 
 # =========================
-# Leer llaves de entorno
+# PROVEEDORES
 # =========================
-CLOUDFLARE_API_KEY = os.getenv("CLOUDFLARE_API_KEY")
-CLOUDFLARE_ACCOUNT_ID = os.getenv("CLOUDFLARE_ACCOUNT_ID")
+async def cloudflare_outfit(req: dict) -> str | None:
+    """Cloudflare Workers AI"""
+    cf_client = req["cf_client"]
+    cf_payload = {
+        "prompt": f"Outfit for a {req['gender']} based on the user's body image",
+        "type": "IMAGETOIAMGE",
+        "imageUrls": [f"data:image/png;base64,{req['image_base64']}"],
+        "numImages": 1,
+        "image_size": "1:1"
+    }
+    cf_resp = await limited("cloudflare", "workers-ai", cf_client.post("/workers/ai/generate", json=cf_payload))
+    cf_data = cf_resp.json()
+    print("🔹 Cloudflare response:", cf_data)
+
+    if cf_resp.status_code == 200 and "data" in cf_data and len(cf_data["data"]) > 0:
+        return cf_data["data"][0]["b64_json"]
+    print("⚠️ Cloudflare no devolvió imagen válida")
+    return None
+
+
+async def free_api_outfit(req: dict) -> str | None:
+    """API gratuita sin key"""
+    free_payload = {
+        "prompt": f"Outfit for a {req['gender']} based on the user's body image",
+        "image_base64": req["image_base64"]
+    }
+    free_resp = await req["http_client"].post(
+        "https://subnp-free-ai.vercel.app/api/generate_outfit_demo",
+        json=free_payload
+    )
+    free_data = free_resp.json()
+    print("🔹 Free API response:", free_data)
+
+    if free_resp.status_code == 200 and free_data.get("status") == "ok":
+        return free_data["image"]
+    return None
+
+
+# Cloudflare primero; la API gratuita como fallback (o hedge si está activado)
+demo_router = register_router(ProviderRouter("outfit-demo", [
+    Provider("cloudflare", cloudflare_outfit, available=lambda: get_cloudflare_client() is not None),
+    Provider("free-api", free_api_outfit),
+]))
 
 # =========================
 # ENDPOINT
 # =========================
 @router.post("/generate_outfit_demo")
-async def generate_outfit_demo(request: Request):
+async def generate_outfit_demo(
+    request: Request,
+    http_client: httpx.AsyncClient = Depends(get_http_client),
+    cf_client: httpx.AsyncClient | None = Depends(get_cloudflare_client),
+    guard: RequestGuard = Depends(request_guard)
+):
     try:
         data = await request.json()
         gender = data.get("gender")
@@ -26,60 +74,22 @@ async def generate_outfit_demo(request: Request):
         if not gender or not image_base64:
             return JSONResponse(status_code=400, content={"status": "error", "message": "Faltan datos"})
 
-        # =========================
-        # 1️⃣ Intentar Cloudflare Workers AI
-        # =========================
-        if CLOUDFLARE_API_KEY and CLOUDFLARE_ACCOUNT_ID:
-            try:
-                async with httpx.AsyncClient(timeout=120) as client:
-                    cf_payload = {
-                        "prompt": f"Outfit for a {gender} based on the user's body image",
-                        "type": "IMAGETOIAMGE",
-                        "imageUrls": [f"data:image/png;base64,{image_base64}"],
-                        "numImages": 1,
-                        "image_size": "1:1"
-                    }
-                    cf_headers = {
-                        "Authorization": f"Bearer {CLOUDFLARE_API_KEY}",
-                        "Content-Type": "application/json"
-                    }
-                    cf_url = f"https://api.cloudflare.com/client/v4/accounts/{CLOUDFLARE_ACCOUNT_ID}/workers/ai/generate"
-                    cf_resp = await client.post(cf_url, json=cf_payload, headers=cf_headers)
-                    cf_data = cf_resp.json()
-                    print("🔹 Cloudflare response:", cf_data)
-
-                    if cf_resp.status_code == 200 and "data" in cf_data and len(cf_data["data"]) > 0:
-                        img_base64 = cf_data["data"][0]["b64_json"]
-                        return {"status": "ok", "image": img_base64}
-                    else:
-                        print("⚠️ Cloudflare no devolvió imagen válida, intentando fallback...")
-            except Exception as e:
-                print("⚠️ Error Cloudflare:", e)
-
-        # =========================
-        # 2️⃣ Fallback: API gratuita sin key
-        # =========================
         try:
-            async with httpx.AsyncClient(timeout=120) as client:
-                free_payload = {
-                    "prompt": f"Outfit for a {gender} based on the user's body image",
-                    "image_base64": image_base64
-                }
-                free_resp = await client.post(
-                    "https://subnp-free-ai.vercel.app/api/generate_outfit_demo",
-                    json=free_payload
-                )
-                free_data = free_resp.json()
-                print("🔹 Free API response:", free_data)
-
-                if free_resp.status_code == 200 and free_data.get("status") == "ok":
-                    return {"status": "ok", "image": free_data["image"]}
-                else:
-                    return JSONResponse(status_code=500, content={"status": "error", "message": "No se pudo generar la imagen con ninguna API"})
+            img_base64 = await guard.run(demo_router.run(
+                gender=gender,
+                image_base64=image_base64,
+                cf_client=cf_client,
+                http_client=http_client
+            ))
+            return {"status": "ok", "image": img_base64}
+        except HTTPException:
+            raise
         except Exception as e:
-            print("⚠️ Error Free API:", e)
-            return JSONResponse(status_code=500, content={"status": "error", "message": "Error interno al generar imagen"})
+            print("⚠️ Error generando imagen:", e)
+            return JSONResponse(status_code=500, content={"status": "error", "message": "No se pudo generar la imagen con ninguna API"})
 
+    except HTTPException:
+        raise
     except Exception as e:
         print("❌ ERROR GENERAL:", e)
         return JSONResponse(status_code=500, content={"status": "error", "message": str(e)})
@@ -1,9 +1,15 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from openai import OpenAI
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Query
+from openai import AsyncOpenAI
+from utils.upstream import get_openai_client
+from utils.request_guard import RequestGuard, request_guard
+from utils.image_providers import image_edit_router
+from utils.jobs import run_or_submit
+from utils.image_ingest import ingest_image, image_filename
+from utils.image_transport import ResponseFormat, image_result_response, upstream_output_format
+from utils.outfit_prefetch import OUTFIT_PREFETCH
+from routers.image_to_image import schedule_outfit_prefetch
 from io import BytesIO
-from PIL import Image
 import json
-import os
 import uuid
 
 router = APIRouter()
@@ -49,24 +55,55 @@ def normalize_gender(value: str) -> str:
 async def ensure_png_upload(upload: UploadFile) -> BytesIO:
     try:
         image_bytes = await upload.read()
-        image = Image.open(BytesIO(image_bytes)).convert("RGB")
 
         MAX_SIZE = 1024
-        if max(image.size) > MAX_SIZE:
-            image.thumbnail((MAX_SIZE, MAX_SIZE))
-
-        buffer = BytesIO()
-        image.save(buffer, format="PNG")
-        buffer.seek(0)
-        buffer.name = "input.png"
+        buffer = BytesIO(await ingest_image(image_bytes, MAX_SIZE))
+        buffer.name = image_filename("input")
         return buffer
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=400,
             detail=f"Invalid image file: {str(e)}"
         )
 
+# =========================
+# PIPELINE – IMAGE EDIT
+# =========================
+async def run_generate_outfits_from_body_photo(
+    client: AsyncOpenAI,
+    request_id: str,
+    base_image: BytesIO,
+    final_prompt: str,
+    traits: dict,
+    output_format: str = "png"
+) -> dict:
+    try:
+        image_b64 = await image_edit_router.run(
+            client=client,
+            model="gpt-image-1-mini",
+            image=base_image,
+            prompt=final_prompt,
+            size="1024x1024",
+            output_format=output_format
+        )
+
+        print(f"[IMAGE_GEN_END][BODY] {request_id}")
+
+        return {
+            "status": "ok",
+            "mode": "body_photo",
+            "image": image_b64,
+            "traits_used": traits
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 # =========================
 # ENDPOINT – BODY PHOTO REGISTRATION (MOBILE)
 # =========================
@@ -76,7 +113,12 @@ async def generate_outfits_from_body_photo(
     gender: str = Form(...),
     body_traits: str = Form(...),
     style: str = Form("casual"),
-    image_file: UploadFile = File(...)
+    image_file: UploadFile = File(...),
+    job: bool = Query(False),
+    prefetch: bool | None = Query(None, description="Precalcular en segundo plano los primeros outfits del usuario (por defecto OUTFIT_PREFETCH)"),
+    response_format: ResponseFormat = Query("json"),
+    client: AsyncOpenAI = Depends(get_openai_client),
+    guard: RequestGuard = Depends(request_guard)
 ):
     request_id = str(uuid.uuid4())
     print(f"[IMAGE_GEN_START][BODY] {request_id}")
@@ -90,7 +132,10 @@ async def generate_outfits_from_body_photo(
     gender = normalize_gender(gender)
     base_image = await ensure_png_upload(image_file)
 
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    # Outfits del formulario precalculados en segundo plano (opt-in)
+    if OUTFIT_PREFETCH if prefetch is None else prefetch:
+        queued = await schedule_outfit_prefetch(client, user_id, gender, style, base_image.getvalue())
+        print(f"[PREFETCH] {user_id}: {queued} outfits queued")
 
     # Combinar prompt base con contexto
     final_prompt = BODY_PHOTO_PROMPT_MOBILE + f"""
@@ -101,25 +146,10 @@ Additional context:
 - Keep lighting, perspective, and camera angle natural and realistic.
 """
 
-    try:
-        response = client.images.edit(
-            model="gpt-image-1-mini",
-            image=base_image,
-            prompt=final_prompt,
-            size="1024x1024"
-        )
-
-        if not response.data or not response.data[0].b64_json:
-            raise Exception("Empty image response")
-
-        print(f"[IMAGE_GEN_END][BODY] {request_id}")
+    output_format = upstream_output_format(response_format)
 
-        return {
-            "status": "ok",
-            "mode": "body_photo",
-            "image": response.data[0].b64_json,
-            "traits_used": traits
-        }
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    result = await guard.run(run_or_submit(
+        job, "body-photo",
+        lambda: run_generate_outfits_from_body_photo(client, request_id, base_image, final_prompt, traits, output_format)
+    ))
+    return await image_result_response(result, response_format)
@@ -1,9 +1,13 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Depends, Query
 from pydantic import BaseModel
-from openai import OpenAI
+from openai import AsyncOpenAI
+from utils.upstream import get_openai_client
+from utils.request_guard import RequestGuard, request_guard
+from utils.image_providers import image_edit_router
+from utils.jobs import run_or_submit
+from utils.image_ingest import ingest_image, image_filename
+from utils.image_transport import ResponseFormat, image_result_response, upstream_output_format
 from io import BytesIO
-from PIL import Image
-import base64
 import os
 import uuid
 
@@ -13,8 +17,6 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 if not OPENAI_API_KEY:
     raise RuntimeError("OPENAI_API_KEY is not set")
 
-client = OpenAI(api_key=OPENAI_API_KEY)
-
 # =========================
 # PROMPT ACTUALIZADO
 # =========================
@@ -57,27 +59,61 @@ def normalize_gender(value: str) -> str:
         return "female"
     return "female"
 
+# =========================
+# PIPELINE – IMAGE EDIT
+# =========================
+async def run_generate_outfits_from_body_photo_web(
+    client: AsyncOpenAI,
+    request_id: str,
+    buffer: BytesIO,
+    final_prompt: str,
+    output_format: str = "png"
+) -> dict:
+    try:
+        image_b64 = await image_edit_router.run(
+            client=client,
+            model="gpt-image-1-mini",
+            image=buffer,
+            prompt=final_prompt,
+            size="auto",
+            output_format=output_format
+        )
+
+        print(f"[IMAGE_GEN_END][BODY_WEB] {request_id}")
+        return {
+            "status": "ok",
+            "mode": "body_photo_web",
+            "image": image_b64
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 # =========================
 # ENDPOINT WEB
 # =========================
-@router.post("/generate-outfits/body-photo-web")
-async def generate_outfits_from_body_photo_web(data: BodyPhotoWebRequest):
+async def body_photo_web(
+    client: AsyncOpenAI,
+    gender: str,
+    image: bytes | str,
+    job: bool,
+    response_format: str,
+    guard: RequestGuard
+):
     request_id = str(uuid.uuid4())
     print(f"[IMAGE_GEN_START][BODY_WEB] {request_id}")
 
-    gender = normalize_gender(data.gender)
+    gender = normalize_gender(gender)
 
-    # Decodificar imagen base64
+    # Decodificar imagen (archivo o base64)
     try:
-        image_bytes = base64.b64decode(data.image_base64)
-        image = Image.open(BytesIO(image_bytes)).convert("RGB")
         MAX_SIZE = 1024
-        if max(image.size) > MAX_SIZE:
-            image.thumbnail((MAX_SIZE, MAX_SIZE))
-        buffer = BytesIO()
-        image.save(buffer, format="PNG")
-        buffer.seek(0)
-        buffer.name = "input.png"
+        buffer = BytesIO(await ingest_image(image, MAX_SIZE))
+        buffer.name = image_filename("input")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Invalid image base64: {str(e)}")
 
@@ -86,24 +122,34 @@ Additional context:
 - Gender: {gender}
 - Keep lighting, perspective, and camera angle natural and realistic.
 """
+    output_format = upstream_output_format(response_format)
 
-    try:
-        response = client.images.edit(
-            model="gpt-image-1-mini",
-            image=buffer,
-            prompt=final_prompt,
-            size="auto"
-        )
-
-        if not response.data or not response.data[0].b64_json:
-            raise Exception("Empty image response")
+    result = await guard.run(run_or_submit(
+        job, "body-photo-web",
+        lambda: run_generate_outfits_from_body_photo_web(client, request_id, buffer, final_prompt, output_format)
+    ))
+    return await image_result_response(result, response_format)
 
-        print(f"[IMAGE_GEN_END][BODY_WEB] {request_id}")
-        return {
-            "status": "ok",
-            "mode": "body_photo_web",
-            "image": response.data[0].b64_json
-        }
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+@router.post("/generate-outfits/body-photo-web")
+async def generate_outfits_from_body_photo_web(
+    data: BodyPhotoWebRequest,
+    job: bool = Query(False),
+    response_format: ResponseFormat = Query("json"),
+    client: AsyncOpenAI = Depends(get_openai_client),
+    guard: RequestGuard = Depends(request_guard)
+):
+    return await body_photo_web(client, data.gender, data.image_base64, job, response_format, guard)
+
+
+# Variante multipart: la imagen viaja en binario, sin base64
+@router.post("/generate-outfits/body-photo-web/upload")
+async def generate_outfits_from_body_photo_web_upload(
+    gender: str = Form(...),
+    image_file: UploadFile = File(...),
+    job: bool = Query(False),
+    response_format: ResponseFormat = Query("json"),
+    client: AsyncOpenAI = Depends(get_openai_client),
+    guard: RequestGuard = Depends(request_guard)
+):
+    return await body_photo_web(client, gender, await image_file.read(), job, response_format, guard)
@@ -1,9 +1,15 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from openai import OpenAI
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Query
+from openai import AsyncOpenAI
+from utils.upstream import get_openai_client
+from utils.request_guard import RequestGuard, request_guard
+from utils.image_providers import image_edit_router
+from utils.jobs import run_or_submit
+from utils.image_ingest import ingest_image, image_filename
+from utils.image_transport import ResponseFormat, image_result_response, upstream_output_format
+from utils.outfit_prefetch import OUTFIT_PREFETCH
+from routers.image_to_image import schedule_outfit_prefetch
 from io import BytesIO
 import json
-import os
-from PIL import Image
 
 router = APIRouter()
 
@@ -71,24 +77,54 @@ def normalize_traits(traits: dict, gender: str) -> dict:
 async def ensure_png_upload(upload: UploadFile) -> BytesIO:
     try:
         image_bytes = await upload.read()
-        image = Image.open(BytesIO(image_bytes)).convert("RGB")
 
         MAX_SIZE = 1024
-        if max(image.size) > MAX_SIZE:
-            image.thumbnail((MAX_SIZE, MAX_SIZE))
-
-        buffer = BytesIO()
-        image.save(buffer, format="PNG")
-        buffer.seek(0)
-        buffer.name = "selfie.png"
+        buffer = BytesIO(await ingest_image(image_bytes, MAX_SIZE))
+        buffer.name = image_filename("selfie")
         return buffer
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=400,
             detail=f"Invalid image file: {str(e)}"
         )
 
+# =========================
+# PIPELINE – IMAGE GENERATION
+# =========================
+async def run_generate_outfits_from_selfie(
+    client: AsyncOpenAI,
+    request_id: str,
+    base_image: BytesIO,
+    traits: dict,
+    output_format: str = "png"
+) -> dict:
+    try:
+        image_b64 = await image_edit_router.run(
+            client=client,
+            model="gpt-image-1-mini",
+            prompt=SELFIE_PROMPT,
+            image=base_image,
+            size="auto",
+            output_format=output_format
+        )
+
+        print(f"[IMAGE_GEN_END][SELFIE] {request_id}")
+
+        return {
+            "status": "ok",
+            "mode": "selfie_manual",
+            "image": image_b64,
+            "traits_used": traits
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 # =========================
 # ENDPOINT
 # =========================
@@ -98,7 +134,12 @@ async def generate_outfits_from_selfie(
     gender: str = Form(...),
     body_traits: str = Form(...),
     style: str = Form("modern"),
-    selfie_file: UploadFile = File(...)
+    selfie_file: UploadFile = File(...),
+    job: bool = Query(False),
+    prefetch: bool | None = Query(None, description="Precalcular en segundo plano los primeros outfits del usuario (por defecto OUTFIT_PREFETCH)"),
+    response_format: ResponseFormat = Query("json"),
+    client: AsyncOpenAI = Depends(get_openai_client),
+    guard: RequestGuard = Depends(request_guard)
 ):
     import uuid
     request_id = str(uuid.uuid4())
@@ -112,28 +153,15 @@ async def generate_outfits_from_selfie(
     traits = normalize_traits(raw_traits, gender)
     base_image = await ensure_png_upload(selfie_file)
 
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-    try:
-        response = client.images.generate(
-            model="gpt-image-1-mini",
-            prompt=SELFIE_PROMPT,
-            image=base_image,
-            n=1,
-            size="auto"
-        )
-
-        if not response.data or not response.data[0].b64_json:
-            raise Exception("Empty image response")
+    # Outfits del formulario precalculados en segundo plano (opt-in)
+    if OUTFIT_PREFETCH if prefetch is None else prefetch:
+        queued = await schedule_outfit_prefetch(client, user_id, gender, style, base_image.getvalue())
+        print(f"[PREFETCH] {user_id}: {queued} outfits queued")
 
-        print(f"[IMAGE_GEN_END][SELFIE] {request_id}")
+    output_format = upstream_output_format(response_format)
 
-        return {
-            "status": "ok",
-            "mode": "selfie_manual",
-            "image": response.data[0].b64_json,
-            "traits_used": traits
-        }
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    result = await guard.run(run_or_submit(
+        job, "selfie",
+        lambda: run_generate_outfits_from_selfie(client, request_id, base_image, traits, output_format)
+    ))
+    return await image_result_response(result, response_format)
@@ -1,30 +1,36 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from openai import OpenAI
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Query, Header
+from openai import AsyncOpenAI
+from utils.upstream import get_openai_client
+from utils.request_guard import RequestGuard, request_guard
+from utils.image_providers import image_edit_router
+from utils.single_flight import idempotent
+from utils.base_image_store import BaseImageRef, base_image_ref
+from utils.jobs import run_or_submit, detach_upload
+from utils.image_ingest import ingest_image, image_filename, image_mime
+from utils.image_transport import ResponseFormat, image_result_response, image_result_stream, upstream_output_format
+from utils.progress import emit
 from io import BytesIO
-from PIL import Image
-import os, uuid, logging
+import uuid, logging
 
 router = APIRouter()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 logging.basicConfig(level=logging.INFO)
 
-def image_to_png(upload: UploadFile) -> BytesIO:
-    img = Image.open(upload.file).convert("RGB")
-    buf = BytesIO()
-    img.save(buf, format="PNG")
-    buf.seek(0)
-    return buf
-
-@router.post("/ai/generate-tryon")
-async def generate_tryon(
-    base_image: UploadFile = File(...),
-    clothes_description: str = Form(...)
-):
-    request_id = str(uuid.uuid4())
-    logging.info(f"[GENERATE-TRYON] {request_id}")
+async def image_to_png(upload: UploadFile | BaseImageRef) -> BytesIO:
+    if isinstance(upload, BaseImageRef):
+        return BytesIO(await upload.prepared(size=None))
+    data = await upload.read()
+    return BytesIO(await ingest_image(data, size=None))
 
+async def run_generate_tryon(
+    client: AsyncOpenAI,
+    request_id: str,
+    base_image: UploadFile | BaseImageRef,
+    clothes_description: str,
+    output_format: str = "png"
+) -> dict:
     try:
-        base_img = image_to_png(base_image)
+        base_img = await image_to_png(base_image)
+        emit("image_normalized")
 
         prompt = f"""
 Replace the person's clothing with the following outfit:
@@ -42,19 +48,63 @@ Rules:
 - Maintain proper proportions for all clothing items.
 """
 
-        result = client.images.edit(
+        image_b64 = await image_edit_router.run(
+            client=client,
             model="gpt-image-1-mini",
-            image=("base.png", base_img.read(), "image/png"),
+            image=(image_filename("base"), base_img.read(), image_mime()),
             prompt=prompt,
-            size="1024x1024"
+            size="1024x1024",
+            output_format=output_format
         )
 
         return {
             "status": "ok",
             "request_id": request_id,
-            "image": result.data[0].b64_json
+            "image": image_b64
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(e)
         raise HTTPException(status_code=500, detail="Try-on generation failed")
+
+@router.post("/ai/generate-tryon")
+async def generate_tryon(
+    clothes_description: str = Form(...),
+    base_image: UploadFile | None = File(None),
+    base_image_handle: str | None = Form(None),
+    job: bool = Query(False),
+    stream: bool = Query(False),
+    response_format: ResponseFormat = Query("json"),
+    idempotency_key: str | None = Header(None),
+    client: AsyncOpenAI = Depends(get_openai_client),
+    guard: RequestGuard = Depends(request_guard)
+):
+    request_id = str(uuid.uuid4())
+    logging.info(f"[GENERATE-TRYON] {request_id}")
+
+    if base_image_handle:
+        base_image = await base_image_ref(base_image_handle)
+    elif base_image is None:
+        raise HTTPException(status_code=400, detail="Provide 'base_image' (file) or 'base_image_handle'")
+    elif job or stream:
+        base_image = await detach_upload(base_image)
+
+    output_format = upstream_output_format(response_format)
+
+    if stream:
+        return image_result_stream(
+            lambda: run_generate_tryon(client, request_id, base_image, clothes_description, output_format),
+            response_format, guard.timeout
+        )
+
+    result = await guard.run(idempotent(
+        idempotency_key, "generate-tryon",
+        lambda: run_or_submit(
+            job, "generate-tryon",
+            lambda: run_generate_tryon(client, request_id, base_image, clothes_description, output_format)
+        ),
+        inputs=(base_image, clothes_description, output_format, job)
+    ))
+    return await image_result_response(result, response_format)
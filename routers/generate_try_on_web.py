@@ -1,33 +1,38 @@
-from fastapi import APIRouter, Form, HTTPException
-from openai import OpenAI
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Query, Header
+from openai import AsyncOpenAI
+from utils.upstream import get_openai_client
+from utils.request_guard import RequestGuard, request_guard
+from utils.image_providers import image_edit_router
+from utils.single_flight import idempotent
+from utils.base_image_store import BaseImageRef, base_image_ref
+from utils.jobs import run_or_submit
+from utils.image_ingest import ingest_image, image_filename, image_mime
+from utils.image_transport import ResponseFormat, image_input, image_result_response, image_result_stream, upstream_output_format
+from utils.progress import emit
 from io import BytesIO
-from PIL import Image
-import base64, os, uuid, logging
+import uuid, logging
 
 router = APIRouter()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 logging.basicConfig(level=logging.INFO)
 
-def prepare_image_from_b64(image_b64: str, size=1024) -> BytesIO:
-    image_bytes = base64.b64decode(image_b64)
-    image = Image.open(BytesIO(image_bytes)).convert("RGB")
-    image = image.resize((size, size))
-    buf = BytesIO()
-    image.save(buf, format="PNG")
-    buf.name = "input.png"
-    buf.seek(0)
+async def prepare_image_from_b64(image: bytes | str | BaseImageRef, size=1024) -> BytesIO:
+    if isinstance(image, BaseImageRef):
+        buf = BytesIO(await image.prepared(size, mode="square"))
+    else:
+        buf = BytesIO(await ingest_image(image, size, mode="square"))
+    buf.name = image_filename("input")
     return buf
 
-@router.post("/ai/generate-tryon-web")
-async def generate_tryon_web(
-    base_image_b64: str = Form(...),
-    clothes_description: str = Form(...)
-):
-    request_id = str(uuid.uuid4())
-    logging.info(f"[GENERATE-TRYON-WEB] {request_id}")
-
+async def run_generate_tryon_web(
+    client: AsyncOpenAI,
+    request_id: str,
+    base_image: bytes | str | BaseImageRef,
+    clothes_description: str,
+    output_format: str = "png"
+) -> dict:
     try:
-        base_img = prepare_image_from_b64(base_image_b64)
+        base_img = await prepare_image_from_b64(base_image)
+        emit("image_normalized")
 
         prompt = f"""
 Replace the person's clothing with the following outfit description:
@@ -45,19 +50,61 @@ Rules:
 - Maintain proper proportions for all clothing items.
 """
 
-        result = client.images.edit(
+        image_b64 = await image_edit_router.run(
+            client=client,
             model="gpt-image-1-mini",
-            image=("base.png", base_img.read(), "image/png"),
+            image=(image_filename("base"), base_img.read(), image_mime()),
             prompt=prompt,
-            size="1024x1024"
+            size="1024x1024",
+            output_format=output_format
         )
 
         return {
             "status": "ok",
             "request_id": request_id,
-            "image": result.data[0].b64_json
+            "image": image_b64
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(e)
         raise HTTPException(status_code=500, detail="Try-on generation failed")
+
+@router.post("/ai/generate-tryon-web")
+async def generate_tryon_web(
+    clothes_description: str = Form(...),
+    base_image: UploadFile | None = File(None),
+    base_image_b64: str | None = Form(None),
+    base_image_handle: str | None = Form(None),
+    job: bool = Query(False),
+    stream: bool = Query(False),
+    response_format: ResponseFormat = Query("json"),
+    idempotency_key: str | None = Header(None),
+    client: AsyncOpenAI = Depends(get_openai_client),
+    guard: RequestGuard = Depends(request_guard)
+):
+    request_id = str(uuid.uuid4())
+    logging.info(f"[GENERATE-TRYON-WEB] {request_id}")
+
+    if base_image_handle:
+        image = await base_image_ref(base_image_handle)
+    else:
+        image = await image_input(base_image, base_image_b64, "base_image")
+    output_format = upstream_output_format(response_format)
+
+    if stream:
+        return image_result_stream(
+            lambda: run_generate_tryon_web(client, request_id, image, clothes_description, output_format),
+            response_format, guard.timeout
+        )
+
+    result = await guard.run(idempotent(
+        idempotency_key, "generate-tryon-web",
+        lambda: run_or_submit(
+            job, "generate-tryon-web",
+            lambda: run_generate_tryon_web(client, request_id, image, clothes_description, output_format)
+        ),
+        inputs=(image, clothes_description, output_format, job)
+    ))
+    return await image_result_response(result, response_format)
@@ -1,79 +1,81 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
-from openai import OpenAI
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Depends, Query
+from openai import AsyncOpenAI
+from utils.upstream import get_openai_client
+from utils.request_guard import RequestGuard, request_guard
+from utils.image_providers import image_edit_router
+from utils.stylist import recommend_outfit
+from utils.outfit_prefetch import OUTFIT_PREFETCH_COMBOS, outfit_prefetcher
+from utils.progress import staged
+from utils.jobs import run_or_submit, detach_upload
+from utils.image_ingest import ingest_image, image_filename
+from utils.image_transport import ResponseFormat, image_result_response, image_result_stream, upstream_output_format
 from io import BytesIO
-from PIL import Image
-import base64
-import os
-import json
+import asyncio
+import logging
 
 router = APIRouter()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 # =========================
 # Helpers
 # =========================
-def prepare_image(file: UploadFile, size=1024) -> BytesIO:
-    image = Image.open(file.file).convert("RGB")
-    image.thumbnail((size, size))  # Mantener proporciones
-
-    buffer = BytesIO()
-    image.save(buffer, format="PNG")
-    buffer.name = "input.png"
-    buffer.seek(0)
+async def prepare_image(file: UploadFile, size=1024) -> BytesIO:
+    data = await file.read()
+    buffer = BytesIO(await ingest_image(data, size))  # Mantener proporciones
+    buffer.name = image_filename("input")
     return buffer
 
+
+def form_profile(gender: str, style: str, occasion: str, climate: str, colors: str, lines: str = "3-4") -> dict:
+    """Perfil del formulario: clave de la cache del estilista y del prefetch (web usa lines="2-3")."""
+    return {
+        "lines": lines,
+        "gender": gender,
+        "style": style,
+        "occasion": occasion,
+        "climate": climate,
+        "colors": colors,
+    }
+
+
+async def schedule_outfit_prefetch(client: AsyncOpenAI, user_id: str, gender: str, style: str, photo: bytes) -> int:
+    """
+    Tras el registro: encola en segundo plano los outfits del formulario más
+    probables (OUTFIT_PREFETCH_COMBOS) con la foto registrada.
+    """
+    profiles = [form_profile(gender, style, **combo) for combo in OUTFIT_PREFETCH_COMBOS]
+    return await outfit_prefetcher.schedule(
+        user_id, photo, profiles,
+        lambda p: run_generate_outfit_from_form(
+            client, p["gender"], p["style"], p["occasion"], p["climate"], p["colors"],
+            UploadFile(file=BytesIO(photo), filename=image_filename("input"))
+        )
+    )
+
 # =========================
-# Endpoint Mobile
+# Pipeline
 # =========================
-@router.post("/ai/generate-outfit-from-form")
-async def generate_outfit_from_form(
-    gender: str = Form(...),
-    body_traits: str = Form(...),
-    style: str = Form(...),
-    occasion: str = Form(...),
-    climate: str = Form(...),
-    colors: str = Form(...),
-    base_image_file: UploadFile = File(...)
-):
+async def run_generate_outfit_from_form(
+    client: AsyncOpenAI,
+    gender: str,
+    style: str,
+    occasion: str,
+    climate: str,
+    colors: str,
+    base_image_file: UploadFile,
+    output_format: str = "png"
+) -> dict:
     try:
-        # Imagen del usuario
-        image_file = prepare_image(base_image_file)
-
-        # 1️⃣ Texto - Outfit en español + lista de prendas
-        text_prompt = f"""
-Eres un estilista profesional.
-
-Perfil del usuario:
-- Género: {gender}
-- Estilo: {style}
-- Ocasión: {occasion}
-- Clima: {climate}
-- Colores preferidos: {colors}
-
-Describe UN outfit completo en español de manera concisa (3-4 líneas).
-Devuelve además un JSON con las prendas mencionadas, ejemplo:
-{{"prendas": ["vestido", "zapatos", "bolso"]}}
-"""
+        # Imagen del usuario (se normaliza mientras el estilista escribe)
+        image_task = asyncio.create_task(staged("image_normalized", prepare_image(base_image_file)))
 
-        text_result = client.chat.completions.create(
-            model="gpt-4.1-mini",
-            messages=[
-                {"role": "system", "content": "Eres un estilista profesional. Responde en español."},
-                {"role": "user", "content": text_prompt}
-            ],
-            max_tokens=120
-        )
-
-        raw_text = text_result.choices[0].message.content.strip()
+        # 1️⃣ Texto - Outfit en español + lista de prendas (salida estructurada, con cache)
+        profile = form_profile(gender, style, occasion, climate, colors)
 
-        # Extraer recommendation y prendas_detectadas
         try:
-            parts = raw_text.rsplit("```json", 1)
-            recommendation = parts[0].strip()
-            prendas_detectadas = json.loads(parts[1].strip().strip("```"))
-        except:
-            recommendation = raw_text
-            prendas_detectadas = {"prendas": []}
+            recommendation, prendas_task = await recommend_outfit(client, profile)
+        except BaseException:
+            image_task.cancel()
+            raise
 
         # 2️⃣ Imagen - aplicar outfit
         image_prompt = f"""
@@ -86,21 +88,91 @@ Solo cambia el outfit y el entorno según la ocasión, estilo y clima especifica
 Alta calidad, estilo editorial de moda.
 """
 
-        image_result = client.images.edit(
-            model="gpt-image-1-mini",
-            image=image_file,
-            prompt=image_prompt,
-            size="1024x1024"
-        )
+        try:
+            image_file = await image_task
+            generated_image = await image_edit_router.run(
+                client=client,
+                model="gpt-image-1-mini",
+                image=image_file,
+                prompt=image_prompt,
+                size="1024x1024",
+                output_format=output_format
+            )
+        except BaseException:
+            prendas_task.cancel()
+            raise
 
-        generated_image = image_result.data[0].b64_json
+        try:
+            prendas_detectadas = (await prendas_task)["prendas"]
+        except Exception as e:
+            logging.warning(f"[STYLIST] Garment list failed: {e}")
+            prendas_detectadas = []
 
         return {
             "status": "ok",
             "image": generated_image,
             "recommendation": recommendation,
-            "prendas_detectadas": prendas_detectadas.get("prendas", [])
+            "prendas_detectadas": prendas_detectadas
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+# =========================
+# Endpoint Mobile
+# =========================
+@router.post("/ai/generate-outfit-from-form")
+async def generate_outfit_from_form(
+    gender: str = Form(...),
+    body_traits: str = Form(...),
+    style: str = Form(...),
+    occasion: str = Form(...),
+    climate: str = Form(...),
+    colors: str = Form(...),
+    base_image_file: UploadFile = File(...),
+    user_id: str | None = Form(None),
+    job: bool = Query(False),
+    stream: bool = Query(False),
+    response_format: ResponseFormat = Query("json"),
+    client: AsyncOpenAI = Depends(get_openai_client),
+    guard: RequestGuard = Depends(request_guard)
+):
+    if job or stream:
+        base_image_file = await detach_upload(base_image_file)
+
+    output_format = upstream_output_format(response_format)
+
+    def generate():
+        return run_generate_outfit_from_form(
+            client, gender, style, occasion, climate, colors, base_image_file, output_format
+        )
+
+    # Outfit precalculado tras el registro (misma foto y mismo perfil)
+    pipeline = generate
+    if user_id:
+        photo = await base_image_file.read()
+        await base_image_file.seek(0)
+        try:
+            prefetched = await outfit_prefetcher.take(user_id, form_profile(gender, style, occasion, climate, colors), photo)
+        except Exception as e:
+            logging.warning(f"[PREFETCH] Lookup failed: {e}")
+            prefetched = None
+        if prefetched is not None:
+            pipeline = lambda: outfit_prefetcher.resolve(prefetched, generate)
+
+    if stream:
+        return image_result_stream(pipeline, response_format, guard.timeout)
+
+    result = await guard.run(run_or_submit(job, "generate-outfit-from-form", pipeline))
+    return await image_result_response(result, response_format)
+
+
+# =========================
+# Estado del prefetch de un usuario
+# =========================
+@router.get("/ai/prefetched-outfits/{user_id}")
+async def prefetched_outfits(user_id: str):
+    """Outfits precalculados tras el registro que aún no se han servido."""
+    return {"status": "ok", "user_id": user_id, "outfits": outfit_prefetcher.status(user_id)}
@@ -1,80 +1,53 @@
-from fastapi import APIRouter, HTTPException, Form
-from openai import OpenAI
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Depends, Query
+from openai import AsyncOpenAI
+from utils.upstream import get_openai_client
+from utils.request_guard import RequestGuard, request_guard
+from utils.image_providers import image_edit_router
+from utils.stylist import recommend_outfit
+from routers.image_to_image import form_profile
+from utils.progress import staged
+from utils.jobs import run_or_submit
+from utils.image_ingest import ingest_image, image_filename
+from utils.image_transport import ResponseFormat, image_input, image_result_response, image_result_stream, upstream_output_format
 from io import BytesIO
-from PIL import Image
-import base64
-import os
-import json
+import asyncio
+import logging
 
 router = APIRouter()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 # =========================
 # Helpers
 # =========================
-def prepare_image_from_b64(image_b64: str, size=1024) -> BytesIO:
-    image_bytes = base64.b64decode(image_b64)
-    image = Image.open(BytesIO(image_bytes)).convert("RGB")
-    image.thumbnail((size, size))  # Mantener proporciones
-
-    buffer = BytesIO()
-    image.save(buffer, format="PNG")
-    buffer.name = "input.png"
-    buffer.seek(0)
+async def prepare_image_from_b64(image: bytes | str, size=1024) -> BytesIO:
+    buffer = BytesIO(await ingest_image(image, size))  # Mantener proporciones
+    buffer.name = image_filename("input")
     return buffer
 
 # =========================
-# Endpoint Web
+# Pipeline
 # =========================
-@router.post("/ai/generate-outfit-from-form-web")
-async def generate_outfit_from_form_web(
-    gender: str = Form(...),
-    body_traits: str = Form(...),
-    style: str = Form(...),
-    occasion: str = Form(...),
-    climate: str = Form(...),
-    colors: str = Form(...),
-    base_image_b64: str = Form(...)
-):
+async def run_generate_outfit_from_form_web(
+    client: AsyncOpenAI,
+    gender: str,
+    style: str,
+    occasion: str,
+    climate: str,
+    colors: str,
+    base_image: bytes | str,
+    output_format: str = "png"
+) -> dict:
     try:
-        # Imagen del usuario
-        image_file = prepare_image_from_b64(base_image_b64)
-
-        # 1️⃣ Texto - Outfit en español + lista de prendas
-        text_prompt = f"""
-Eres un estilista profesional.
+        # Imagen del usuario (se normaliza mientras el estilista escribe)
+        image_task = asyncio.create_task(staged("image_normalized", prepare_image_from_b64(base_image)))
 
-Perfil del usuario:
-- Género: {gender}
-- Estilo: {style}
-- Ocasión: {occasion}
-- Clima: {climate}
-- Colores preferidos: {colors}
-
-Describe UN outfit completo en español de manera concisa (2-3 líneas).
-Devuelve además un JSON con las prendas mencionadas, ejemplo:
-{{"prendas": ["vestido", "zapatos", "bolso"]}}
-"""
+        # 1️⃣ Texto - Outfit en español + lista de prendas (salida estructurada, con cache)
+        profile = form_profile(gender, style, occasion, climate, colors, lines="2-3")
 
-        text_result = client.chat.completions.create(
-            model="gpt-4.1-mini",
-            messages=[
-                {"role": "system", "content": "Eres un estilista profesional. Responde en español."},
-                {"role": "user", "content": text_prompt}
-            ],
-            max_tokens=120
-        )
-
-        raw_text = text_result.choices[0].message.content.strip()
-
-        # Extraer recommendation y prendas_detectadas
         try:
-            parts = raw_text.rsplit("```json", 1)
-            recommendation = parts[0].strip()
-            prendas_detectadas = json.loads(parts[1].strip().strip("```"))
-        except:
-            recommendation = raw_text
-            prendas_detectadas = {"prendas": []}
+            recommendation, prendas_task = await recommend_outfit(client, profile)
+        except BaseException:
+            image_task.cancel()
+            raise
 
         # 2️⃣ Imagen - aplicar outfit
         image_prompt = f"""
@@ -87,21 +60,72 @@ Solo cambia el outfit y el entorno según la ocasión, estilo y clima especifica
 Alta calidad, estilo editorial de moda.
 """
 
-        image_result = client.images.edit(
-            model="gpt-image-1-mini",
-            image=image_file,
-            prompt=image_prompt,
-            size="1024x1024"
-        )
+        try:
+            image_file = await image_task
+            generated_image = await image_edit_router.run(
+                client=client,
+                model="gpt-image-1-mini",
+                image=image_file,
+                prompt=image_prompt,
+                size="1024x1024",
+                output_format=output_format
+            )
+        except BaseException:
+            prendas_task.cancel()
+            raise
 
-        generated_image = image_result.data[0].b64_json
+        try:
+            prendas_detectadas = (await prendas_task)["prendas"]
+        except Exception as e:
+            logging.warning(f"[STYLIST] Garment list failed: {e}")
+            prendas_detectadas = []
 
         return {
             "status": "ok",
             "image": generated_image,
             "recommendation": recommendation,
-            "prendas_detectadas": prendas_detectadas.get("prendas", [])
+            "prendas_detectadas": prendas_detectadas
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+# =========================
+# Endpoint Web
+# =========================
+@router.post("/ai/generate-outfit-from-form-web")
+async def generate_outfit_from_form_web(
+    gender: str = Form(...),
+    body_traits: str = Form(...),
+    style: str = Form(...),
+    occasion: str = Form(...),
+    climate: str = Form(...),
+    colors: str = Form(...),
+    base_image: UploadFile | None = File(None),
+    base_image_b64: str | None = Form(None),
+    job: bool = Query(False),
+    stream: bool = Query(False),
+    response_format: ResponseFormat = Query("json"),
+    client: AsyncOpenAI = Depends(get_openai_client),
+    guard: RequestGuard = Depends(request_guard)
+):
+    image = await image_input(base_image, base_image_b64, "base_image")
+    output_format = upstream_output_format(response_format)
+
+    if stream:
+        return image_result_stream(
+            lambda: run_generate_outfit_from_form_web(
+                client, gender, style, occasion, climate, colors, image, output_format
+            ),
+            response_format, guard.timeout
+        )
+
+    result = await guard.run(run_or_submit(
+        job, "generate-outfit-from-form-web",
+        lambda: run_generate_outfit_from_form_web(
+            client, gender, style, occasion, climate, colors, image, output_format
+        )
+    ))
+    return await image_result_response(result, response_format)
@@ -0,0 +1,21 @@
+from fastapi import APIRouter, HTTPException, Query
+from utils.jobs import job_manager
+from utils.image_transport import ResponseFormat, image_result_response
+
+router = APIRouter()
+
+# =========================
+# Estado / resultado de un job
+# =========================
+@router.get("/jobs/{job_id}")
+async def get_job(
+    job_id: str,
+    wait: float = Query(0, ge=0, description="Segundos de long-poll hasta que el job termine"),
+    response_format: ResponseFormat = Query("json", description="png | webp: imagen en binario; url: enlace al result store")
+):
+    job = await job_manager.wait(job_id, wait) if wait else await job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if response_format != "json" and job["status"] == "succeeded":
+        return await image_result_response(job["result"], response_format)
+    return job
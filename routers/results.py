@@ -0,0 +1,90 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response, FileResponse
+from utils.result_store import result_store, MIME_BY_EXTENSION, RESULT_STORE_ACCEL_PREFIX
+import asyncio
+import os
+import re
+
+router = APIRouter()
+
+_NAME = re.compile(r"([0-9a-f]{64})\.(png|webp|jpg)")
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)")
+
+# =========================
+# Helpers
+# =========================
+def parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """
+    Un solo rango "bytes=a-b", "bytes=a-" o "bytes=-n".
+    Devuelve (inicio, fin) inclusivo, o None si no se puede satisfacer.
+    Lanza ValueError si el header no es un rango simple (se ignora).
+    """
+    match = _RANGE.fullmatch(header.strip())
+    if not match or match.group(1) == match.group(2) == "":
+        raise ValueError("Unsupported range")
+    first, last = match.groups()
+    if first == "":
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        return None
+    return start, end
+
+
+def read_range(path: str, start: int, end: int) -> bytes:
+    with open(path, "rb") as f:
+        f.seek(start)
+        return f.read(end - start + 1)
+
+# =========================
+# Resultado generado (inmutable)
+# =========================
+@router.get("/results/{name}")
+async def get_result(name: str, request: Request):
+    match = _NAME.fullmatch(name)
+    if not match or not await result_store.atouch(name):
+        raise HTTPException(status_code=404, detail="Result not found")
+
+    digest, ext = match.groups()
+    media_type = MIME_BY_EXTENSION[ext]
+    headers = {
+        "ETag": f'"{digest}"',
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "Accept-Ranges": "bytes",
+    }
+
+    # El contenido nunca cambia: cualquier ETag conocido es válido
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match.strip() == "*" or f'"{digest}"' in if_none_match:
+        return Response(status_code=304, headers=headers)
+
+    if RESULT_STORE_ACCEL_PREFIX:
+        # nginx sirve el archivo con sendfile; aquí solo se valida y se firma
+        headers["X-Accel-Redirect"] = f"{RESULT_STORE_ACCEL_PREFIX.rstrip('/')}/{name[:2]}/{name}"
+        return Response(headers=headers, media_type=media_type)
+
+    path = result_store.path(name)
+    try:
+        stat = await asyncio.to_thread(os.stat, path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Result not found")
+
+    range_header = request.headers.get("range")
+    if range_header:
+        try:
+            byte_range = parse_range(range_header, stat.st_size)
+        except ValueError:
+            byte_range = (0, stat.st_size - 1)
+            range_header = None
+        if byte_range is None:
+            headers["Content-Range"] = f"bytes */{stat.st_size}"
+            return Response(status_code=416, headers=headers)
+        if range_header:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+            data = await asyncio.to_thread(read_range, path, start, end)
+            return Response(content=data, status_code=206, media_type=media_type, headers=headers)
+
+    return FileResponse(path, media_type=media_type, headers=headers, stat_result=stat)
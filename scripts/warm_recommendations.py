@@ -0,0 +1,92 @@
+# scripts/warm_recommendations.py
+# Uso: RECOMMENDATION_CACHE_DB=... python -m scripts.warm_recommendations [--combos combos.json] [--top 200]
+#
+# Precalcula variantes del estilista para los perfiles más pedidos (según la
+# demanda registrada en la cache) y/o los de un JSON con una lista de
+# {"gender", "style", "occasion", "climate", "colors"}. Sin ninguno de los
+# dos usa una rejilla con los valores por defecto de los desplegables.
+import sys
+import json
+import asyncio
+import argparse
+import itertools
+import logging
+
+from utils.upstream import init_upstream, close_upstream, get_openai_client
+from utils.recommendation_cache import recommendation_cache, recommendation_key, profile_from_key
+from utils.stylist import generate_outfit
+
+DEFAULT_GRID = {
+    "gender": ["female", "male"],
+    "style": ["casual", "formal", "elegante", "deportivo"],
+    "occasion": ["trabajo", "fiesta", "cita", "diario"],
+    "climate": ["calido", "templado", "frio"],
+    "colors": ["neutros"],
+}
+CHANNELS = ["3-4", "2-3"]  # líneas del prompt: mobile, web
+
+
+def default_profiles() -> list[dict]:
+    names = list(DEFAULT_GRID)
+    return [dict(zip(names, values)) for values in itertools.product(*DEFAULT_GRID.values())]
+
+
+async def warm(profiles: list[dict], concurrency: int) -> tuple[int, int]:
+    client = get_openai_client()
+    semaphore = asyncio.Semaphore(concurrency)
+    generated = failed = 0
+
+    async def fill(profile: dict):
+        nonlocal generated, failed
+        key = recommendation_key(profile)
+        async with semaphore:
+            # hasta 2 intentos extra por si el modelo repite un outfit ya guardado
+            for _ in range(recommendation_cache.variants + 2):
+                _, variants = await asyncio.to_thread(recommendation_cache.get, key, False)
+                if variants >= recommendation_cache.variants:
+                    return
+                try:
+                    await generate_outfit(client, profile)
+                    generated += 1
+                except Exception as e:
+                    failed += 1
+                    logging.warning(f"[WARMUP] {key}: {e}")
+                    return
+
+    await asyncio.gather(*(fill(p) for p in profiles))
+    return generated, failed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Warm up the stylist recommendation cache")
+    parser.add_argument("--combos", help="JSON file with a list of form profiles")
+    parser.add_argument("--top", type=int, default=200, help="most requested profiles to refresh")
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    if not recommendation_cache.stats()["disk_enabled"]:
+        sys.exit("RECOMMENDATION_CACHE_DB is not set: the warm-up would not persist anything")
+
+    profiles = [profile_from_key(key) for key in recommendation_cache.top_keys(args.top)]
+    if args.combos:
+        with open(args.combos) as f:
+            combos = json.load(f)
+        profiles += [{**combo, "lines": channel} for combo in combos for channel in CHANNELS]
+    if not profiles:
+        profiles = [{**combo, "lines": channel} for combo in default_profiles() for channel in CHANNELS]
+
+    # sin duplicados tras normalizar
+    profiles = list({recommendation_key(p): p for p in profiles}.values())
+    recommendation_cache.purge()
+
+    await init_upstream()
+    try:
+        generated, failed = await warm(profiles, args.concurrency)
+    finally:
+        await close_upstream()
+    print(f"profiles={len(profiles)} generated={generated} failed={failed}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,166 @@
+# tests/test_admission.py
+import asyncio
+import pytest
+from fastapi import HTTPException
+
+from utils.admission import AdmissionController, mark_background
+
+
+def controller(max_in_flight: int = 2, max_queue: int = 4, max_wait: float = 1.0) -> AdmissionController:
+    return AdmissionController("test", max_in_flight=max_in_flight, max_queue=max_queue, max_wait=max_wait)
+
+
+async def hold(gate: asyncio.Event, label: str | None = None):
+    await gate.wait()
+    return label
+
+
+async def record(log: list, label: str):
+    log.append(label)
+    await asyncio.sleep(0)
+    return label
+
+
+def test_limits_concurrency_and_queues_the_rest():
+    async def scenario():
+        c = controller(max_in_flight=2)
+        peak = 0
+
+        async def call():
+            nonlocal peak
+            peak = max(peak, c.in_flight)
+            await asyncio.sleep(0.01)
+            return "ok"
+
+        results = await asyncio.gather(*(c.run(call()) for _ in range(6)))
+        assert results == ["ok"] * 6
+        assert peak == 2
+        assert c.in_flight == 0 and c.stats()["queued"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_is_shed_with_retry_after():
+    async def scenario():
+        c = controller(max_in_flight=1, max_queue=1)
+        gate = asyncio.Event()
+        running = asyncio.create_task(c.run(hold(gate)))
+        queued = asyncio.create_task(c.run(hold(gate)))
+        await asyncio.sleep(0.01)
+
+        with pytest.raises(HTTPException) as exc:
+            await c.run(hold(gate))
+        assert exc.value.status_code == 503
+        assert int(exc.value.headers["Retry-After"]) >= 1
+        assert c.rejected == 1
+
+        gate.set()
+        await asyncio.gather(running, queued)
+        assert c.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_queue_wait_times_out_with_503():
+    async def scenario():
+        c = controller(max_in_flight=1, max_wait=0.02)
+        gate = asyncio.Event()
+        running = asyncio.create_task(c.run(hold(gate)))
+        await asyncio.sleep(0.01)
+
+        with pytest.raises(HTTPException) as exc:
+            await c.run(hold(gate))
+        assert exc.value.status_code == 503
+        assert c.timed_out == 1
+
+        gate.set()
+        await running
+        assert c.in_flight == 0 and c.stats()["queued"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    async def scenario():
+        c = controller(max_in_flight=1)
+        gate = asyncio.Event()
+        running = asyncio.create_task(c.run(hold(gate)))
+        await asyncio.sleep(0.01)
+        waiting = asyncio.create_task(c.run(hold(gate)))
+        await asyncio.sleep(0.01)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+
+        gate.set()
+        await running
+        assert c.in_flight == 0
+        assert await c.run(hold(gate, label="after")) == "after"
+
+    asyncio.run(scenario())
+
+
+def test_background_lane_uses_at_most_its_share():
+    async def scenario():
+        c = controller(max_in_flight=4)
+        peak = 0
+
+        async def background_call():
+            nonlocal peak
+            mark_background()
+            async def work():
+                nonlocal peak
+                peak = max(peak, c.background_in_flight)
+                await asyncio.sleep(0.01)
+            await c.run(work())
+
+        await asyncio.gather(*(asyncio.create_task(background_call()) for _ in range(6)))
+        assert peak == c.max_background < c.max_in_flight
+        assert c.in_flight == 0 and c.background_in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_freed_slot_goes_to_interactive_before_background():
+    async def scenario():
+        c = controller(max_in_flight=1)
+        gate = asyncio.Event()
+        order = []
+        running = asyncio.create_task(c.run(hold(gate)))
+        await asyncio.sleep(0.01)
+
+        async def background_call():
+            mark_background()
+            await c.run(record(order, "background"))
+
+        background = asyncio.create_task(background_call())
+        await asyncio.sleep(0.01)  # el de fondo llega primero
+        interactive = asyncio.create_task(c.run(record(order, "interactive")))
+        await asyncio.sleep(0.01)
+
+        gate.set()
+        await asyncio.gather(running, background, interactive)
+        assert order == ["interactive", "background"]
+
+    asyncio.run(scenario())
+
+
+def test_background_is_never_shed():
+    async def scenario():
+        c = controller(max_in_flight=1, max_queue=0, max_wait=0.01)
+        gate = asyncio.Event()
+        running = asyncio.create_task(c.run(hold(gate)))
+        await asyncio.sleep(0.01)
+
+        async def background_call():
+            mark_background()
+            return await c.run(record([], "background"))
+
+        background = asyncio.create_task(background_call())
+        await asyncio.sleep(0.05)  # más que max_wait: sigue esperando, sin 503
+        assert not background.done()
+        gate.set()
+        assert await background == "background"
+        await running
+
+    asyncio.run(scenario())
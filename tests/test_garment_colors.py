@@ -0,0 +1,64 @@
+# tests/test_garment_colors.py
+import numpy as np
+
+from utils.garment_colors import GARMENT_COLOR_SIZE, NAMED_COLORS, analyze_garment_colors
+
+RED = (200, 30, 35)
+BLUE = (40, 90, 200)  # misma luminancia que RED (L ~ 43-45)
+BACKGROUND = (240, 240, 238)
+
+
+def garment(color: tuple, stripes: tuple | None = None, vertical: bool = False, seed: int = 0) -> np.ndarray:
+    """Prenda rectangular centrada sobre fondo claro, ya al tamaño de análisis."""
+    size = GARMENT_COLOR_SIZE
+    pixels = np.full((size, size, 3), BACKGROUND, np.float64)
+    body = np.full((size, size, 3), color, np.float64)
+    if stripes:
+        band = (np.arange(size) // 6) % 2 == 1
+        if vertical:
+            body[:, band] = stripes
+        else:
+            body[band] = stripes
+    lo, hi = size // 6, size - size // 6
+    pixels[lo:hi, lo:hi] = body[lo:hi, lo:hi]
+    noise = np.random.default_rng(seed).normal(0, 1, pixels.shape)  # ruido de sensor ya promediado
+    return np.clip(pixels + noise, 0, 255).astype(np.uint8)
+
+
+def test_solid_garment():
+    (result,) = analyze_garment_colors([garment(RED)])
+    assert result["main_color"] == "red"
+    assert result["secondary_color"] is None
+    assert result["pattern"] == "solid"
+
+
+def test_light_and_dark_stripes():
+    (result,) = analyze_garment_colors([garment((25, 35, 80), stripes=(245, 245, 245))])
+    assert result["pattern"] == "horizontal stripes"
+
+
+def test_equal_luminance_stripes_are_not_solid():
+    # regresión: solo con L salía ('blue', 'red', 'solid')
+    (result,) = analyze_garment_colors([garment(RED, stripes=BLUE, vertical=True)])
+    assert {result["main_color"], result["secondary_color"]} == {"red", "blue"}
+    assert result["pattern"] == "vertical stripes"
+
+
+def test_never_solid_with_a_secondary_color():
+    results = analyze_garment_colors([
+        garment(RED, stripes=BLUE), garment(RED, stripes=BLUE, vertical=True), garment(RED, stripes=(245, 245, 245)),
+    ])
+    for result in results:
+        assert result["secondary_color"] is not None
+        assert result["pattern"] != "solid"
+
+
+def test_multicolour_garment_keeps_a_main_color():
+    # regresión: ningún color llegaba al 5 % y colors[0] lanzaba IndexError
+    palette = np.array(list(NAMED_COLORS.values()), np.uint8)
+    cells = np.arange((GARMENT_COLOR_SIZE // 4) ** 2) % len(palette)  # todos los colores por igual (~4 %)
+    blocks = palette[cells].reshape(GARMENT_COLOR_SIZE // 4, GARMENT_COLOR_SIZE // 4, 3)
+    pixels = blocks.repeat(4, axis=0).repeat(4, axis=1)
+    (result,) = analyze_garment_colors([pixels])
+    assert result["main_color"]
+    assert len(result["colors"]) >= 1
@@ -0,0 +1,60 @@
+# tests/test_garment_index.py
+from io import BytesIO
+import cv2
+import numpy as np
+from PIL import Image
+
+from utils.garment_index import GarmentHashIndex, garment_fingerprint
+
+
+def tee_photo(color: tuple, logo: tuple | None = None, size: tuple = (600, 800), quality: int = 90) -> bytes:
+    """Camiseta lisa centrada sobre fondo claro; opcionalmente con un logo grande en el pecho."""
+    width, height = size
+    pixels = np.full((height, width, 3), (240, 240, 238), np.uint8)
+    outline = np.array([
+        (0.30, 0.15), (0.70, 0.15), (0.90, 0.30), (0.78, 0.38), (0.72, 0.33),
+        (0.72, 0.88), (0.28, 0.88), (0.28, 0.33), (0.22, 0.38), (0.10, 0.30),
+    ]) * (width, height)
+    cv2.fillPoly(pixels, [outline.astype(np.int32)], color)
+    if logo:
+        cv2.rectangle(pixels, (int(width * 0.40), int(height * 0.28)), (int(width * 0.60), int(height * 0.40)), logo, -1)
+    buffer = BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def indexed(photo: bytes) -> GarmentHashIndex:
+    index = GarmentHashIndex(max_items=100)
+    index.add(*garment_fingerprint(photo), "plain red tee", "top")
+    return index
+
+
+def test_same_garment_reencoded_and_resized_matches():
+    index = indexed(tee_photo((200, 30, 35)))
+    match = index.lookup(*garment_fingerprint(tee_photo((200, 30, 35), size=(300, 400), quality=60)), "top")
+    assert match is not None and match[0] == "plain red tee"
+
+
+def test_small_crop_matches():
+    index = indexed(tee_photo((200, 30, 35)))
+    image = Image.open(BytesIO(tee_photo((200, 30, 35))))
+    buffer = BytesIO()
+    image.crop((12, 16, 588, 784)).save(buffer, format="JPEG", quality=85)
+    assert index.lookup(*garment_fingerprint(buffer.getvalue()), "top") is not None
+
+
+def test_same_cut_in_another_color_misses():
+    index = indexed(tee_photo((200, 30, 35)))
+    for color in ((40, 140, 60), (25, 35, 80), (20, 20, 20)):
+        assert index.lookup(*garment_fingerprint(tee_photo(color)), "top") is None
+
+
+def test_large_chest_logo_misses():
+    # regresión: dHash a distancia 4 y color medio de la prenda a ~6 ΔE de la lisa
+    index = indexed(tee_photo((200, 30, 35)))
+    assert index.lookup(*garment_fingerprint(tee_photo((200, 30, 35), logo=(245, 245, 245))), "top") is None
+
+
+def test_other_category_misses():
+    index = indexed(tee_photo((200, 30, 35)))
+    assert index.lookup(*garment_fingerprint(tee_photo((200, 30, 35))), "bottom") is None
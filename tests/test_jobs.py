@@ -0,0 +1,82 @@
+# tests/test_jobs.py
+import asyncio
+import base64
+import pytest
+
+import utils.image_transport as image_transport
+from utils.jobs import InMemoryJobStore, JobManager, JobStore
+from utils.result_store import ResultStore
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"x" * 1000
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    result_store = ResultStore(str(tmp_path))
+    monkeypatch.setattr(image_transport, "result_store", result_store)
+    return result_store
+
+
+def test_incomplete_store_fails_on_creation():
+    class Partial(JobStore):
+        async def create(self, job: dict):
+            pass
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_finished_job_keeps_only_the_result_store_name(store):
+    async def scenario():
+        manager = JobManager(InMemoryJobStore(), workers=1, queue_size=4)
+
+        async def pipeline():
+            return {"status": "ok", "image": base64.b64encode(PNG).decode()}
+
+        job_id = await manager.submit("test", pipeline)
+        job = await manager.wait(job_id, 5)
+        raw = await manager.store.get(job_id)
+        await manager.stop()
+        return job, raw
+
+    job, raw = asyncio.run(scenario())
+    assert job["status"] == "succeeded"
+    assert base64.b64decode(job["result"]["image"]) == PNG
+    # en memoria del proceso solo queda el nombre del blob
+    assert "image" not in raw["result"]
+    assert store.touch(raw["result"]["image_name"])
+
+
+def test_evicted_result_is_reported_as_expired(store):
+    async def scenario():
+        manager = JobManager(InMemoryJobStore(), workers=1, queue_size=4)
+
+        async def pipeline():
+            return {"status": "ok", "image": base64.b64encode(PNG).decode()}
+
+        job_id = await manager.submit("test", pipeline)
+        await manager.wait(job_id, 5)
+        store.max_bytes = 0
+        store.put(b"other blob", "image/png")  # desaloja el resultado del job
+        job = await manager.get(job_id)
+        await manager.stop()
+        return job
+
+    job = asyncio.run(scenario())
+    assert job["status"] == "failed"
+    assert job["error"]["status_code"] == 410
+
+
+def test_results_without_image_pass_through(store):
+    async def scenario():
+        manager = JobManager(InMemoryJobStore(), workers=1, queue_size=4)
+
+        async def pipeline():
+            return {"status": "ok", "description": "red tee"}
+
+        job_id = await manager.submit("test", pipeline)
+        job = await manager.wait(job_id, 5)
+        await manager.stop()
+        return job
+
+    assert asyncio.run(scenario())["result"] == {"status": "ok", "description": "red tee"}
@@ -0,0 +1,185 @@
+# tests/test_provider_router.py
+import asyncio
+import httpx
+import openai
+import pytest
+from fastapi import HTTPException
+
+import utils.provider_router as provider_router
+from utils.provider_router import BREAKER_CONSECUTIVE_FAILURES, Provider, ProviderError, ProviderRouter
+
+
+def api_error(status: int) -> openai.APIStatusError:
+    response = httpx.Response(status, request=httpx.Request("POST", "http://upstream"))
+    return openai.APIStatusError("upstream error", response=response, body=None)
+
+
+def provider(name: str, result="img", error: BaseException | None = None, delay: float = 0.0) -> Provider:
+    async def call(request: dict):
+        call.calls += 1
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return result
+
+    call.calls = 0
+    return Provider(name, call)
+
+
+def test_failure_fails_over_to_the_next_provider():
+    primary = provider("primary", error=api_error(500))
+    fallback = provider("fallback", result="fallback-img")
+    router = ProviderRouter("test", [primary, fallback], hedging=False)
+
+    assert asyncio.run(router.run(prompt="x")) == "fallback-img"
+    assert primary.health.failures == 1
+    assert fallback.health.successes == 1
+
+
+def test_empty_result_counts_as_failure():
+    primary = provider("primary", result=None)
+    fallback = provider("fallback")
+    router = ProviderRouter("test", [primary, fallback], hedging=False)
+
+    assert asyncio.run(router.run()) == "img"
+    assert primary.health.failures == 1
+
+
+def test_client_error_is_not_retried_elsewhere():
+    primary = provider("primary", error=api_error(400))
+    fallback = provider("fallback")
+    router = ProviderRouter("test", [primary, fallback], hedging=False)
+
+    with pytest.raises(openai.APIStatusError):
+        asyncio.run(router.run())
+    assert fallback.call.calls == 0
+    # la petición era inválida: el proveedor no está enfermo
+    assert primary.health.failures == 0 and primary.health.state == "closed"
+
+
+def test_rate_limit_fails_over():
+    primary = provider("primary", error=api_error(429))
+    fallback = provider("fallback")
+    router = ProviderRouter("test", [primary, fallback], hedging=False)
+
+    assert asyncio.run(router.run()) == "img"
+    assert primary.health.failures == 1
+
+
+def test_all_providers_failing_raises_the_last_error():
+    router = ProviderRouter("test", [provider("a", result=None), provider("b", error=api_error(502))], hedging=False)
+    with pytest.raises(openai.APIStatusError):
+        asyncio.run(router.run())
+
+
+def test_breaker_opens_then_half_opens_and_closes_on_probe_success(monkeypatch):
+    monkeypatch.setattr(provider_router, "BREAKER_COOLDOWN", 0.02)
+    failing = provider("flaky", error=api_error(500))
+    fallback = provider("fallback")
+    router = ProviderRouter("test", [failing, fallback], hedging=False)
+
+    async def scenario():
+        for _ in range(BREAKER_CONSECUTIVE_FAILURES):
+            await router.run()
+        assert failing.health.state == "open"
+
+        # abierto: se salta sin llamarlo
+        calls = failing.call.calls
+        await router.run()
+        assert failing.call.calls == calls
+
+        await asyncio.sleep(0.03)
+        assert failing.health.allow()
+        assert failing.health.state == "half_open"
+        assert not failing.health.allow()  # una sola sonda a la vez
+        failing.health.record_success(0.1)
+        assert failing.health.state == "closed"
+
+    asyncio.run(scenario())
+
+
+def test_failed_probe_reopens_the_breaker(monkeypatch):
+    monkeypatch.setattr(provider_router, "BREAKER_COOLDOWN", 0.02)
+    failing = provider("flaky", error=api_error(500))
+    router = ProviderRouter("test", [failing, provider("fallback")], hedging=False)
+
+    async def scenario():
+        for _ in range(BREAKER_CONSECUTIVE_FAILURES):
+            await router.run()
+        first_opened = failing.health.opened_at
+        await asyncio.sleep(0.03)
+
+        calls = failing.call.calls
+        assert await router.run() == "img"  # la sonda falla y pasa al siguiente
+        assert failing.call.calls == calls + 1
+        assert failing.health.state == "open"
+        assert failing.health.opened_at > first_opened
+
+    asyncio.run(scenario())
+
+
+def test_abandoned_probe_frees_the_half_open_slot(monkeypatch):
+    monkeypatch.setattr(provider_router, "BREAKER_COOLDOWN", 0.0)
+    health = provider("p").health
+    health._trip()
+    assert health.allow() and health.state == "half_open"
+    health.record_abandoned()
+    assert health.allow()
+
+
+def test_no_healthy_provider_is_a_503():
+    unavailable = Provider("off", provider("off").call, available=lambda: False)
+    router = ProviderRouter("test", [unavailable], hedging=False)
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(router.run())
+    assert exc.value.status_code == 503
+
+
+def warm_up(p: Provider, latency: float):
+    for _ in range(provider_router.PROVIDER_HEDGE_MIN_SAMPLES):
+        p.health.record_success(latency)
+
+
+def test_hedge_starts_the_next_provider_after_p95(monkeypatch):
+    monkeypatch.setattr(provider_router, "PROVIDER_HEDGE_MIN_DELAY", 0.0)
+    slow = provider("slow", result="slow-img", delay=1.0)
+    fast = provider("fast", result="fast-img", delay=0.01)
+    warm_up(slow, 0.02)
+    router = ProviderRouter("test", [slow, fast], hedging=True)
+
+    async def scenario():
+        result = await router.run()
+        await asyncio.sleep(0)  # deja que el perdedor procese la cancelación
+        return result
+
+    assert asyncio.run(scenario()) == "fast-img"
+    assert router.hedges == 1
+    assert fast.call.calls == 1
+    # el perdedor se cancela sin contar como fallo
+    assert slow.health.failures == 0 and slow.health.state == "closed"
+
+
+def test_no_hedge_when_the_primary_answers_in_time(monkeypatch):
+    monkeypatch.setattr(provider_router, "PROVIDER_HEDGE_MIN_DELAY", 0.0)
+    primary = provider("primary", delay=0.01)
+    backup = provider("backup")
+    warm_up(primary, 0.2)
+    router = ProviderRouter("test", [primary, backup], hedging=True)
+
+    assert asyncio.run(router.run()) == "img"
+    assert router.hedges == 0 and backup.call.calls == 0
+
+
+def test_no_hedge_without_enough_latency_samples():
+    slow = provider("slow", delay=0.05)
+    backup = provider("backup")
+    router = ProviderRouter("test", [slow, backup], hedging=True)
+
+    assert asyncio.run(router.run()) == "img"
+    assert router.hedges == 0 and backup.call.calls == 0
+
+
+def test_provider_error_is_raised_for_empty_results():
+    router = ProviderRouter("test", [provider("only", result="")], hedging=False)
+    with pytest.raises(ProviderError):
+        asyncio.run(router.run())
@@ -0,0 +1,22 @@
+# tests/test_recommendation_cache.py
+from utils.recommendation_cache import RecommendationCache, recommendation_key
+
+
+def profile(style: str, colors: str = "neutros") -> dict:
+    return {"lines": "3-4", "gender": "mujer", "style": style, "occasion": "diario", "climate": "templado", "colors": colors}
+
+
+def test_demand_counters_are_bounded_and_keep_the_most_requested():
+    cache = RecommendationCache(max_keys=16, db_path=None, max_demand_keys=10)
+    popular = recommendation_key(profile("casual"))
+    for _ in range(5):
+        cache.get(popular)
+    # estilos de texto libre: cada uno es una clave nueva
+    for i in range(100):
+        cache.get(recommendation_key(profile(f"estilo {i}")))
+    assert cache.stats()["demand_keys"] <= 10
+    assert cache.top_keys(1) == [popular]
+
+
+def test_equivalent_profiles_share_a_key():
+    assert recommendation_key(profile("Casual", "Negro y Blanco")) == recommendation_key(profile("casual ", "blanco, negro"))
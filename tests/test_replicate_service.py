@@ -0,0 +1,73 @@
+# tests/test_replicate_service.py
+import asyncio
+import base64
+import httpx
+import pytest
+
+import utils.replicate_service as replicate_service
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"x" * 1000
+
+
+class FakePrediction:
+    def __init__(self, input: dict, ticks: int):
+        self.id = "p1"
+        self.input = input
+        self.status = "starting"
+        self.ticks = ticks
+        self.output = None
+        self.error = None
+        self.canceled = False
+
+    async def async_reload(self):
+        self.ticks -= 1
+        if self.ticks <= 0 and self.status != "canceled":
+            self.status = "succeeded"
+            self.output = ["https://cdn.example/out.png"]
+        else:
+            self.status = "processing"
+
+    async def async_cancel(self):
+        self.canceled = True
+        self.status = "canceled"
+
+
+class FakePredictions:
+    def __init__(self, ticks: int):
+        self.ticks = ticks
+        self.last = None
+
+    async def async_create(self, model: str, input: dict):
+        self.last = FakePrediction(input, self.ticks)
+        return self.last
+
+
+class FakeReplicate:
+    def __init__(self, ticks: int = 2):
+        self.predictions = FakePredictions(ticks)
+
+
+@pytest.fixture
+def fake_replicate(monkeypatch):
+    client = FakeReplicate()
+    http = httpx.AsyncClient(transport=httpx.MockTransport(
+        lambda request: httpx.Response(200, content=PNG, headers={"content-type": "image/png"})
+    ))
+    monkeypatch.setattr(replicate_service, "get_replicate_client", lambda: client)
+    monkeypatch.setattr(replicate_service, "get_http_client", lambda: http)
+    monkeypatch.setattr(replicate_service, "REPLICATE_POLL_INTERVAL", 0.001)
+    return client
+
+
+@pytest.mark.parametrize("requested, sent", [("png", "png"), ("webp", "png"), ("jpeg", "jpg")])
+def test_edit_sends_an_output_format_the_model_accepts(fake_replicate, requested, sent):
+    result = asyncio.run(replicate_service.replicate_edit_image(b"img", "prompt", requested))
+    assert base64.b64decode(result) == PNG
+    assert fake_replicate.predictions.last.input["output_format"] == sent
+
+
+def test_timeout_cancels_the_prediction(fake_replicate, monkeypatch):
+    fake_replicate.predictions.ticks = 10_000
+    monkeypatch.setattr(replicate_service, "REPLICATE_TIMEOUT", 0.02)
+    assert asyncio.run(replicate_service.replicate_edit_image(b"img", "prompt")) is None
+    assert fake_replicate.predictions.last.canceled
@@ -0,0 +1,161 @@
+# tests/test_single_flight.py
+import asyncio
+from io import BytesIO
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from utils.single_flight import SingleFlight, idempotent, request_fingerprint
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_concurrent_calls_share_one_run():
+    async def scenario():
+        flight = SingleFlight("test")
+        runs = 0
+
+        async def work():
+            nonlocal runs
+            runs += 1
+            await asyncio.sleep(0.01)
+            return "done"
+
+        results = await asyncio.gather(*(flight.do("k", work) for _ in range(5)))
+        assert results == ["done"] * 5
+        assert runs == 1
+        assert flight.stats()["coalesced"] == 4
+        assert flight.stats()["in_flight"] == 0
+
+    run(scenario())
+
+
+def test_exception_reaches_every_waiter():
+    async def scenario():
+        flight = SingleFlight("test")
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        results = await asyncio.gather(*(flight.do("k", fail) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(r, ValueError) for r in results)
+
+    run(scenario())
+
+
+def test_cancelling_one_waiter_keeps_the_shared_call():
+    async def scenario():
+        flight = SingleFlight("test")
+
+        async def work():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        first = asyncio.create_task(flight.do("k", work))
+        second = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        assert await second == "done"
+
+    run(scenario())
+
+
+def test_retry_after_last_waiter_cancels_starts_a_fresh_run():
+    async def scenario():
+        flight = SingleFlight("test")
+        unwinding = asyncio.Event()
+
+        async def slow():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                unwinding.set()
+                await asyncio.sleep(0.05)  # limpieza lenta: la tarea sigue viva un rato
+                raise
+
+        async def fast():
+            return "fresh"
+
+        waiter = asyncio.create_task(flight.do("k", slow))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        await unwinding.wait()
+        # la tarea cancelada aún no terminó: el reintento no debe unirse a ella
+        assert await flight.do("k", fast) == "fresh"
+        await asyncio.sleep(0.06)
+        assert flight.stats()["in_flight"] == 0
+
+    run(scenario())
+
+
+def test_replay_returns_the_finished_result_until_ttl():
+    async def scenario():
+        flight = SingleFlight("test", replay_ttl=0.05, max_replay=10)
+        runs = 0
+
+        async def work():
+            nonlocal runs
+            runs += 1
+            return runs
+
+        assert await flight.do("k", work) == 1
+        assert await flight.do("k", work) == 1
+        assert flight.stats()["replayed"] == 1
+        await asyncio.sleep(0.06)
+        assert await flight.do("k", work) == 2
+
+    run(scenario())
+
+
+def test_idempotency_replay_requires_the_same_inputs():
+    async def scenario():
+        runs = 0
+
+        async def work():
+            nonlocal runs
+            runs += 1
+            return {"image": f"result {runs}"}
+
+        first = await idempotent("key-replay", "test", work, inputs=("red dress", b"photo"))
+        again = await idempotent("key-replay", "test", work, inputs=("red dress", b"photo"))
+        assert again == first and runs == 1
+
+        # regresión: misma clave con otra descripción devolvía el primer resultado
+        with pytest.raises(HTTPException) as exc:
+            await idempotent("key-replay", "test", work, inputs=("blue dress", b"photo"))
+        assert exc.value.status_code == 422
+        assert runs == 1
+
+    run(scenario())
+
+
+def test_idempotency_key_reused_while_in_flight_is_a_conflict():
+    async def scenario():
+        async def slow():
+            await asyncio.sleep(0.05)
+            return {"image": "x"}
+
+        first = asyncio.create_task(idempotent("key-flight", "test", slow, inputs=("red dress",)))
+        await asyncio.sleep(0.01)
+        with pytest.raises(HTTPException) as exc:
+            await idempotent("key-flight", "test", slow, inputs=("blue dress",))
+        assert exc.value.status_code == 409
+        assert await first == {"image": "x"}
+
+    run(scenario())
+
+
+def test_request_fingerprint_reads_uploads_without_consuming_them():
+    async def scenario():
+        upload = UploadFile(file=BytesIO(b"photo bytes"), filename="p.png")
+        same = await request_fingerprint(upload, "desc")
+        assert await upload.read() == b"photo bytes"
+        other = await request_fingerprint(UploadFile(file=BytesIO(b"other"), filename="p.png"), "desc")
+        assert same != other
+        assert same == await request_fingerprint(b"photo bytes", "desc")
+
+    run(scenario())
@@ -0,0 +1,26 @@
+# tests/test_stylist.py
+import asyncio
+
+import utils.stylist as stylist
+from utils.admission import _background
+from utils.progress import _events
+
+
+def test_variant_refill_runs_in_background_without_the_request_stream(monkeypatch):
+    seen = {}
+
+    async def fake_generate(client, profile):
+        seen["background"] = _background.get()
+        seen["events"] = _events.get()
+        return {"recommendation": "x", "prendas": []}
+
+    monkeypatch.setattr(stylist, "generate_outfit", fake_generate)
+
+    async def scenario():
+        _events.set(asyncio.Queue())  # petición con streaming activo
+        stylist._schedule_refill(None, {"style": "casual"}, "refill-key")
+        await stylist._refilling["refill-key"]
+        assert _background.get() is False  # la petición sigue siendo interactiva
+
+    asyncio.run(scenario())
+    assert seen == {"background": True, "events": None}
@@ -0,0 +1,27 @@
+# tests/test_upstream.py
+import asyncio
+import pytest
+
+import utils.upstream as upstream
+
+
+def test_replicate_pool_is_owned_and_closed_by_the_registry(monkeypatch):
+    pytest.importorskip("replicate")
+    monkeypatch.setattr(upstream, "REPLICATE_API_TOKEN", "r8_test")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+
+    async def scenario():
+        clients = upstream.UpstreamClients()
+        transport = clients._replicate_transport
+        closed = []
+        original = transport.aclose
+
+        async def aclose():
+            closed.append(True)
+            await original()
+
+        monkeypatch.setattr(transport, "aclose", aclose)
+        await clients.aclose()
+        assert closed == [True]
+
+    asyncio.run(scenario())
@@ -0,0 +1,231 @@
+# utils/admission.py
+import os
+import json
+import math
+import time
+import asyncio
+import logging
+from collections import deque
+from contextvars import ContextVar
+from fastapi import HTTPException
+
+# =========================
+# Config
+# =========================
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "8"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "32"))
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "20"))
+# Fracción máxima de slots de cada upstream que puede usar el trabajo en segundo plano
+ADMISSION_BACKGROUND_SHARE = float(os.getenv("ADMISSION_BACKGROUND_SHARE", "0.5"))
+
+# Límites por "proveedor:modelo" (o solo "proveedor"); se pueden sobrescribir con
+# ADMISSION_LIMITS='{"openai:gpt-image-1-mini": {"max_in_flight": 4, "max_queue": 16}}'
+DEFAULT_LIMITS = {
+    "openai:gpt-image-1-mini": {"max_in_flight": 6, "max_queue": 24},
+    "openai:gpt-image-1": {"max_in_flight": 4, "max_queue": 16},
+    "openai:gpt-4.1-mini": {"max_in_flight": 16, "max_queue": 64},
+    "replicate": {"max_in_flight": 4, "max_queue": 16},
+    "gemini": {"max_in_flight": 8, "max_queue": 32},
+    "cloudflare": {"max_in_flight": 4, "max_queue": 16},
+}
+ADMISSION_LIMITS = {**DEFAULT_LIMITS, **json.loads(os.getenv("ADMISSION_LIMITS", "{}"))}
+
+
+# Trabajo en segundo plano (prefetch): se marca el contexto de la tarea y
+# todas las llamadas a limited() que haga usan la prioridad baja
+_background: ContextVar[bool] = ContextVar("admission_background", default=False)
+
+
+def mark_background():
+    """Llamar al inicio de una tarea de fondo; afecta a esa tarea y a sus hijas."""
+    _background.set(True)
+
+
+class AdmissionController:
+    """
+    Limita las llamadas concurrentes a un upstream. Hasta max_in_flight
+    pasan directo; las siguientes esperan en una cola FIFO acotada como
+    mucho max_wait segundos. Cola llena o espera vencida -> 503 con
+    Retry-After, antes de gastar cuota del proveedor.
+
+    El trabajo en segundo plano comparte los mismos slots pero siempre cede:
+    usa como mucho max_background a la vez, solo entra si no hay peticiones
+    interactivas esperando y los slots liberados van primero a la cola
+    interactiva. No se rechaza: espera sin límite en su propia cola.
+    """
+
+    def __init__(self, name: str, max_in_flight: int, max_queue: int, max_wait: float):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.max_background = max(1, int(max_in_flight * ADMISSION_BACKGROUND_SHARE))
+        self.in_flight = 0
+        self.background_in_flight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._background_waiters: deque[asyncio.Future] = deque()
+        self._waits: deque[float] = deque(maxlen=512)
+        self._service_time = 5.0  # EWMA de duración de llamadas (s), para Retry-After
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def _retry_after(self) -> int:
+        # tiempo estimado hasta vaciar la cola actual
+        backlog = (len(self._waiters) + 1) / max(self.max_in_flight, 1)
+        return max(1, math.ceil(backlog * self._service_time))
+
+    def _reject(self, reason: str):
+        raise HTTPException(
+            status_code=503,
+            detail=f"Upstream {self.name} busy ({reason}), try again later",
+            headers={"Retry-After": str(self._retry_after())},
+        )
+
+    async def acquire(self):
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            self._waits.append(0.0)
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            self._reject("queue full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # el slot llegó justo al vencer: se usa
+                pass
+            else:
+                waiter.cancel()
+                self.timed_out += 1
+                self._reject("queue timeout")
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release(0.0)  # el slot ya era nuestro: devolverlo
+            else:
+                waiter.cancel()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+        self.admitted += 1
+        self._waits.append(time.monotonic() - start)
+
+    def _background_slot_free(self) -> bool:
+        return (
+            not self._waiters
+            and self.in_flight < self.max_in_flight
+            and self.background_in_flight < self.max_background
+        )
+
+    async def acquire_background(self):
+        # se re-comprueba al despertar: una petición interactiva puede haber
+        # llegado antes y tiene preferencia
+        while not self._background_slot_free():
+            waiter = asyncio.get_running_loop().create_future()
+            self._background_waiters.append(waiter)
+            try:
+                await waiter
+            except BaseException:
+                if waiter in self._background_waiters:
+                    self._background_waiters.remove(waiter)
+                else:
+                    self._wake_background()  # el aviso era nuestro: pasa al siguiente
+                raise
+        self.in_flight += 1
+        self.background_in_flight += 1
+        self.admitted += 1
+
+    def _wake_background(self):
+        while self._background_waiters and self._background_slot_free():
+            waiter = self._background_waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+    def release(self, elapsed: float | None = None, background: bool = False):
+        if elapsed:
+            self._service_time = 0.8 * self._service_time + 0.2 * elapsed
+        if background:
+            self.background_in_flight -= 1
+        # el slot pasa directamente al siguiente en la cola interactiva
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+        self._wake_background()
+
+    async def run(self, coro):
+        background = _background.get()
+        try:
+            if background:
+                await self.acquire_background()
+            else:
+                await self.acquire()
+        except BaseException:
+            coro.close()  # no se llegó a ejecutar
+            raise
+        start = time.monotonic()
+        try:
+            return await coro
+        finally:
+            self.release(time.monotonic() - start, background)
+
+    def stats(self) -> dict:
+        waits = sorted(self._waits)
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queued": len(self._waiters),
+            "max_queue": self.max_queue,
+            "background_in_flight": self.background_in_flight,
+            "background_queued": len(self._background_waiters),
+            "max_background": self.max_background,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "wait_avg_ms": round(1000 * sum(waits) / len(waits), 1) if waits else 0.0,
+            "wait_p95_ms": round(1000 * waits[int(0.95 * (len(waits) - 1))], 1) if waits else 0.0,
+            "service_time_s": round(self._service_time, 2),
+        }
+
+
+_controllers: dict[str, AdmissionController] = {}
+
+
+def admission(provider: str, model: str | None = None) -> AdmissionController:
+    name = f"{provider}:{model}" if model else provider
+    controller = _controllers.get(name)
+    if controller is None:
+        limits = ADMISSION_LIMITS.get(name) or ADMISSION_LIMITS.get(provider) or {}
+        controller = AdmissionController(
+            name,
+            max_in_flight=limits.get("max_in_flight", ADMISSION_MAX_IN_FLIGHT),
+            max_queue=limits.get("max_queue", ADMISSION_MAX_QUEUE),
+            max_wait=limits.get("max_wait", ADMISSION_MAX_WAIT),
+        )
+        _controllers[name] = controller
+        logging.info(
+            f"[ADMISSION] {name}: {controller.max_in_flight} in flight, "
+            f"queue {controller.max_queue}, wait {controller.max_wait}s"
+        )
+    return controller
+
+
+async def limited(provider: str, model: str | None, coro):
+    """await limited("openai", "gpt-image-1-mini", client.images.edit(...))"""
+    return await admission(provider, model).run(coro)
+
+
+def admission_stats() -> dict:
+    return {name: c.stats() for name, c in _controllers.items()}
@@ -0,0 +1,262 @@
+# utils/base_image_store.py
+import os
+import re
+import time
+import shutil
+import asyncio
+import logging
+import secrets
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from fastapi import HTTPException
+from utils.image_ingest import ingest_image
+from utils.single_flight import base_image_flight
+
+# =========================
+# Config
+# =========================
+BASE_IMAGE_STORE = os.getenv("BASE_IMAGE_STORE", "memory")  # memory | disk
+BASE_IMAGE_DIR = os.getenv("BASE_IMAGE_DIR", "base_images")
+BASE_IMAGE_TTL = float(os.getenv("BASE_IMAGE_TTL", "1800"))  # se renueva con cada uso
+BASE_IMAGE_MAX_BYTES = int(os.getenv("BASE_IMAGE_MAX_BYTES", str(256 * 1024 ** 2)))
+# Variantes que se preparan al subir (size:mode); el resto se prepara al primer uso.
+# La del try-on (none:fit, tamaño completo) pesa ~17 MB en una foto de 12 MP:
+# no se precalcula, se prepara (una sola vez) en el primer try-on.
+BASE_IMAGE_PRECOMPUTE = [
+    (int(size) if size != "none" else None, mode)
+    for size, mode in (v.strip().split(":") for v in os.getenv("BASE_IMAGE_PRECOMPUTE", "1024:fit,1024:square").split(",") if v.strip())
+]
+
+_HANDLE_PREFIX = "bi_"
+_HANDLE_RE = re.compile(r"bi_[A-Za-z0-9_-]{24}")  # también es nombre de directorio: nada de rutas
+
+
+def _variant_name(size: int | None, mode: str) -> str:
+    return f"{size or 'full'}_{mode}"
+
+
+# =========================
+# Stores
+# =========================
+class BaseImageStore(ABC):
+    """
+    Foto base de la sesión: se sube una vez y cada endpoint pide la variante
+    ya normalizada que necesita (tamaño + modo). Cada variante se calcula una
+    sola vez por handle (peticiones concurrentes a la misma variante se
+    unen al mismo cálculo). TTL deslizante: cada uso renueva el handle.
+    """
+
+    @abstractmethod
+    def _read(self, handle: str, name: str) -> bytes | None:
+        ...
+
+    @abstractmethod
+    def _write(self, handle: str, name: str, data: bytes):
+        ...
+
+    @abstractmethod
+    def exists(self, handle: str) -> bool:
+        ...
+
+    @abstractmethod
+    def delete(self, handle: str):
+        ...
+
+    @abstractmethod
+    def stats(self) -> dict:
+        ...
+
+    async def put(self, data: bytes) -> str:
+        handle = _HANDLE_PREFIX + secrets.token_urlsafe(18)
+        await asyncio.to_thread(self._write, handle, "original", data)
+        try:
+            await asyncio.gather(*(self.variant(handle, size, mode) for size, mode in BASE_IMAGE_PRECOMPUTE))
+        except Exception:
+            await asyncio.to_thread(self.delete, handle)
+            raise
+        return handle
+
+    async def variant(self, handle: str, size: int | None, mode: str) -> bytes:
+        name = _variant_name(size, mode)
+        data = await asyncio.to_thread(self._read, handle, name)
+        if data is not None:
+            return data
+        return await base_image_flight.do(f"{handle}:{name}", lambda: self._prepare(handle, name, size, mode))
+
+    async def _prepare(self, handle: str, name: str, size: int | None, mode: str) -> bytes:
+        original = await asyncio.to_thread(self._read, handle, "original")
+        if original is None:
+            raise HTTPException(status_code=404, detail="Unknown or expired base_image_handle")
+        data = await ingest_image(original, size, mode=mode)
+        await asyncio.to_thread(self._write, handle, name, data)
+        return data
+
+
+class InMemoryBaseImageStore(BaseImageStore):
+    def __init__(self, ttl: float = BASE_IMAGE_TTL, max_bytes: int = BASE_IMAGE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[float, dict[str, bytes]]] = OrderedDict()  # handle -> (expira, blobs)
+        self._total = 0
+
+    def _entry(self, handle: str, now: float) -> dict[str, bytes] | None:
+        entry = self._entries.get(handle)
+        if entry is None:
+            return None
+        expires_at, blobs = entry
+        if expires_at < now:
+            self._drop(handle)
+            return None
+        self._entries[handle] = (now + self.ttl, blobs)
+        self._entries.move_to_end(handle)
+        return blobs
+
+    def _drop(self, handle: str):
+        _, blobs = self._entries.pop(handle)
+        self._total -= sum(len(b) for b in blobs.values())
+
+    def _read(self, handle: str, name: str) -> bytes | None:
+        with self._lock:
+            blobs = self._entry(handle, time.monotonic())
+            return blobs.get(name) if blobs is not None else None
+
+    def _write(self, handle: str, name: str, data: bytes):
+        now = time.monotonic()
+        with self._lock:
+            blobs = self._entry(handle, now)
+            if blobs is None:
+                if name != "original":
+                    return  # expiró mientras se preparaba
+                blobs = {}
+                self._entries[handle] = (now + self.ttl, blobs)
+            if name not in blobs:
+                blobs[name] = data
+                self._total += len(data)
+            while self._total > self.max_bytes and len(self._entries) > 1:
+                self._drop(next(iter(self._entries)))
+
+    def exists(self, handle: str) -> bool:
+        with self._lock:
+            return self._entry(handle, time.monotonic()) is not None
+
+    def delete(self, handle: str):
+        with self._lock:
+            if handle in self._entries:
+                self._drop(handle)
+
+    def stats(self) -> dict:
+        return {"store": "memory", "handles": len(self._entries), "bytes": self._total, "max_bytes": self.max_bytes}
+
+
+class DiskBaseImageStore(BaseImageStore):
+    """
+    Un directorio por handle; el mtime del directorio marca el último uso.
+    Compartido entre workers que ven el mismo disco.
+    """
+
+    def __init__(self, root: str = BASE_IMAGE_DIR, ttl: float = BASE_IMAGE_TTL, max_bytes: int = BASE_IMAGE_MAX_BYTES):
+        self.root = os.path.abspath(root)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._writes = 0
+        os.makedirs(self.root, exist_ok=True)
+        logging.info(f"[BASE-IMAGE] Disk store at {self.root}")
+
+    def _dir(self, handle: str) -> str:
+        return os.path.join(self.root, handle)
+
+    def _alive(self, handle: str) -> bool:
+        try:
+            if time.time() - os.stat(self._dir(handle)).st_mtime > self.ttl:
+                self.delete(handle)
+                return False
+        except FileNotFoundError:
+            return False
+        os.utime(self._dir(handle))
+        return True
+
+    def _read(self, handle: str, name: str) -> bytes | None:
+        if not self._alive(handle):
+            return None
+        try:
+            with open(os.path.join(self._dir(handle), name), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write(self, handle: str, name: str, data: bytes):
+        if name == "original":
+            os.makedirs(self._dir(handle), exist_ok=True)
+        elif not self._alive(handle):
+            return
+        tmp = os.path.join(self._dir(handle), f".{name}.{secrets.token_hex(4)}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, os.path.join(self._dir(handle), name))
+        self._writes += 1
+        if self._writes % 50 == 0:
+            self.purge()
+
+    def exists(self, handle: str) -> bool:
+        return self._alive(handle)
+
+    def delete(self, handle: str):
+        shutil.rmtree(self._dir(handle), ignore_errors=True)
+
+    def purge(self):
+        """Borra handles vencidos y, si se pasa de max_bytes, los menos usados."""
+        now = time.time()
+        alive = []
+        for entry in os.scandir(self.root):
+            if not entry.is_dir():
+                continue
+            mtime = entry.stat().st_mtime
+            if now - mtime > self.ttl:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                continue
+            size = sum(f.stat().st_size for f in os.scandir(entry.path))
+            alive.append((mtime, entry.path, size))
+        total = sum(size for _, _, size in alive)
+        for _, path, size in sorted(alive):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def stats(self) -> dict:
+        return {"store": "disk", "root": self.root, "max_bytes": self.max_bytes}
+
+
+def make_base_image_store() -> BaseImageStore:
+    if BASE_IMAGE_STORE == "disk":
+        return DiskBaseImageStore(BASE_IMAGE_DIR)
+    return InMemoryBaseImageStore()
+
+
+base_image_store = make_base_image_store()
+
+
+# =========================
+# Referencia usada por los pipelines
+# =========================
+class BaseImageRef:
+    """Sustituye a la imagen subida: los pipelines piden la variante que usan."""
+
+    def __init__(self, handle: str):
+        self.handle = handle
+
+    async def prepared(self, size: int | None = 1024, mode: str = "fit") -> bytes:
+        return await base_image_store.variant(self.handle, size, mode)
+
+
+def valid_handle(handle: str) -> bool:
+    return _HANDLE_RE.fullmatch(handle) is not None
+
+
+async def base_image_ref(handle: str) -> BaseImageRef:
+    """Valida el handle al recibir la petición (404 antes de encolar nada)."""
+    if not valid_handle(handle) or not await asyncio.to_thread(base_image_store.exists, handle):
+        raise HTTPException(status_code=404, detail="Unknown or expired base_image_handle")
+    return BaseImageRef(handle)
@@ -0,0 +1,210 @@
+# utils/body_silhouette.py
+import os
+import base64
+from io import BytesIO
+import cv2
+import numpy as np
+from PIL import Image, ImageOps
+
+# =========================
+# Config
+# =========================
+BODY_ANALYZER = os.getenv("BODY_ANALYZER", "header")  # header | silhouette
+SILHOUETTE_METHOD = os.getenv("SILHOUETTE_METHOD", "threshold")  # threshold | grabcut
+SILHOUETTE_HEIGHT = int(os.getenv("SILHOUETTE_HEIGHT", "256"))
+
+# Bandas verticales (fracción de la altura de la silueta, desde la cabeza)
+SHOULDER_BAND = (0.16, 0.26)
+WAIST_BAND = (0.36, 0.48)
+HIP_BAND = (0.48, 0.60)
+MIN_FOREGROUND = 0.03  # fracción mínima de píxeles de persona para confiar en la máscara
+
+
+# =========================
+# Decode
+# =========================
+def load_rgb(data: bytes | str, height: int = SILHOUETTE_HEIGHT) -> np.ndarray:
+    """
+    Decodifica a baja resolución (draft JPEG) con la orientación EXIF aplicada
+    y devuelve un array RGB de 'height' píxeles de alto.
+    """
+    if isinstance(data, str):
+        data = base64.b64decode(data)
+    image = Image.open(BytesIO(data))
+    image.draft("RGB", (height, height))
+    image = ImageOps.exif_transpose(image).convert("RGB")
+    width = max(1, round(image.width * height / image.height))
+    return np.asarray(image.resize((width, height), Image.Resampling.BILINEAR))
+
+
+# =========================
+# Segmentación
+# =========================
+def _border_background(rgb: np.ndarray) -> np.ndarray:
+    """Color de fondo = mediana de un marco de 4 px (la persona suele estar centrada)."""
+    b = 4
+    border = np.concatenate([
+        rgb[:b].reshape(-1, 3), rgb[-b:].reshape(-1, 3),
+        rgb[:, :b].reshape(-1, 3), rgb[:, -b:].reshape(-1, 3),
+    ])
+    return np.median(border, axis=0)
+
+
+def _clean_mask(mask: np.ndarray) -> np.ndarray:
+    """Morfología + componente conexa más grande."""
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel, iterations=2)
+    n, labels, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    if n <= 1:
+        return np.zeros_like(mask)
+    largest = 1 + int(np.argmax(stats[1:, cv2.CC_STAT_AREA]))
+    return (labels == largest).astype(np.uint8)
+
+
+def segment_threshold(rgb: np.ndarray) -> np.ndarray:
+    """
+    Distancia en Lab al color de fondo + umbral de Otsu.
+    Rápido (pocos ms) y suficiente para fotos de cuerpo con fondo liso.
+    """
+    lab = cv2.cvtColor(rgb, cv2.COLOR_RGB2LAB).astype(np.float32)
+    background = _border_background(lab)
+    distance = np.linalg.norm(lab - background, axis=-1)
+    distance = cv2.GaussianBlur(distance, (5, 5), 0)
+    scaled = np.clip(distance * (255.0 / max(float(distance.max()), 1.0)), 0, 255).astype(np.uint8)
+    _, mask = cv2.threshold(scaled, 0, 1, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return _clean_mask(mask)
+
+
+def segment_grabcut(rgb: np.ndarray, iterations: int = 2) -> np.ndarray:
+    """GrabCut inicializado con un rectángulo centrado; más lento pero más robusto."""
+    h, w = rgb.shape[:2]
+    mask = np.zeros((h, w), np.uint8)
+    rect = (int(w * 0.05), int(h * 0.02), int(w * 0.9), int(h * 0.96))
+    bgd = np.zeros((1, 65), np.float64)
+    fgd = np.zeros((1, 65), np.float64)
+    cv2.grabCut(cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR), mask, rect, bgd, fgd, iterations, cv2.GC_INIT_WITH_RECT)
+    fg = ((mask == cv2.GC_FGD) | (mask == cv2.GC_PR_FGD)).astype(np.uint8)
+    return _clean_mask(fg)
+
+
+# =========================
+# Perfil de anchos
+# =========================
+def width_profiles(masks: np.ndarray) -> np.ndarray:
+    """
+    masks: (N, H, W) binarias -> (N, H) ancho por fila (extremo derecho - izquierdo),
+    así los huecos entre brazos y torso no reducen el ancho.
+    """
+    w = masks.shape[2]
+    any_fg = masks.any(axis=2)
+    left = np.where(any_fg, np.argmax(masks, axis=2), 0)
+    right = np.where(any_fg, w - 1 - np.argmax(masks[:, :, ::-1], axis=2), -1)
+    return (right - left + 1).clip(min=0).astype(np.float32)
+
+
+def _band_stat(profiles: np.ndarray, top: np.ndarray, span: np.ndarray, band: tuple[float, float], reducer) -> np.ndarray:
+    """Aplica reducer (max/min) a cada perfil dentro de la banda relativa."""
+    h = profiles.shape[1]
+    rows = np.arange(h)[None, :]
+    start = (top + band[0] * span)[:, None]
+    end = (top + band[1] * span)[:, None]
+    inside = (rows >= start) & (rows < end) & (profiles > 0)
+    fill = -np.inf if reducer is np.max else np.inf
+    values = reducer(np.where(inside, profiles, fill), axis=1)
+    return np.where(np.isfinite(values), values, np.nan)
+
+
+def measurements_from_masks(masks: np.ndarray) -> list[dict | None]:
+    """
+    Ratios hombros/cintura/cadera para un lote de máscaras (N, H, W).
+    Todo vectorizado sobre N.
+    """
+    profiles = width_profiles(masks)
+    rows_fg = profiles > 0
+    has_body = rows_fg.any(axis=1) & (masks.mean(axis=(1, 2)) >= MIN_FOREGROUND)
+
+    h = profiles.shape[1]
+    top = np.argmax(rows_fg, axis=1).astype(np.float32)
+    bottom = (h - 1 - np.argmax(rows_fg[:, ::-1], axis=1)).astype(np.float32)
+    span = np.maximum(bottom - top + 1, 1)
+
+    shoulders = _band_stat(profiles, top, span, SHOULDER_BAND, np.max)
+    waist = _band_stat(profiles, top, span, WAIST_BAND, np.min)
+    hips = _band_stat(profiles, top, span, HIP_BAND, np.max)
+
+    results: list[dict | None] = []
+    for i in range(len(masks)):
+        if not has_body[i] or not np.isfinite([shoulders[i], waist[i], hips[i]]).all() or waist[i] <= 0:
+            results.append(None)
+            continue
+        shoulder_ratio = round(float(shoulders[i] / waist[i]), 2)
+        hip_ratio = round(float(hips[i] / waist[i]), 2)
+        waist_to_height = float(waist[i] / span[i])
+
+        if hip_ratio >= 1.25 or shoulder_ratio >= 1.45:
+            body_type = "curvy"
+        elif waist_to_height < 0.16:
+            body_type = "slim"
+        else:
+            body_type = "average"
+
+        results.append({
+            "body_type": body_type,
+            "estimated_measurements": {
+                "shoulders": shoulder_ratio,
+                "waist": 1.0,
+                "hips": hip_ratio,
+            },
+            "silhouette": {
+                "coverage": round(float(masks[i].mean()), 3),
+                "waist_to_height": round(waist_to_height, 3),
+            },
+        })
+    return results
+
+
+# =========================
+# API
+# =========================
+def _segment(rgb: np.ndarray, method: str) -> np.ndarray:
+    return segment_grabcut(rgb) if method == "grabcut" else segment_threshold(rgb)
+
+
+def analyze_silhouette(rgb: np.ndarray, method: str = SILHOUETTE_METHOD) -> dict | None:
+    return measurements_from_masks(_segment(rgb, method)[None])[0]
+
+
+def analyze_silhouettes(images: list[np.ndarray], method: str = SILHOUETTE_METHOD) -> list[dict | None]:
+    """
+    Modo batch: segmenta cada imagen, lleva las máscaras a un tamaño común y
+    calcula todos los perfiles en una sola pasada vectorizada.
+    """
+    if not images:
+        return []
+    h = SILHOUETTE_HEIGHT
+    w = max(img.shape[1] for img in images)
+    masks = np.zeros((len(images), h, w), np.uint8)
+    for i, rgb in enumerate(images):
+        if rgb.shape[0] != h:
+            rgb = cv2.resize(rgb, (max(1, round(rgb.shape[1] * h / rgb.shape[0])), h), interpolation=cv2.INTER_AREA)
+        mask = _segment(rgb, method)
+        # centrado horizontal: los anchos no dependen de la posición
+        offset = (w - mask.shape[1]) // 2
+        masks[i, :, offset:offset + mask.shape[1]] = mask
+    return measurements_from_masks(masks)
+
+
+def analyze_silhouette_bytes(data: bytes | str) -> dict | None:
+    """Punto de entrada para el pool de imágenes (función top-level, picklable)."""
+    return analyze_silhouette(load_rgb(data))
+
+
+def apply_silhouette(traits: dict, silhouette: dict | None) -> dict:
+    """Sobrescribe los valores heurísticos con los medidos, si hay máscara válida."""
+    if not silhouette:
+        traits["analyzer"] = "header"
+        return traits
+    traits.update(silhouette)
+    traits["analyzer"] = "silhouette"
+    return traits
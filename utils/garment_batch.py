@@ -0,0 +1,201 @@
+# utils/garment_batch.py
+import os
+import json
+import asyncio
+import logging
+from typing import Awaitable, Callable
+from fastapi import HTTPException
+from openai import AsyncOpenAI
+from utils.admission import limited
+from utils.garment_cache import garment_cache, garment_cache_key
+from utils.garment_index import find_similar_garment, index_garment
+from utils.garment_vision import garment_image_part
+from utils.garment_colors import GARMENT_PREANALYSIS, analyze_garment_colors_bytes, color_hint, local_description
+from utils.image_ingest import run_image_task
+from utils.progress import emit
+
+# =========================
+# Config
+# =========================
+GARMENT_BATCH_ANALYSIS = os.getenv("GARMENT_BATCH_ANALYSIS", "1") not in ("0", "false", "no")
+GARMENT_BATCH_MODEL = os.getenv("GARMENT_BATCH_MODEL", "gpt-4.1-mini")
+
+GARMENTS_SCHEMA = {
+    "type": "json_schema",
+    "name": "garments",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "garments": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "index": {"type": "integer"},
+                        "description": {"type": "string"},
+                    },
+                    "required": ["index", "description"],
+                    "additionalProperties": False,
+                },
+            },
+        },
+        "required": ["garments"],
+        "additionalProperties": False,
+    },
+}
+
+
+def parse_batch(text: str, count: int) -> list[str] | None:
+    """Una descripción no vacía por índice 0..count-1, o None si no valida."""
+    try:
+        garments = json.loads(text)["garments"]
+        by_index = {int(g["index"]): g["description"].strip() for g in garments}
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return None
+    if sorted(by_index) != list(range(count)) or not all(by_index.values()):
+        return None
+    return [by_index[i] for i in range(count)]
+
+
+async def analyze_garments_batch(
+    client: AsyncOpenAI,
+    images: list[bytes],
+    categories: list[str | None],
+) -> list[str] | None:
+    """
+    Todas las prendas en una sola petición de visión, cada una reducida a la
+    resolución de análisis (utils.garment_vision). Devuelve las descripciones en orden o None si la respuesta
+    no valida (el llamador cae a una petición por prenda).
+    """
+    parts = await asyncio.gather(*(garment_image_part(img) for img in images))
+
+    content = [{
+        "type": "input_text",
+        "text": (
+            f"Analyze these {len(images)} clothing items for virtual try-on, independently.\n"
+            "For EACH item return its index and a description of ONLY visual characteristics.\n"
+            "MANDATORY: include garment type and EXACT main color.\n"
+            "Include fit/model, length, sleeves, neckline, texture or pattern.\n"
+            "Do NOT invent colors.\n"
+            "Do NOT mention brand, price, person or background."
+        )
+    }]
+    for idx, (part, cat) in enumerate(zip(parts, categories)):
+        label = f"Item {idx}" + (f" (category: {cat})" if cat else "")
+        content.append({"type": "input_text", "text": label})
+        content.append(part)
+
+    try:
+        response = await limited("openai", GARMENT_BATCH_MODEL, client.responses.create(
+            model=GARMENT_BATCH_MODEL,
+            input=[{"role": "user", "content": content}],
+            text={"format": GARMENTS_SCHEMA}
+        ))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.warning(f"[GARMENT-BATCH] Request failed, falling back: {e}")
+        return None
+
+    descriptions = parse_batch(response.output_text, len(images))
+    if descriptions is None:
+        logging.warning("[GARMENT-BATCH] Invalid batch JSON, falling back to per-garment analysis")
+    return descriptions
+
+
+async def analyze_garments(
+    client: AsyncOpenAI,
+    images: list[bytes],
+    categories: list[str | None],
+    analyze_one: Callable[[int], Awaitable[str]],
+) -> list[str]:
+    """
+    Descripciones de todas las prendas del look.
+    - pre-análisis local (utils.garment_colors) de todo el lote en una tarea
+    - modo fast: prendas con categoría conocida se describen sin modelo
+    - el resto: cache y near-dup por prenda; las que quedan (2 o más) van en
+      una sola petición batch. Si no hay batch o no valida, analyze_one(idx)
+      por prenda, en paralelo.
+    - modo hint: a cada descripción se le añaden los colores y el patrón medidos.
+    """
+    local = await _preanalyze(images)
+    descriptions: list[str | None] = [None] * len(images)
+
+    if GARMENT_PREANALYSIS == "fast":
+        for idx, (analysis, cat) in enumerate(zip(local, categories)):
+            if analysis and cat:
+                descriptions[idx] = local_description(analysis, cat)
+                emit("garment_analyzed", index=idx, category=cat, description=descriptions[idx], source="local")
+
+    todo = [idx for idx, desc in enumerate(descriptions) if desc is None]
+    if todo:
+        for idx, desc in zip(todo, await _describe(client, todo, images, categories, analyze_one)):
+            descriptions[idx] = f"{desc} (measured: {color_hint(local[idx])})" if local[idx] else desc
+    return descriptions
+
+
+async def _preanalyze(images: list[bytes]) -> list[dict | None]:
+    if GARMENT_PREANALYSIS not in ("hint", "fast"):
+        return [None] * len(images)
+    try:
+        return await run_image_task(analyze_garment_colors_bytes, images)
+    except Exception as e:
+        logging.warning(f"[GARMENT-COLORS] Pre-analysis skipped: {e}")
+        return [None] * len(images)
+
+
+async def _describe(
+    client: AsyncOpenAI,
+    indices: list[int],
+    images: list[bytes],
+    categories: list[str | None],
+    analyze_one: Callable[[int], Awaitable[str]],
+) -> list[str]:
+    """Descripciones del modelo de visión para las prendas 'indices', en ese orden."""
+    if not GARMENT_BATCH_ANALYSIS or len(indices) < 2:
+        return await _analyze_each(indices, analyze_one)
+
+    descriptions: dict[int, str] = {}
+    pending = []
+    for idx in indices:
+        img, cat = images[idx], categories[idx]
+        cache_key = garment_cache_key(img, cat)
+        desc = await garment_cache.aget(cache_key)
+        phash = None
+        if desc is None:
+            desc, phash = await find_similar_garment(img, cat)
+            if desc:
+                await garment_cache.aput(cache_key, desc)
+        if desc:
+            descriptions[idx] = desc
+            emit("garment_analyzed", index=idx, category=cat, description=desc)
+        else:
+            pending.append((idx, cat, img, cache_key, phash))
+
+    if len(pending) >= 2:
+        batch = await analyze_garments_batch(client, [p[2] for p in pending], [p[1] for p in pending])
+        if batch is not None:
+            for (idx, cat, _, cache_key, phash), desc in zip(pending, batch):
+                await garment_cache.aput(cache_key, desc)
+                index_garment(phash, desc, cat)
+                descriptions[idx] = desc
+                emit("garment_analyzed", index=idx, category=cat, description=desc)
+                logging.info(f"[GARMENT-BATCH][OK] Garment {idx + 1}: {desc}")
+            pending = []
+
+    if pending:
+        rest = [p[0] for p in pending]
+        descriptions.update(zip(rest, await _analyze_each(rest, analyze_one)))
+    return [descriptions[idx] for idx in indices]
+
+
+async def _analyze_each(indices, analyze_one: Callable[[int], Awaitable[str]]) -> list[str]:
+    """Una petición por prenda, en paralelo; si una falla se cancelan las demás."""
+    tasks = [asyncio.create_task(analyze_one(idx)) for idx in indices]
+    try:
+        return list(await asyncio.gather(*tasks))
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
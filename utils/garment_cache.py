@@ -0,0 +1,174 @@
+# utils/garment_cache.py
+import os
+import time
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# =========================
+# Config
+# =========================
+GARMENT_CACHE_SIZE = int(os.getenv("GARMENT_CACHE_SIZE", "1024"))
+GARMENT_CACHE_TTL = float(os.getenv("GARMENT_CACHE_TTL", str(7 * 24 * 3600)))
+GARMENT_CACHE_DB = os.getenv("GARMENT_CACHE_DB")  # ej: /var/data/garments.sqlite3
+GARMENT_CACHE_DB_MAX_ITEMS = int(os.getenv("GARMENT_CACHE_DB_MAX_ITEMS", "100000"))
+
+
+def garment_cache_key(image_bytes: bytes, category: str | None = None) -> str:
+    """
+    Clave por contenido: sha256 de la categoría normalizada + bytes de la imagen.
+    """
+    h = hashlib.sha256()
+    h.update((category or "").strip().lower().encode("utf-8"))
+    h.update(b"\0")
+    h.update(image_bytes)
+    return h.hexdigest()
+
+
+# =========================
+# Cache
+# =========================
+class GarmentDescriptionCache:
+    """
+    Cache de descripciones de prendas en dos niveles:
+    - memoria: LRU acotado por número de entradas
+    - disco (opcional): SQLite con TTL y límite de filas
+    """
+
+    def __init__(
+        self,
+        max_items: int = GARMENT_CACHE_SIZE,
+        ttl: float = GARMENT_CACHE_TTL,
+        db_path: str | None = GARMENT_CACHE_DB,
+        db_max_items: int = GARMENT_CACHE_DB_MAX_ITEMS,
+    ):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.db_max_items = db_max_items
+        self._memory: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._puts = 0
+
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS garment_descriptions ("
+                " key TEXT PRIMARY KEY,"
+                " description TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_garment_accessed"
+                " ON garment_descriptions (accessed_at)"
+            )
+            self._db.commit()
+            logging.info(f"[GARMENT-CACHE] Disk tier at {db_path}")
+
+    # -------------------------
+    # Sync API
+    # -------------------------
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, desc = entry
+                if now - created_at <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return desc
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT description, created_at FROM garment_descriptions WHERE key = ?",
+                    (key,),
+                ).fetchone()
+                if row is not None and now - row[1] <= self.ttl:
+                    self._db.execute(
+                        "UPDATE garment_descriptions SET accessed_at = ? WHERE key = ?",
+                        (now, key),
+                    )
+                    self._db.commit()
+                    self._remember(key, row[1], row[0])
+                    self.disk_hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, description: str):
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, description)
+
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO garment_descriptions"
+                    " (key, description, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, description, now, now),
+                )
+                self._puts += 1
+                if self._puts % 100 == 0:
+                    self._evict_disk(now)
+                self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {
+                "memory_items": len(self._memory),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / total, 3) if total else 0.0,
+                "disk_enabled": self._db is not None,
+            }
+
+    # -------------------------
+    # Async API (no bloquea el event loop con SQLite)
+    # -------------------------
+    async def aget(self, key: str) -> str | None:
+        if self._db is None:
+            return self.get(key)
+        return await asyncio.to_thread(self.get, key)
+
+    async def aput(self, key: str, description: str):
+        if self._db is None:
+            return self.put(key, description)
+        await asyncio.to_thread(self.put, key, description)
+
+    # -------------------------
+    # Internals
+    # -------------------------
+    def _remember(self, key: str, created_at: float, description: str):
+        self._memory[key] = (created_at, description)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self, now: float):
+        self._db.execute(
+            "DELETE FROM garment_descriptions WHERE created_at < ?",
+            (now - self.ttl,),
+        )
+        self._db.execute(
+            "DELETE FROM garment_descriptions WHERE key IN ("
+            " SELECT key FROM garment_descriptions ORDER BY accessed_at DESC"
+            " LIMIT -1 OFFSET ?)",
+            (self.db_max_items,),
+        )
+
+
+garment_cache = GarmentDescriptionCache()
@@ -0,0 +1,262 @@
+# utils/garment_colors.py
+import os
+import base64
+from io import BytesIO
+import cv2
+import numpy as np
+from PIL import Image, ImageOps
+
+# =========================
+# Config
+# =========================
+# off: sin pre-análisis | hint: añade colores/patrón medidos a la descripción
+# fast: además, si la categoría es conocida, no se llama al modelo de visión.
+# Desactivado por defecto hasta validarlo con fotos reales del catálogo
+GARMENT_PREANALYSIS = os.getenv("GARMENT_PREANALYSIS", "off").lower()
+GARMENT_COLOR_SIZE = int(os.getenv("GARMENT_COLOR_SIZE", "96"))
+GARMENT_BG_DELTA = float(os.getenv("GARMENT_BG_DELTA", "6"))  # distancia Lab al fondo
+
+MIN_COVERAGE = 0.05  # por debajo, la máscara no es fiable y se usa la imagen entera
+SECONDARY_MIN = 0.18  # fracción mínima para nombrar un segundo color
+SOLID_STD = 6.0  # desviación de color (ΔE, con croma) por debajo de la cual es liso
+STRIPE_ENERGY = 0.30  # fracción de energía AC en un eje para considerar rayas
+
+# Paleta de nombres (RGB). Cada píxel de prenda se asigna al más cercano en Lab.
+NAMED_COLORS = {
+    "black": (20, 20, 20),
+    "charcoal gray": (64, 64, 68),
+    "gray": (128, 128, 128),
+    "light gray": (192, 192, 192),
+    "white": (245, 245, 245),
+    "cream": (240, 230, 200),
+    "beige": (215, 190, 150),
+    "camel": (190, 140, 80),
+    "brown": (110, 70, 40),
+    "khaki": (160, 150, 100),
+    "olive green": (100, 110, 45),
+    "green": (40, 140, 60),
+    "dark green": (20, 70, 40),
+    "teal": (0, 128, 128),
+    "light blue": (150, 190, 230),
+    "blue": (40, 90, 200),
+    "navy blue": (25, 35, 80),
+    "purple": (110, 50, 140),
+    "lavender": (190, 170, 220),
+    "pink": (240, 150, 180),
+    "fuchsia": (210, 40, 140),
+    "red": (200, 30, 35),
+    "burgundy": (110, 20, 40),
+    "orange": (240, 130, 30),
+    "mustard yellow": (210, 170, 40),
+    "yellow": (245, 220, 60),
+}
+_NAMES = list(NAMED_COLORS)
+
+
+def _to_lab(rgb: np.ndarray) -> np.ndarray:
+    """Lab real (L 0-100) en float32; acepta cualquier forma (..., 3)."""
+    flat = rgb.reshape(-1, 1, 3).astype(np.float32) / 255.0
+    return cv2.cvtColor(flat, cv2.COLOR_RGB2LAB).reshape(rgb.shape)
+
+
+_PALETTE_LAB = _to_lab(np.array(list(NAMED_COLORS.values()), np.uint8))
+
+
+# =========================
+# Decode
+# =========================
+def load_garment_rgb(data: bytes | str, size: int = GARMENT_COLOR_SIZE) -> np.ndarray:
+    """
+    Decodifica a baja resolución (draft JPEG) con la orientación EXIF aplicada
+    y devuelve un array RGB de size x size, para apilar el lote en un solo array.
+    """
+    if isinstance(data, str):
+        data = base64.b64decode(data)
+    image = Image.open(BytesIO(data))
+    image.draft("RGB", (size * 2, size * 2))
+    image = ImageOps.exif_transpose(image).convert("RGB")
+    return np.asarray(image.resize((size, size), Image.Resampling.BOX))
+
+
+# =========================
+# Máscara de prenda
+# =========================
+def garment_masks(lab: np.ndarray) -> np.ndarray:
+    """
+    lab: (N, S, S, 3) -> (N, S, S) bool. El fondo es la mediana de un marco de
+    4 px (fotos de producto: prenda centrada sobre fondo liso); es prenda lo
+    que se aleja de él más de GARMENT_BG_DELTA. Si casi nada se separa del
+    fondo (prenda que ocupa todo el encuadre), se usa la imagen entera.
+    """
+    b = 4
+    n = lab.shape[0]
+    border = np.concatenate([
+        lab[:, :b].reshape(n, -1, 3), lab[:, -b:].reshape(n, -1, 3),
+        lab[:, :, :b].reshape(n, -1, 3), lab[:, :, -b:].reshape(n, -1, 3),
+    ], axis=1)
+    background = np.median(border, axis=1)[:, None, None, :]
+    masks = np.linalg.norm(lab - background, axis=-1) > GARMENT_BG_DELTA
+    # relleno de huecos: rayas o estampados del color del fondo siguen siendo prenda
+    # si hay prenda a ambos lados en la columna o en la fila
+    masks = masks | (
+        np.maximum.accumulate(masks, axis=1) & np.maximum.accumulate(masks[:, ::-1], axis=1)[:, ::-1]
+    ) | (
+        np.maximum.accumulate(masks, axis=2) & np.maximum.accumulate(masks[:, :, ::-1], axis=2)[:, :, ::-1]
+    )
+    weak = masks.mean(axis=(1, 2)) < MIN_COVERAGE
+    masks[weak] = True
+    return masks
+
+
+def erode(masks: np.ndarray, radius: int = 2) -> np.ndarray:
+    """Erosión cuadrada de todo el lote: quita el borde prenda/fondo, que mezcla ambos."""
+    s = masks.shape[1]
+    padded = np.pad(masks, ((0, 0), (radius, radius), (radius, radius)))
+    out = np.ones_like(masks)
+    for dy in range(2 * radius + 1):
+        for dx in range(2 * radius + 1):
+            out &= padded[:, dy:dy + s, dx:dx + s]
+    return out
+
+
+# =========================
+# Colores
+# =========================
+def color_histograms(lab: np.ndarray, masks: np.ndarray) -> np.ndarray:
+    """
+    (N, S, S, 3) + máscaras -> (N, n_colores) fracción de píxeles de prenda
+    asignados a cada color con nombre. Un solo cálculo de distancias para el lote.
+    """
+    n = lab.shape[0]
+    pixels = lab.reshape(n, -1, 3)
+    # |x - c|^2 = |c|^2 - 2 x·c (+ |x|^2, igual para todos los c): un solo matmul
+    distances = (_PALETTE_LAB ** 2).sum(axis=1) - 2.0 * (pixels @ _PALETTE_LAB.T)
+    nearest = distances.argmin(axis=-1)  # (N, P)
+    k = len(_NAMES)
+    weights = masks.reshape(n, -1).astype(np.float32)
+    flat = (nearest + np.arange(n)[:, None] * k).ravel()
+    counts = np.bincount(flat, weights=weights.ravel(), minlength=n * k).reshape(n, k)
+    return counts / np.maximum(counts.sum(axis=1, keepdims=True), 1.0)
+
+
+# =========================
+# Patrón
+# =========================
+def pattern_energy(lab: np.ndarray, masks: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Espectro de L, a y b (FFT 2D por lote, potencia sumada en los tres
+    canales: rayas de igual luminancia y distinto color también cuentan).
+    Devuelve, por imagen, la desviación de color (ΔE respecto a la media)
+    dentro de la prenda y la fracción de energía AC en el eje vertical
+    (rayas horizontales) y horizontal (rayas verticales).
+    Se usa la máscara erosionada y fuera de ella se rellena con la media,
+    para que el contorno de la prenda no cuente como raya.
+    """
+    masks = erode(masks)
+    inside = np.maximum(masks.sum(axis=(1, 2)), 1)
+    mean = (lab * masks[..., None]).sum(axis=(1, 2)) / inside[:, None]
+    centered = lab - mean[:, None, None, :]
+    std = np.sqrt(((centered ** 2).sum(axis=-1) * masks).sum(axis=(1, 2)) / inside)
+    filled = np.where(masks[..., None], centered, 0.0)
+
+    power = (np.abs(np.fft.fft2(filled, axes=(1, 2))) ** 2).sum(axis=-1)
+    s = lab.shape[1]
+    freqs = np.abs(np.fft.fftfreq(s) * s)
+    fy, fx = freqs[:, None], freqs[None, :]
+    # se ignoran las frecuencias muy bajas: sombreado y forma de la prenda
+    ac = (np.maximum(fy, fx) >= 3)
+    horizontal = ac & (fx <= 1)  # varía solo en y: rayas horizontales
+    vertical = ac & (fy <= 1)
+    total = np.maximum((power * ac).sum(axis=(1, 2)), 1e-6)
+    return std, (power * horizontal).sum(axis=(1, 2)) / total, (power * vertical).sum(axis=(1, 2)) / total
+
+
+def classify_patterns(std: np.ndarray, horizontal: np.ndarray, vertical: np.ndarray, secondary: np.ndarray) -> list[str]:
+    patterns = []
+    for i in range(len(std)):
+        if std[i] < SOLID_STD and secondary[i] < SECONDARY_MIN:
+            patterns.append("solid")
+        elif horizontal[i] >= STRIPE_ENERGY * 0.6 and vertical[i] >= STRIPE_ENERGY * 0.6:
+            patterns.append("plaid")
+        elif horizontal[i] >= STRIPE_ENERGY:
+            patterns.append("horizontal stripes")
+        elif vertical[i] >= STRIPE_ENERGY:
+            patterns.append("vertical stripes")
+        elif secondary[i] >= SECONDARY_MIN or std[i] >= 2.5 * SOLID_STD:
+            patterns.append("printed pattern")
+        else:
+            patterns.append("solid")  # sombras o textura, sin dibujo
+    return patterns
+
+
+# =========================
+# API
+# =========================
+def analyze_garment_colors(images: list[np.ndarray]) -> list[dict]:
+    """
+    Modo batch: todas las prendas (size x size) en un array y cada paso
+    (Lab, máscara, histograma, FFT) en una sola pasada vectorizada.
+    """
+    if not images:
+        return []
+    rgb = np.stack(images)
+    lab = _to_lab(rgb)
+    masks = garment_masks(lab)
+    histograms = color_histograms(lab, masks)
+    order = np.argsort(-histograms, axis=1)
+    secondary = histograms[np.arange(len(images)), order[:, 1]]
+    patterns = classify_patterns(*pattern_energy(lab, masks), secondary)
+
+    results = []
+    for i in range(len(images)):
+        # el primero siempre: con ruido o muchos colores ninguno llega al 5 %
+        colors = [
+            {"name": _NAMES[j], "fraction": round(float(histograms[i, j]), 2)}
+            for rank, j in enumerate(order[i, :3]) if rank == 0 or histograms[i, j] >= 0.05
+        ]
+        results.append({
+            "main_color": colors[0]["name"],
+            "secondary_color": colors[1]["name"] if len(colors) > 1 and colors[1]["fraction"] >= SECONDARY_MIN else None,
+            "colors": colors,
+            "pattern": patterns[i],
+            "coverage": round(float(masks[i].mean()), 3),
+        })
+    return results
+
+
+def analyze_garment_colors_bytes(images: list[bytes | str]) -> list[dict | None]:
+    """Punto de entrada para el pool de imágenes (función top-level, picklable)."""
+    decoded = []
+    for data in images:
+        try:
+            decoded.append(load_garment_rgb(data))
+        except Exception:
+            decoded.append(None)
+    valid = [rgb for rgb in decoded if rgb is not None]
+    results = iter(analyze_garment_colors(valid))
+    return [next(results) if rgb is not None else None for rgb in decoded]
+
+
+def color_layout(rgb: np.ndarray, grid: int = 4) -> np.ndarray:
+    """
+    Color medio (Lab) de cada celda de una rejilla grid x grid, aplanado:
+    firma de color del índice de near-duplicates. Un logo o un estampado
+    grande cambia sus celdas aunque apenas mueva el color medio de la prenda.
+    """
+    lab = _to_lab(rgb)
+    return cv2.resize(lab, (grid, grid), interpolation=cv2.INTER_AREA).reshape(-1).astype(np.float32)
+
+
+def color_hint(analysis: dict) -> str:
+    """Resumen medido localmente, para añadir a la descripción de la prenda."""
+    colors = analysis["main_color"]
+    if analysis["secondary_color"]:
+        colors += f" and {analysis['secondary_color']}"
+    return f"{colors}, {analysis['pattern']}"
+
+
+def local_description(analysis: dict, category: str) -> str:
+    """Descripción sin modelo de visión (modo fast): categoría + colores + patrón."""
+    return f"{category} garment, main color {analysis['main_color']}" + (
+        f" with {analysis['secondary_color']}" if analysis["secondary_color"] else ""
+    ) + f", {analysis['pattern']}"
@@ -0,0 +1,227 @@
+# utils/garment_index.py
+import os
+import logging
+from io import BytesIO
+import numpy as np
+from PIL import Image
+from utils.image_ingest import run_image_task
+from utils.garment_colors import GARMENT_COLOR_SIZE, color_layout
+
+# =========================
+# Config
+# =========================
+GARMENT_INDEX_ENABLED = os.getenv("GARMENT_INDEX_ENABLED", "1") not in ("0", "false", "no")
+GARMENT_PHASH_THRESHOLD = int(os.getenv("GARMENT_PHASH_THRESHOLD", "5"))  # bits de 64
+GARMENT_INDEX_MAX_ITEMS = int(os.getenv("GARMENT_INDEX_MAX_ITEMS", "500000"))
+# El dHash (64 bits, en gris) solo propone candidatos. Para ser casi idéntica,
+# cada celda de la rejilla de color (Lab) debe estar a menos del umbral: así
+# se separan el mismo corte en otro color o con un logo/estampado grande.
+# Rejilla impar: el pecho (logos) cae en la celda central y no repartido en cuatro
+GARMENT_COLOR_GRID = int(os.getenv("GARMENT_COLOR_GRID", "5"))
+GARMENT_COLOR_THRESHOLD = float(os.getenv("GARMENT_COLOR_THRESHOLD", "15"))  # máx. ΔE por celda
+_LAYOUT_SIZE = GARMENT_COLOR_GRID * GARMENT_COLOR_GRID * 3
+
+# popcount de cada byte, para la distancia de Hamming vectorizada
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+# =========================
+# Perceptual hash
+# =========================
+def dhash(image: Image.Image) -> int:
+    """
+    dHash de 64 bits: gris 9x8 y comparación de píxeles vecinos.
+    Resiste re-encode, cambio de tamaño y pequeños recortes.
+    """
+    small = image.convert("L").resize((9, 8), Image.Resampling.BOX)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def dhash_from_bytes(image_bytes: bytes) -> int:
+    image = Image.open(BytesIO(image_bytes))
+    # JPEG: decodifica a baja resolución, solo necesitamos 9x8
+    image.draft("L", (64, 64))
+    return dhash(image)
+
+
+def garment_fingerprint(image_bytes: bytes) -> tuple[int, np.ndarray]:
+    """(dHash, rejilla de color) con una sola decodificación a baja resolución."""
+    image = Image.open(BytesIO(image_bytes))
+    image.draft("RGB", (GARMENT_COLOR_SIZE * 2, GARMENT_COLOR_SIZE * 2))
+    rgb = image.convert("RGB")
+    size = (GARMENT_COLOR_SIZE, GARMENT_COLOR_SIZE)
+    return dhash(rgb), color_layout(np.asarray(rgb.resize(size, Image.Resampling.BOX)), GARMENT_COLOR_GRID)
+
+
+def hamming_distances(hashes: np.ndarray, value: int) -> np.ndarray:
+    xor = np.bitwise_xor(hashes, np.uint64(value))
+    return _POPCOUNT[xor.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+# =========================
+# Index (multi-index hashing)
+# =========================
+class _HashBands:
+    """
+    Índice de un solo grupo (categoría). El hash de 64 bits se parte en
+    threshold + 1 bandas: por el principio del palomar, cualquier hash a
+    distancia <= threshold coincide exactamente en al menos una banda, así
+    solo se comparan los candidatos de esos buckets y no todo el índice.
+    """
+
+    def __init__(self, threshold: int, max_items: int):
+        n_bands = min(max(threshold + 1, 1), 16)
+        widths = [64 // n_bands + (1 if i < 64 % n_bands else 0) for i in range(n_bands)]
+        self._bands: list[tuple[int, int]] = []
+        offset = 0
+        for width in widths:
+            self._bands.append((offset, (1 << width) - 1))
+            offset += width
+
+        self._buckets: list[dict[int, set[int]]] = [{} for _ in self._bands]
+        self.max_items = max_items
+        self._hashes = np.zeros(min(1024, max_items), dtype=np.uint64)
+        self._colors = np.zeros((len(self._hashes), _LAYOUT_SIZE), dtype=np.float32)
+        self._values: list[str | None] = []
+        self._next = 0
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def _band_keys(self, value: int):
+        for i, (offset, mask) in enumerate(self._bands):
+            yield i, (value >> offset) & mask
+
+    def add(self, value: int, color: np.ndarray, description: str):
+        if len(self._values) < self.max_items:
+            slot = len(self._values)
+            self._values.append(description)
+            if slot >= len(self._hashes):
+                grown = np.zeros(min(len(self._hashes) * 2, self.max_items), dtype=np.uint64)
+                grown[:len(self._hashes)] = self._hashes
+                self._hashes = grown
+                colors = np.zeros((len(grown), _LAYOUT_SIZE), dtype=np.float32)
+                colors[:len(self._colors)] = self._colors
+                self._colors = colors
+        else:
+            # lleno: se reemplaza la entrada más antigua (anillo)
+            slot = self._next
+            self._next = (self._next + 1) % self.max_items
+            old = int(self._hashes[slot])
+            for i, key in self._band_keys(old):
+                bucket = self._buckets[i].get(key)
+                if bucket is not None:
+                    bucket.discard(slot)
+                    if not bucket:
+                        del self._buckets[i][key]
+            self._values[slot] = description
+
+        self._hashes[slot] = np.uint64(value)
+        self._colors[slot] = color
+        for i, key in self._band_keys(value):
+            self._buckets[i].setdefault(key, set()).add(slot)
+
+    def nearest(self, value: int, color: np.ndarray, threshold: int, color_threshold: float) -> tuple[str, int] | None:
+        candidates: set[int] = set()
+        for i, key in self._band_keys(value):
+            bucket = self._buckets[i].get(key)
+            if bucket:
+                candidates.update(bucket)
+        if not candidates:
+            return None
+
+        slots = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        distances = hamming_distances(self._hashes[slots], value)
+        # misma silueta pero otro color (o un logo grande) no es la misma prenda:
+        # cuenta la celda de la rejilla que más se aleja
+        cells = (self._colors[slots] - color).reshape(len(slots), -1, 3)
+        color_distances = np.linalg.norm(cells, axis=2).max(axis=1)
+        distances = np.where(color_distances <= color_threshold, distances, np.iinfo(np.int64).max)
+        best = int(np.argmin(distances))
+        if distances[best] > threshold:
+            return None
+        return self._values[slots[best]], int(distances[best])
+
+
+class GarmentHashIndex:
+    """
+    Índice local de prendas ya analizadas por hash perceptual, separado por
+    categoría. Permite reutilizar la descripción de una foto casi idéntica
+    (re-encodeada, redimensionada o recortada por otro cliente). Solo cuenta
+    como casi idéntica si además coincide el color de cada zona de la imagen.
+    """
+
+    def __init__(
+        self,
+        threshold: int = GARMENT_PHASH_THRESHOLD,
+        max_items: int = GARMENT_INDEX_MAX_ITEMS,
+        color_threshold: float = GARMENT_COLOR_THRESHOLD,
+    ):
+        self.threshold = threshold
+        self.color_threshold = color_threshold
+        self.max_items = max_items
+        self._groups: dict[str, _HashBands] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _group(self, category: str | None) -> str:
+        return (category or "").strip().lower()
+
+    def add(self, value: int, color: np.ndarray, description: str, category: str | None = None):
+        group = self._group(category)
+        if group not in self._groups:
+            self._groups[group] = _HashBands(self.threshold, self.max_items)
+        self._groups[group].add(value, color, description)
+
+    def lookup(self, value: int, color: np.ndarray, category: str | None = None) -> tuple[str, int] | None:
+        """
+        Devuelve (descripción, distancia) del vecino más cercano dentro del
+        umbral de hash y del de color, o None.
+        """
+        bands = self._groups.get(self._group(category))
+        match = bands.nearest(value, color, self.threshold, self.color_threshold) if bands is not None else None
+        if match is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return match
+
+    def stats(self) -> dict:
+        return {
+            "items": sum(len(g) for g in self._groups.values()),
+            "threshold": self.threshold,
+            "color_threshold": self.color_threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+garment_index = GarmentHashIndex() if GARMENT_INDEX_ENABLED else None
+if garment_index is None:
+    logging.info("[GARMENT-INDEX] Perceptual index disabled")
+
+
+async def find_similar_garment(
+    image_bytes: bytes, category: str | None = None
+) -> tuple[str | None, tuple[int, np.ndarray] | None]:
+    """
+    Calcula dHash y rejilla de color (en el pool de imágenes) y busca una prenda
+    casi idéntica. Devuelve (descripción o None, huella) para poder indexar el
+    resultado luego.
+    """
+    if garment_index is None:
+        return None, None
+    fingerprint = await run_image_task(garment_fingerprint, image_bytes)
+    match = garment_index.lookup(*fingerprint, category)
+    if match is None:
+        return None, fingerprint
+    description, distance = match
+    logging.info(f"[GARMENT-INDEX] Near-duplicate found (distance {distance})")
+    return description, fingerprint
+
+
+def index_garment(fingerprint: tuple[int, np.ndarray] | None, description: str, category: str | None = None):
+    if garment_index is not None and fingerprint is not None:
+        garment_index.add(*fingerprint, description, category)
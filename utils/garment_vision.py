@@ -0,0 +1,32 @@
+# utils/garment_vision.py
+import os
+import base64
+from utils.image_ingest import ingest_image, image_mime
+
+# =========================
+# Config
+# =========================
+# El análisis solo necesita tipo, color y patrón: imagen pequeña y compacta
+GARMENT_ANALYSIS_SIZE = int(os.getenv("GARMENT_ANALYSIS_SIZE", "512"))
+GARMENT_ANALYSIS_FORMAT = os.getenv("GARMENT_ANALYSIS_FORMAT", "jpeg").lower()  # png | jpeg | webp
+GARMENT_ANALYSIS_DETAIL = os.getenv("GARMENT_ANALYSIS_DETAIL", "low").lower()  # low | high | auto
+
+
+async def garment_image_part(
+    image: bytes | str,
+    size: int | None = None,
+    fmt: str | None = None,
+    detail: str | None = None,
+) -> dict:
+    """
+    Bloque input_image para el modelo de visión: la prenda reducida a
+    GARMENT_ANALYSIS_SIZE, codificada en GARMENT_ANALYSIS_FORMAT y con el
+    nivel de detalle configurado. El resize corre en el pool de ingestión.
+    """
+    fmt = fmt or GARMENT_ANALYSIS_FORMAT
+    tile = await ingest_image(image, size or GARMENT_ANALYSIS_SIZE, fmt=fmt)
+    return {
+        "type": "input_image",
+        "image_url": f"data:{image_mime(fmt)};base64,{base64.b64encode(tile).decode('utf-8')}",
+        "detail": detail or GARMENT_ANALYSIS_DETAIL,
+    }
@@ -1,6 +1,7 @@
 # utils/gemini_service.py
 import base64
 import google.generativeai as genai
+from utils.admission import limited
 
 gemini_client = None
 
@@ -20,7 +21,7 @@ async def gemini_generate_image(prompt: str):
         return None
 
     try:
-        response = gemini_client.generate_content(prompt)
+        response = await limited("gemini", "gemini-1.5-flash", gemini_client.generate_content_async(prompt))
 
         # Gemini NO devuelve imagen directa como SD
         # Se usa para enriquecer prompt o fallback lógico
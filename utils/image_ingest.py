@@ -0,0 +1,211 @@
+# utils/image_ingest.py
+import os
+import math
+import base64
+import asyncio
+import logging
+import multiprocessing
+from io import BytesIO
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from fastapi import HTTPException
+from PIL import Image
+
+# =========================
+# Config
+# =========================
+IMAGE_POOL = os.getenv("IMAGE_POOL", "thread")  # thread | process
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", str(os.cpu_count() or 2)))
+IMAGE_MAX_PENDING = int(os.getenv("IMAGE_MAX_PENDING", "64"))
+IMAGE_QUEUE_TIMEOUT = float(os.getenv("IMAGE_QUEUE_TIMEOUT", "30"))
+
+# Encoding de salida: png (lossless) | jpeg | webp. gpt-image-1 acepta los tres.
+IMAGE_OUTPUT_FORMAT = os.getenv("IMAGE_OUTPUT_FORMAT", "png").lower()
+IMAGE_PNG_COMPRESS_LEVEL = int(os.getenv("IMAGE_PNG_COMPRESS_LEVEL", "1"))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "90"))
+IMAGE_WEBP_QUALITY = int(os.getenv("IMAGE_WEBP_QUALITY", "90"))
+IMAGE_RESAMPLE = os.getenv("IMAGE_RESAMPLE", "bilinear").lower()
+
+_FORMATS = {
+    "png": ("PNG", "image/png", "png"),
+    "jpeg": ("JPEG", "image/jpeg", "jpg"),
+    "jpg": ("JPEG", "image/jpeg", "jpg"),
+    "webp": ("WEBP", "image/webp", "webp"),
+}
+_RESAMPLE = {
+    "nearest": Image.Resampling.NEAREST,
+    "bilinear": Image.Resampling.BILINEAR,
+    "bicubic": Image.Resampling.BICUBIC,
+    "lanczos": Image.Resampling.LANCZOS,
+}
+
+_executor: Executor | None = None
+_slots: asyncio.Semaphore | None = None
+
+
+# =========================
+# Formato de salida
+# =========================
+def image_mime(fmt: str | None = None) -> str:
+    return _FORMATS[fmt or IMAGE_OUTPUT_FORMAT][1]
+
+
+def image_filename(stem: str, fmt: str | None = None) -> str:
+    return f"{stem}.{_FORMATS[fmt or IMAGE_OUTPUT_FORMAT][2]}"
+
+
+def encode_image(image: Image.Image, fmt: str | None = None) -> bytes:
+    pil_format = _FORMATS[fmt or IMAGE_OUTPUT_FORMAT][0]
+    buffer = BytesIO()
+    if pil_format == "PNG":
+        image.save(buffer, format="PNG", compress_level=IMAGE_PNG_COMPRESS_LEVEL)
+    elif pil_format == "JPEG":
+        image.save(buffer, format="JPEG", quality=IMAGE_JPEG_QUALITY, subsampling=0 if IMAGE_JPEG_QUALITY >= 90 else 2)
+    else:
+        image.save(buffer, format="WEBP", quality=IMAGE_WEBP_QUALITY, method=2)
+    return buffer.getvalue()
+
+
+# =========================
+# CPU work (corre en el pool)
+# =========================
+def normalize_image(data: bytes | str, size: int | None = 1024, mode: str = "fit", fmt: str | None = None) -> bytes:
+    """
+    Decodifica, pasa a RGB, redimensiona y codifica (PNG por defecto).
+    - data: bytes de la imagen o string base64
+    - mode "fit": mantiene proporciones dentro de size x size
+    - mode "square": fuerza size x size
+    - size None: sin redimensionar
+    - fmt: png | jpeg | webp (por defecto IMAGE_OUTPUT_FORMAT)
+    """
+    if isinstance(data, str):
+        data = base64.b64decode(data)
+
+    image = Image.open(BytesIO(data))
+    resample = _RESAMPLE.get(IMAGE_RESAMPLE, Image.Resampling.BILINEAR)
+
+    if size:
+        # JPEG: el decoder reduce 1/2, 1/4 o 1/8 en DCT sin tocar todos los píxeles
+        image.draft("RGB", (size, size))
+    image = image.convert("RGB")
+
+    if size:
+        if mode == "square":
+            image = image.resize((size, size), resample, reducing_gap=2.0)
+        else:
+            image.thumbnail((size, size), resample, reducing_gap=2.0)
+
+    return encode_image(image, fmt)
+
+
+# =========================
+# Header-only (sin decodificar píxeles)
+# =========================
+_EXIF_ORIENTATION = 0x0112
+_HEADER_B64_PREFIX = 4 * 64 * 1024 // 3 // 4 * 4  # ~64 KB de bytes decodificados
+
+
+def read_image_header(data: bytes) -> tuple[int, int]:
+    """
+    Devuelve (ancho, alto) tal como se muestra la imagen, leyendo solo la
+    cabecera: Image.open es lazy y la orientación EXIF viene en el header.
+    """
+    image = Image.open(BytesIO(data))
+    width, height = image.size
+
+    exif_bytes = image.info.get("exif")
+    if exif_bytes:
+        exif = Image.Exif()
+        exif.load(exif_bytes)
+        # 5-8: la imagen está rotada 90/270 grados
+        if exif.get(_EXIF_ORIENTATION) in (5, 6, 7, 8):
+            width, height = height, width
+
+    return width, height
+
+
+def read_image_header_b64(image_b64: str) -> tuple[int, int]:
+    """
+    Igual que read_image_header pero desde base64: intenta con los primeros
+    ~64 KB y solo decodifica todo el string si la cabecera no cabe ahí.
+    """
+    if len(image_b64) > _HEADER_B64_PREFIX:
+        try:
+            return read_image_header(base64.b64decode(image_b64[:_HEADER_B64_PREFIX]))
+        except Exception:
+            pass
+    return read_image_header(base64.b64decode(image_b64))
+
+
+def thumbnail_size(width: int, height: int, max_size: int) -> tuple[int, int]:
+    """
+    Tamaño que tendría la imagen tras Image.thumbnail((max_size, max_size)),
+    calculado sin decodificarla (misma regla de redondeo que Pillow).
+    """
+    if max_size >= width and max_size >= height:
+        return width, height
+
+    def round_aspect(number, key):
+        return max(min(math.floor(number), math.ceil(number), key=key), 1)
+
+    x = y = max_size
+    aspect = width / height
+    if x / y >= aspect:
+        x = round_aspect(y * aspect, key=lambda n: abs(aspect - n / y))
+    else:
+        y = round_aspect(x / aspect, key=lambda n: 0 if n == 0 else abs(aspect - x / n))
+    return x, y
+
+
+# =========================
+# Pool + backpressure
+# =========================
+def _get_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        if IMAGE_POOL == "process":
+            _executor = ProcessPoolExecutor(
+                max_workers=IMAGE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        else:
+            _executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="image")
+        logging.info(f"[IMAGE-INGEST] {IMAGE_POOL} pool, {IMAGE_WORKERS} workers")
+    return _executor
+
+
+def _get_slots() -> asyncio.Semaphore:
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(IMAGE_MAX_PENDING)
+    return _slots
+
+
+async def run_image_task(fn, *args):
+    """
+    Ejecuta trabajo de CPU sobre imágenes fuera del event loop.
+    Como mucho IMAGE_MAX_PENDING tareas en vuelo; el resto espera turno y
+    si la espera supera IMAGE_QUEUE_TIMEOUT se responde 503.
+    """
+    slots = _get_slots()
+    try:
+        await asyncio.wait_for(slots.acquire(), timeout=IMAGE_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Image processing busy, try again later")
+
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_executor(), fn, *args)
+    finally:
+        slots.release()
+
+
+async def ingest_image(data: bytes | str, size: int | None = 1024, mode: str = "fit", fmt: str | None = None) -> bytes:
+    return await run_image_task(normalize_image, data, size, mode, fmt)
+
+
+def shutdown_image_pool():
+    global _executor, _slots
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+    _slots = None
@@ -0,0 +1,66 @@
+# utils/image_providers.py
+import os
+from utils.upstream import get_openai_client, get_replicate_client
+from utils.admission import limited
+from utils.progress import emit, streaming
+from utils.single_flight import coalesced_image_edit, upload_bytes
+from utils.replicate_service import replicate_edit_image
+from utils.provider_router import Provider, ProviderRouter, register_router
+
+# =========================
+# Config
+# =========================
+# Orden de prioridad; los que no estén configurados se saltan
+IMAGE_EDIT_PROVIDERS = [p.strip() for p in os.getenv("IMAGE_EDIT_PROVIDERS", "openai,replicate").split(",") if p.strip()]
+# Previews parciales (0-3) cuando el cliente escucha por SSE; cada una cuesta tokens de salida extra
+IMAGE_PARTIAL_IMAGES = int(os.getenv("IMAGE_PARTIAL_IMAGES", "2"))
+
+
+# =========================
+# Proveedores de edición (imagen + prompt -> imagen base64)
+# =========================
+async def _streamed_edit(client, **kwargs) -> str | None:
+    """images.edit con stream: reenvía las previews parciales como eventos de progreso."""
+    stream = await client.images.edit(**kwargs, stream=True, partial_images=IMAGE_PARTIAL_IMAGES)
+    async for event in stream:
+        if event.type == "image_edit.partial_image":
+            emit("partial_image", index=event.partial_image_index, image=event.b64_json)
+        elif event.type == "image_edit.completed":
+            return event.b64_json
+    return None
+
+
+async def openai_edit(request: dict) -> str | None:
+    client = request.get("client") or get_openai_client()
+    kwargs = {
+        "model": request.get("model", "gpt-image-1-mini"),
+        "image": request["image"],
+        "prompt": request["prompt"],
+        "size": request.get("size", "1024x1024"),
+        "output_format": request.get("output_format", "png"),
+    }
+    if streaming() and IMAGE_PARTIAL_IMAGES > 0:
+        # las previews son de este cliente: sin coalescing
+        return await limited("openai", kwargs["model"], _streamed_edit(client, **kwargs))
+
+    result = await coalesced_image_edit(client, **kwargs)
+    return result.data[0].b64_json if result.data else None
+
+
+async def replicate_edit(request: dict) -> str | None:
+    return await replicate_edit_image(
+        upload_bytes(request["image"]),
+        request["prompt"],
+        request.get("output_format", "png"),
+    )
+
+
+_EDIT_PROVIDERS = {
+    "openai": lambda: Provider("openai", openai_edit),
+    "replicate": lambda: Provider("replicate", replicate_edit, available=lambda: get_replicate_client() is not None),
+}
+
+image_edit_router = register_router(ProviderRouter(
+    "image-edit",
+    [_EDIT_PROVIDERS[name]() for name in IMAGE_EDIT_PROVIDERS if name in _EDIT_PROVIDERS],
+))
@@ -0,0 +1,125 @@
+# utils/image_transport.py
+import json
+import base64
+import asyncio
+from typing import Literal
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import Response
+from utils.result_store import result_store, result_url
+from utils.progress import sse_response
+
+# =========================
+# Formatos de respuesta
+# =========================
+# json: contrato original (imagen en base64 dentro del JSON)
+# png | webp: cuerpo binario, metadatos en headers
+# url: la imagen se guarda en el result store y el JSON lleva "image_url"
+ResponseFormat = Literal["json", "png", "webp", "url"]
+
+
+def upstream_output_format(response_format: str) -> str:
+    """Formato a pedir al modelo: así la respuesta binaria no se re-codifica."""
+    return "webp" if response_format == "webp" else "png"
+
+
+def sniff_image_mime(data: bytes) -> str:
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[:3] == b"\xff\xd8\xff":
+        return "image/jpeg"
+    return "image/png"
+
+
+async def image_result_response(result, response_format: str):
+    """
+    Convierte el dict de un pipeline ({"image": b64, ...}) en la respuesta pedida.
+    Respuestas que no son dict (p. ej. el 202 del modo job) pasan sin cambios.
+    El Content-Type sale de los bytes: un job encolado como webp sigue siendo webp.
+    """
+    if response_format == "json" or not isinstance(result, dict) or not result.get("image"):
+        return result
+
+    metadata = {k: v for k, v in result.items() if k != "image"}
+    content = base64.b64decode(result["image"])
+
+    if response_format == "url":
+        name = await result_store.aput(content, sniff_image_mime(content))
+        return {**metadata, "image_url": result_url(name)}
+
+    headers = {
+        # ASCII escapado: los headers HTTP son latin-1
+        "X-Image-Metadata": json.dumps(metadata, ensure_ascii=True, separators=(",", ":")),
+    }
+    if metadata.get("request_id"):
+        headers["X-Request-Id"] = str(metadata["request_id"])
+
+    return Response(
+        content=content,
+        media_type=sniff_image_mime(content),
+        headers=headers,
+    )
+
+
+# =========================
+# Resultados guardados fuera de memoria
+# =========================
+async def store_image_result(result):
+    """
+    {"image": b64, ...} -> {"image_name": blob del result store, ...}, para
+    guardar resultados (jobs, prefetch) sin tener la imagen en memoria.
+    Lo que no es un dict con imagen pasa sin cambios.
+    """
+    if not isinstance(result, dict) or not result.get("image"):
+        return result
+    content = await asyncio.to_thread(base64.b64decode, result["image"])
+    name = await result_store.aput(content, sniff_image_mime(content))
+    return {**{k: v for k, v in result.items() if k != "image"}, "image_name": name}
+
+
+async def load_image_result(stored):
+    """Inverso de store_image_result. LookupError si el blob ya fue desalojado."""
+    if not isinstance(stored, dict) or "image_name" not in stored:
+        return stored
+    name = stored["image_name"]
+    if not await result_store.atouch(name):
+        raise LookupError(f"result image {name} was evicted")
+    image = await asyncio.to_thread(_read_b64, result_store.path(name))
+    return {**{k: v for k, v in stored.items() if k != "image_name"}, "image": image}
+
+
+def _read_b64(path: str) -> str:
+    with open(path, "rb") as f:
+        return base64.b64encode(f.read()).decode("utf-8")
+
+
+def image_result_stream(factory, response_format: str, timeout: float | None = None):
+    """
+    Variante ?stream=true: Server-Sent Events con las etapas del pipeline y,
+    al final, un evento 'result' con el mismo cuerpo que json/url.
+    """
+    if response_format not in ("json", "url"):
+        raise HTTPException(status_code=400, detail="stream=true supports response_format json or url")
+    return sse_response(factory, lambda result: image_result_response(result, response_format), timeout)
+
+
+# =========================
+# Entradas: archivo binario o base64 (compatibilidad)
+# =========================
+async def image_input(upload: UploadFile | None, image_b64: str | None, field: str) -> bytes | str:
+    """
+    Devuelve los bytes del archivo subido o, si no hay archivo, el string base64.
+    image_ingest acepta ambos, así que no hace falta convertir aquí.
+    """
+    if upload is not None:
+        return await upload.read()
+    if image_b64:
+        return image_b64
+    raise HTTPException(status_code=400, detail=f"Provide '{field}' (file) or '{field}_b64'")
+
+
+def image_bytes(image: bytes | str) -> bytes:
+    return image if isinstance(image, bytes) else base64.b64decode(image)
+
+
+def image_b64(image: bytes | str) -> str:
+    return image if isinstance(image, str) else base64.b64encode(image).decode("utf-8")
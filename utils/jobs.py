@@ -0,0 +1,291 @@
+# utils/jobs.py
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from io import BytesIO
+from typing import Awaitable, Callable
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+from utils.image_transport import load_image_result, store_image_result
+
+# =========================
+# Config
+# =========================
+JOB_STORE = os.getenv("JOB_STORE", "memory")  # memory | sqlite
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", "jobs.sqlite3")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "8"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "100"))
+JOB_TTL = float(os.getenv("JOB_TTL", "3600"))
+JOB_MAX_WAIT = float(os.getenv("JOB_MAX_WAIT", "60"))
+
+
+# =========================
+# Stores
+# =========================
+class JobStore(ABC):
+    """
+    Interfaz de almacenamiento de jobs. Un job es un dict con:
+    job_id, kind, status (queued|running|succeeded|failed),
+    created_at, started_at, finished_at, result, error.
+    """
+
+    @abstractmethod
+    async def create(self, job: dict):
+        ...
+
+    @abstractmethod
+    async def update(self, job_id: str, **fields):
+        ...
+
+    @abstractmethod
+    async def get(self, job_id: str) -> dict | None:
+        ...
+
+    @abstractmethod
+    async def purge(self, older_than: float):
+        ...
+
+
+class InMemoryJobStore(JobStore):
+    def __init__(self):
+        self._jobs: dict[str, dict] = {}
+
+    async def create(self, job: dict):
+        self._jobs[job["job_id"]] = job
+
+    async def update(self, job_id: str, **fields):
+        if job_id in self._jobs:
+            self._jobs[job_id].update(fields)
+
+    async def get(self, job_id: str) -> dict | None:
+        job = self._jobs.get(job_id)
+        return dict(job) if job is not None else None
+
+    async def purge(self, older_than: float):
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["finished_at"] is not None and job["finished_at"] < older_than
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+class SQLiteJobStore(JobStore):
+    """
+    Store en SQLite: el estado sobrevive reinicios y es visible desde
+    varios workers de gunicorn que comparten disco.
+    """
+
+    def __init__(self, path: str = JOB_STORE_PATH):
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id TEXT PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " finished_at REAL)"
+        )
+        self._db.commit()
+        logging.info(f"[JOBS] SQLite store at {path}")
+
+    def _get(self, job_id: str) -> dict | None:
+        with self._lock:
+            row = self._db.execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _put(self, job: dict):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, data, finished_at) VALUES (?, ?, ?)",
+                (job["job_id"], json.dumps(job), job.get("finished_at")),
+            )
+            self._db.commit()
+
+    def _update(self, job_id: str, fields: dict):
+        job = self._get(job_id)
+        if job is not None:
+            job.update(fields)
+            self._put(job)
+
+    def _purge(self, older_than: float):
+        with self._lock:
+            self._db.execute("DELETE FROM jobs WHERE finished_at < ?", (older_than,))
+            self._db.commit()
+
+    async def create(self, job: dict):
+        await asyncio.to_thread(self._put, job)
+
+    async def update(self, job_id: str, **fields):
+        await asyncio.to_thread(self._update, job_id, fields)
+
+    async def get(self, job_id: str) -> dict | None:
+        return await asyncio.to_thread(self._get, job_id)
+
+    async def purge(self, older_than: float):
+        await asyncio.to_thread(self._purge, older_than)
+
+
+def make_job_store() -> JobStore:
+    if JOB_STORE == "sqlite":
+        return SQLiteJobStore(JOB_STORE_PATH)
+    return InMemoryJobStore()
+
+
+# =========================
+# Manager (cola acotada + pool de workers)
+# =========================
+class JobManager:
+    def __init__(self, store: JobStore, workers: int = JOB_WORKERS, queue_size: int = JOB_QUEUE_SIZE):
+        self.store = store
+        self.workers = workers
+        self.queue: asyncio.Queue | None = None
+        self.queue_size = queue_size
+        self._tasks: list[asyncio.Task] = []
+        self._done: dict[str, asyncio.Event] = {}
+
+    async def start(self):
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._janitor()))
+        logging.info(f"[JOBS] {self.workers} workers, queue size {self.queue_size}")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, kind: str, factory: Callable[[], Awaitable[dict]]) -> str:
+        if self.queue is None:
+            await self.start()
+        if self.queue.full():
+            raise HTTPException(status_code=503, detail="Job queue is full, try again later")
+
+        job_id = uuid.uuid4().hex
+        await self.store.create({
+            "job_id": job_id,
+            "kind": kind,
+            "status": "queued",
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+        })
+        self._done[job_id] = asyncio.Event()
+        self.queue.put_nowait((job_id, factory))
+        return job_id
+
+    async def get(self, job_id: str) -> dict | None:
+        """Job con el resultado listo para responder (imagen leída del result store)."""
+        return await self._with_result(await self.store.get(job_id))
+
+    async def _with_result(self, job: dict | None) -> dict | None:
+        if job is None or job["status"] != "succeeded":
+            return job
+        try:
+            return {**job, "result": await load_image_result(job["result"])}
+        except LookupError:
+            # la imagen salió del result store antes que el job del suyo
+            return {
+                **job, "status": "failed", "result": None,
+                "error": {"status_code": 410, "detail": "Job result expired"},
+            }
+
+    async def wait(self, job_id: str, timeout: float) -> dict | None:
+        """
+        Long-poll: espera a que el job termine o a que pase 'timeout'.
+        Si el job es de otro proceso (store SQLite) se consulta periódicamente.
+        """
+        deadline = time.monotonic() + min(max(timeout, 0.0), JOB_MAX_WAIT)
+        while True:
+            job = await self.store.get(job_id)
+            if job is None or job["status"] in ("succeeded", "failed"):
+                return await self._with_result(job)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return job
+            event = self._done.get(job_id)
+            if event is not None:
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await asyncio.sleep(min(0.5, remaining))
+
+    async def _worker(self, n: int):
+        while True:
+            job_id, factory = await self.queue.get()
+            try:
+                await self.store.update(job_id, status="running", started_at=time.time())
+                # la imagen va al result store: el job solo guarda su nombre
+                result = await store_image_result(await factory())
+                await self.store.update(job_id, status="succeeded", result=result, finished_at=time.time())
+            except HTTPException as e:
+                await self.store.update(
+                    job_id, status="failed", finished_at=time.time(),
+                    error={"status_code": e.status_code, "detail": e.detail},
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"[JOBS][{job_id}] {e}")
+                await self.store.update(
+                    job_id, status="failed", finished_at=time.time(),
+                    error={"status_code": 500, "detail": str(e)},
+                )
+            finally:
+                event = self._done.pop(job_id, None)
+                if event is not None:
+                    event.set()
+                self.queue.task_done()
+
+    async def _janitor(self):
+        while True:
+            await asyncio.sleep(min(JOB_TTL, 300))
+            try:
+                await self.store.purge(time.time() - JOB_TTL)
+            except Exception as e:
+                logging.error(f"[JOBS] purge failed: {e}")
+
+
+job_manager = JobManager(make_job_store())
+
+
+# =========================
+# Helpers para endpoints
+# =========================
+async def detach_upload(upload: UploadFile) -> UploadFile:
+    """
+    Copia el archivo subido a memoria: el job sigue corriendo después de
+    que Starlette cierra los archivos del formulario.
+    """
+    data = await upload.read()
+    return UploadFile(file=BytesIO(data), filename=upload.filename, headers=upload.headers)
+
+
+async def run_or_submit(job: bool, kind: str, factory: Callable[[], Awaitable[dict]]):
+    """
+    Modo normal: ejecuta el pipeline y devuelve su resultado.
+    Modo job: lo encola y responde 202 con el job_id al instante.
+    """
+    if not job:
+        return await factory()
+
+    job_id = await job_manager.submit(kind, factory)
+    return JSONResponse(
+        status_code=202,
+        content={
+            "status": "queued",
+            "job_id": job_id,
+            "status_url": f"/api/jobs/{job_id}",
+        },
+    )
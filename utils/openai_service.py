@@ -1,13 +1,14 @@
 # utils/openai_service.py
 import os
-import openai
+from utils.upstream import get_openai_client
+from utils.admission import limited
 
 openai_client = None
 
 def init_openai(api_key: str):
     global openai_client
     os.environ["OPENAI_API_KEY"] = api_key  # setea la variable de entorno
-    openai_client = openai
+    openai_client = get_openai_client()
     print("✅ OpenAI initialized (FALLBACK)")
 
 async def openai_generate_image(prompt: str):
@@ -16,11 +17,11 @@ async def openai_generate_image(prompt: str):
         return None
 
     try:
-        result = openai_client.images.generate(
+        result = await limited("openai", "gpt-image-1", openai_client.images.generate(
             model="gpt-image-1",
             prompt=prompt,
             size="1024x1024"
-        )
+        ))
         return f"data:image/png;base64,{result.data[0].b64_json}"
     except Exception as e:
         print("⚠️ OpenAI image error:", e)
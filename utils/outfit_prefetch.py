@@ -0,0 +1,215 @@
+# utils/outfit_prefetch.py
+import os
+import json
+import time
+import asyncio
+import logging
+import contextvars
+from collections import OrderedDict
+from typing import Awaitable, Callable
+from utils.admission import mark_background
+from utils.garment_index import dhash_from_bytes
+from utils.image_ingest import run_image_task
+from utils.image_transport import load_image_result, store_image_result
+from utils.recommendation_cache import recommendation_key
+
+# =========================
+# Config
+# =========================
+OUTFIT_PREFETCH = os.getenv("OUTFIT_PREFETCH", "0") not in ("0", "false", "no")  # opt-in
+# Combinaciones del formulario que se precalculan (con el género y estilo del registro)
+OUTFIT_PREFETCH_COMBOS = json.loads(os.getenv("OUTFIT_PREFETCH_COMBOS") or json.dumps([
+    {"occasion": "diario", "climate": "templado", "colors": "neutros"},
+    {"occasion": "trabajo", "climate": "templado", "colors": "neutros"},
+]))
+OUTFIT_PREFETCH_WORKERS = int(os.getenv("OUTFIT_PREFETCH_WORKERS", "2"))
+OUTFIT_PREFETCH_QUEUE = int(os.getenv("OUTFIT_PREFETCH_QUEUE", "200"))
+OUTFIT_PREFETCH_TTL = float(os.getenv("OUTFIT_PREFETCH_TTL", "3600"))
+OUTFIT_PREFETCH_MAX_USERS = int(os.getenv("OUTFIT_PREFETCH_MAX_USERS", "200"))
+OUTFIT_PREFETCH_PHOTO_DISTANCE = int(os.getenv("OUTFIT_PREFETCH_PHOTO_DISTANCE", "6"))  # bits de dHash
+
+
+class OutfitPrefetcher:
+    """
+    Tras el registro (foto de cuerpo o selfie) encola los outfits que el
+    usuario probablemente pida primero y los guarda por user_id. Las
+    generaciones corren con prioridad de fondo en el control de admisión:
+    comparten los slots de cada upstream pero ceden siempre al tráfico
+    interactivo. Solo se sirven si el perfil del formulario coincide y la
+    foto de la petición es la misma (dHash cercano) que la del registro.
+    Las imágenes generadas van al result store; en memoria del proceso solo
+    quedan el nombre del blob y los metadatos.
+    """
+
+    def __init__(
+        self,
+        workers: int = OUTFIT_PREFETCH_WORKERS,
+        queue_size: int = OUTFIT_PREFETCH_QUEUE,
+        ttl: float = OUTFIT_PREFETCH_TTL,
+        max_users: int = OUTFIT_PREFETCH_MAX_USERS,
+    ):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.ttl = ttl
+        self.max_users = max_users
+        self.queue: asyncio.Queue | None = None
+        self._tasks: list[asyncio.Task] = []
+        # user_id -> {"photo_hash", "expires_at", "outfits": {key: entry}}
+        self._users: OrderedDict[str, dict] = OrderedDict()
+
+        self.generated = 0
+        self.failed = 0
+        self.served = 0
+        self.dropped = 0
+
+    def _start(self):
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        # contexto vacío: nada del request que registró al usuario (progreso, etc.)
+        self._tasks = [
+            contextvars.Context().run(asyncio.create_task, self._worker())
+            for _ in range(self.workers)
+        ]
+        logging.info(f"[PREFETCH] {self.workers} workers, queue size {self.queue_size}")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.queue = None
+
+    def _user(self, user_id: str) -> dict | None:
+        record = self._users.get(user_id)
+        if record is not None and record["expires_at"] < time.time():
+            del self._users[user_id]
+            return None
+        return record
+
+    # -------------------------
+    # Registro
+    # -------------------------
+    async def schedule(
+        self,
+        user_id: str,
+        photo: bytes,
+        profiles: list[dict],
+        generate: Callable[[dict], Awaitable[dict]],
+    ) -> int:
+        """
+        Encola generate(profile) para cada perfil. Un nuevo registro del mismo
+        usuario sustituye al anterior (lo que quedaba en cola se descarta).
+        Devuelve cuántas generaciones se encolaron.
+        """
+        photo_hash = await run_image_task(dhash_from_bytes, photo)
+        if self.queue is None:
+            self._start()
+
+        record = {"photo_hash": photo_hash, "expires_at": time.time() + self.ttl, "outfits": {}}
+        self._users[user_id] = record
+        self._users.move_to_end(user_id)
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+
+        queued = 0
+        for profile in profiles:
+            key = recommendation_key(profile)
+            if key in record["outfits"]:
+                continue
+            entry = {"profile": profile, "status": "queued", "future": None}
+            try:
+                self.queue.put_nowait((record, key, entry, generate))
+            except asyncio.QueueFull:
+                self.dropped += 1
+                logging.warning(f"[PREFETCH] Queue full, skipping {user_id}")
+                break
+            record["outfits"][key] = entry
+            queued += 1
+        return queued
+
+    async def _worker(self):
+        mark_background()
+        while True:
+            record, key, entry, generate = await self.queue.get()
+            try:
+                # descartado: el usuario se volvió a registrar, expiró o ya lo pidió
+                if entry["status"] != "queued" or record["outfits"].get(key) is not entry or record["expires_at"] < time.time():
+                    continue
+                entry["status"] = "running"
+                entry["future"] = asyncio.get_running_loop().create_future()
+                try:
+                    result = await store_image_result(await generate(entry["profile"]))
+                except asyncio.CancelledError:
+                    entry["future"].cancel()
+                    raise
+                except Exception as e:
+                    self.failed += 1
+                    entry["status"] = "failed"
+                    entry["future"].set_exception(e)
+                    entry["future"].exception()  # marcado como recuperado si nadie lo espera
+                    logging.warning(f"[PREFETCH] Generation failed: {e}")
+                    continue
+                self.generated += 1
+                entry["status"] = "ready"
+                entry["future"].set_result(result)
+            finally:
+                self.queue.task_done()
+
+    # -------------------------
+    # Consumo
+    # -------------------------
+    async def take(self, user_id: str, profile: dict, photo: bytes) -> asyncio.Future | None:
+        """
+        Outfit precalculado para esta petición: listo o en curso. Se entrega
+        una sola vez. Si aún estaba en cola se cancela (la petición lo genera
+        ya, con prioridad normal) y se devuelve None.
+        """
+        key = recommendation_key(profile)
+        record = self._user(user_id)
+        if record is None or key not in record["outfits"]:
+            return None
+        photo_hash = await run_image_task(dhash_from_bytes, photo)
+        # el estado pudo cambiar mientras se calculaba el hash
+        record = self._user(user_id)
+        entry = record["outfits"].get(key) if record is not None else None
+        if entry is None or entry["status"] == "failed":
+            return None
+        if bin(record["photo_hash"] ^ photo_hash).count("1") > OUTFIT_PREFETCH_PHOTO_DISTANCE:
+            return None
+
+        del record["outfits"][key]
+        if entry["status"] == "queued":
+            entry["status"] = "claimed"
+            return None
+        self.served += 1
+        return entry["future"]
+
+    async def resolve(self, future: asyncio.Future, generate: Callable[[], Awaitable[dict]]) -> dict:
+        """Espera el outfit precalculado; si falló, se genera en la petición."""
+        try:
+            result = await load_image_result(await asyncio.shield(future))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.warning(f"[PREFETCH] Prefetched outfit unusable, generating: {e}")
+            return await generate()
+        return {**result, "prefetched": True}
+
+    def status(self, user_id: str) -> list[dict]:
+        record = self._user(user_id)
+        if record is None:
+            return []
+        return [{"profile": e["profile"], "status": e["status"]} for e in record["outfits"].values()]
+
+    def stats(self) -> dict:
+        return {
+            "enabled": OUTFIT_PREFETCH,
+            "users": len(self._users),
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+            "generated": self.generated,
+            "failed": self.failed,
+            "served": self.served,
+            "dropped": self.dropped,
+        }
+
+
+outfit_prefetcher = OutfitPrefetcher()
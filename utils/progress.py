@@ -0,0 +1,104 @@
+# utils/progress.py
+import os
+import json
+import asyncio
+import logging
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+# =========================
+# Config
+# =========================
+SSE_HEARTBEAT = float(os.getenv("SSE_HEARTBEAT", "15"))  # comentario keep-alive para proxies
+
+# Cola de eventos de la petición en curso (None = nadie escucha)
+_events: ContextVar[asyncio.Queue | None] = ContextVar("progress_events", default=None)
+
+
+def emit(stage: str, **data):
+    """
+    Publica una etapa del pipeline. Sin streaming activo no hace nada, así
+    los pipelines emiten siempre sin saber si alguien escucha. Las tareas
+    hijas (asyncio.create_task) heredan la cola por contextvars.
+    """
+    queue = _events.get()
+    if queue is not None:
+        queue.put_nowait({"stage": stage, **data})
+
+
+def streaming() -> bool:
+    return _events.get() is not None
+
+
+async def staged(stage: str, coro: Awaitable, **data):
+    """await coro y emite 'stage' al terminar (etapas que corren en paralelo)."""
+    result = await coro
+    emit(stage, **data)
+    return result
+
+
+def sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def progress_stream(
+    factory: Callable[[], Awaitable[Any]],
+    finalize: Callable[[Any], Awaitable[Any]],
+    timeout: float | None = None,
+) -> AsyncIterator[str]:
+    """
+    Corre el pipeline en su propia tarea y va emitiendo cada etapa como SSE.
+    Cierra con 'result' (el mismo cuerpo que la respuesta JSON) o 'error'.
+    Si el cliente se desconecta, Starlette cancela el generador y con él la tarea.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def run():
+        _events.set(queue)
+        return await asyncio.wait_for(factory(), timeout)
+
+    task = asyncio.create_task(run())
+    try:
+        while True:
+            getter = asyncio.create_task(queue.get())
+            done, _ = await asyncio.wait({getter, task}, timeout=SSE_HEARTBEAT, return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                event = getter.result()
+                yield sse_event(event.pop("stage"), event)
+                continue
+            getter.cancel()
+            if not done:
+                yield ": keep-alive\n\n"
+                continue
+
+            while not queue.empty():
+                event = queue.get_nowait()
+                yield sse_event(event.pop("stage"), event)
+            break
+
+        try:
+            yield sse_event("result", await finalize(task.result()))
+        except asyncio.TimeoutError:
+            yield sse_event("error", {"status_code": 504, "detail": "Request deadline exceeded"})
+        except HTTPException as e:
+            yield sse_event("error", {"status_code": e.status_code, "detail": e.detail})
+        except Exception as e:
+            logging.error(f"[SSE] {e}")
+            yield sse_event("error", {"status_code": 500, "detail": "Generation failed"})
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+def sse_response(
+    factory: Callable[[], Awaitable[Any]],
+    finalize: Callable[[Any], Awaitable[Any]],
+    timeout: float | None = None,
+) -> StreamingResponse:
+    return StreamingResponse(
+        progress_stream(factory, finalize, timeout),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,250 @@
+# utils/provider_router.py
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable
+from fastapi import HTTPException
+from openai import APIStatusError
+from utils.progress import emit
+
+# =========================
+# Config
+# =========================
+PROVIDER_HEDGING = os.getenv("PROVIDER_HEDGING", "0") in ("1", "true", "yes")
+PROVIDER_HEDGE_MIN_SAMPLES = int(os.getenv("PROVIDER_HEDGE_MIN_SAMPLES", "20"))
+PROVIDER_HEDGE_MIN_DELAY = float(os.getenv("PROVIDER_HEDGE_MIN_DELAY", "2"))
+BREAKER_CONSECUTIVE_FAILURES = int(os.getenv("BREAKER_CONSECUTIVE_FAILURES", "5"))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "30"))
+
+
+class ProviderError(Exception):
+    """El proveedor respondió sin imagen."""
+
+
+def is_client_error(error: BaseException) -> bool:
+    """4xx (salvo 429): la petición es inválida, otro proveedor fallaría igual."""
+    status = None
+    if isinstance(error, APIStatusError):
+        status = error.status_code
+    elif isinstance(error, HTTPException):
+        status = error.status_code
+    return status is not None and 400 <= status < 500 and status != 429
+
+
+# =========================
+# Salud por proveedor (latencia + circuit breaker)
+# =========================
+class ProviderHealth:
+    """
+    closed: tráfico normal. open: se salta el proveedor durante BREAKER_COOLDOWN.
+    half_open: deja pasar una sola llamada de prueba; si va bien se cierra.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+        self._latencies: deque[float] = deque(maxlen=200)
+        self._outcomes: deque[bool] = deque(maxlen=BREAKER_WINDOW)
+        self.successes = 0
+        self.failures = 0
+
+    def allow(self) -> bool:
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < BREAKER_COOLDOWN:
+                return False
+            self.state = "half_open"
+            self._probe_in_flight = False
+            logging.info(f"[PROVIDER][{self.name}] Breaker half-open")
+        if self.state == "half_open":
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+        return True
+
+    def _trip(self):
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self._probe_in_flight = False
+        logging.warning(f"[PROVIDER][{self.name}] Breaker open")
+
+    def record_success(self, latency: float):
+        self.successes += 1
+        self._latencies.append(latency)
+        self._outcomes.append(True)
+        self.consecutive_failures = 0
+        if self.state == "half_open":
+            self.state = "closed"
+            self._probe_in_flight = False
+            logging.info(f"[PROVIDER][{self.name}] Breaker closed")
+
+    def record_failure(self):
+        self.failures += 1
+        self._outcomes.append(False)
+        self.consecutive_failures += 1
+        if self.state == "half_open":
+            self._trip()
+        elif self.state == "closed" and (
+            self.consecutive_failures >= BREAKER_CONSECUTIVE_FAILURES
+            or (len(self._outcomes) >= BREAKER_WINDOW // 2 and self.error_rate() >= BREAKER_ERROR_RATE)
+        ):
+            self._trip()
+
+    def record_abandoned(self):
+        """Cancelada (perdió el hedge) o rechazada localmente: no cuenta."""
+        if self.state == "half_open":
+            self._probe_in_flight = False
+
+    def error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    def p95(self) -> float | None:
+        if len(self._latencies) < PROVIDER_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    def stats(self) -> dict:
+        ordered = sorted(self._latencies)
+        return {
+            "state": self.state,
+            "successes": self.successes,
+            "failures": self.failures,
+            "error_rate": round(self.error_rate(), 3),
+            "p50_s": round(ordered[len(ordered) // 2], 2) if ordered else None,
+            "p95_s": round(ordered[int(0.95 * (len(ordered) - 1))], 2) if ordered else None,
+        }
+
+
+class Provider:
+    def __init__(
+        self,
+        name: str,
+        call: Callable[[dict], Awaitable[str | None]],
+        available: Callable[[], bool] = lambda: True,
+    ):
+        self.name = name
+        self.call = call
+        self.available = available
+        self.health = ProviderHealth(name)
+
+
+# =========================
+# Router
+# =========================
+class ProviderRouter:
+    """
+    Prueba los proveedores en orden de prioridad, saltando los que tienen el
+    breaker abierto. Si falla uno pasa al siguiente. Con hedging, si el
+    primero supera su p95 sin responder se lanza el siguiente en paralelo y
+    gana el primero que devuelva imagen; el otro se cancela.
+    """
+
+    def __init__(self, name: str, providers: list[Provider], hedging: bool = PROVIDER_HEDGING):
+        self.name = name
+        self.providers = providers
+        self.hedging = hedging
+        self.hedges = 0
+
+    async def _attempt(self, provider: Provider, request: dict) -> str:
+        start = time.monotonic()
+        emit("generation_started", provider=provider.name)
+        try:
+            result = await provider.call(request)
+        except asyncio.CancelledError:
+            provider.health.record_abandoned()
+            raise
+        except Exception as e:
+            # 503 de admission: es carga local, no un proveedor enfermo;
+            # 4xx del cliente: el proveedor está bien, la petición no
+            if (isinstance(e, HTTPException) and e.status_code == 503) or is_client_error(e):
+                provider.health.record_abandoned()
+            else:
+                provider.health.record_failure()
+            raise
+        if not result:
+            provider.health.record_failure()
+            raise ProviderError(f"{provider.name} returned no image")
+        provider.health.record_success(time.monotonic() - start)
+        return result
+
+    def _hedge_delay(self, provider: Provider) -> float | None:
+        p95 = provider.health.p95()
+        return max(p95, PROVIDER_HEDGE_MIN_DELAY) if p95 is not None else None
+
+    async def run(self, **request) -> str:
+        """Devuelve la imagen en base64 del primer proveedor que responda."""
+        candidates = iter(p for p in self.providers if p.available())
+        running: dict[asyncio.Task, Provider] = {}
+        errors: list[BaseException] = []
+        hedged = False
+
+        def start_next() -> bool:
+            for provider in candidates:
+                if provider.health.allow():
+                    task = asyncio.create_task(self._attempt(provider, request))
+                    running[task] = provider
+                    return True
+            return False
+
+        if not start_next():
+            raise HTTPException(status_code=503, detail=f"No healthy provider for {self.name}")
+
+        try:
+            while running:
+                timeout = None
+                if self.hedging and not hedged and len(running) == 1:
+                    timeout = self._hedge_delay(next(iter(running.values())))
+
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    if start_next():
+                        self.hedges += 1
+                        logging.info(f"[PROVIDER][{self.name}] Hedging after p95")
+                    continue
+
+                for task in done:
+                    provider = running.pop(task)
+                    if task.exception() is None:
+                        logging.info(f"[PROVIDER][{self.name}] Served by {provider.name}")
+                        return task.result()
+                    if is_client_error(task.exception()):
+                        raise task.exception()
+                    errors.append(task.exception())
+                    logging.warning(f"[PROVIDER][{self.name}] {provider.name} failed: {task.exception()}")
+
+                if not running:
+                    start_next()
+        finally:
+            for task in running:
+                task.cancel()
+
+        raise errors[-1]
+
+    def stats(self) -> dict:
+        return {
+            "hedging": self.hedging,
+            "hedges": self.hedges,
+            "providers": {p.name: p.health.stats() for p in self.providers},
+        }
+
+
+_routers: list[ProviderRouter] = []
+
+
+def register_router(router: ProviderRouter) -> ProviderRouter:
+    _routers.append(router)
+    return router
+
+
+def provider_stats() -> dict:
+    return {r.name: r.stats() for r in _routers}
@@ -0,0 +1,233 @@
+# utils/recommendation_cache.py
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import logging
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+
+# =========================
+# Config
+# =========================
+RECOMMENDATION_CACHE_SIZE = int(os.getenv("RECOMMENDATION_CACHE_SIZE", "2048"))  # claves en memoria
+RECOMMENDATION_CACHE_VARIANTS = int(os.getenv("RECOMMENDATION_CACHE_VARIANTS", "4"))
+RECOMMENDATION_CACHE_TTL = float(os.getenv("RECOMMENDATION_CACHE_TTL", str(14 * 24 * 3600)))
+RECOMMENDATION_CACHE_DB = os.getenv("RECOMMENDATION_CACHE_DB")  # necesario para el warm-up offline
+# Contadores de demanda en memoria (estilo y colores son texto libre: sin tope crecería sin fin)
+RECOMMENDATION_DEMAND_KEYS = int(os.getenv("RECOMMENDATION_DEMAND_KEYS", "10000"))
+
+_GENDERS = {"male": "male", "man": "male", "hombre": "male", "female": "female", "woman": "female", "mujer": "female"}
+_FIELDS = ("lines", "gender", "style", "occasion", "climate", "colors")
+
+
+def _norm(value: str) -> str:
+    value = unicodedata.normalize("NFKD", value or "").encode("ascii", "ignore").decode()
+    return " ".join(value.casefold().split())
+
+
+def normalize_profile(profile: dict) -> dict:
+    """
+    Valores de los desplegables normalizados: minúsculas, sin tildes ni
+    espacios de más; los colores como conjunto ordenado.
+    """
+    colors = {_norm(c) for c in re.split(r",|/|;|\by\b|\band\b", profile.get("colors") or "")}
+    gender = _norm(profile.get("gender"))
+    return {
+        "lines": profile.get("lines", ""),
+        "gender": _GENDERS.get(gender, gender),
+        "style": _norm(profile.get("style")),
+        "occasion": _norm(profile.get("occasion")),
+        "climate": _norm(profile.get("climate")),
+        "colors": ", ".join(sorted(c for c in colors if c)),
+    }
+
+
+def recommendation_key(profile: dict) -> str:
+    """Clave legible y reversible (el warm-up reconstruye el perfil desde ella)."""
+    normalized = normalize_profile(profile)
+    return json.dumps([normalized[f] for f in _FIELDS], ensure_ascii=False)
+
+
+def profile_from_key(key: str) -> dict:
+    return dict(zip(_FIELDS, json.loads(key)))
+
+
+# =========================
+# Cache
+# =========================
+class RecommendationCache:
+    """
+    Recomendaciones del estilista por perfil normalizado. Cada clave guarda
+    hasta 'variants' outfits distintos y se sirve uno al azar, para que dos
+    usuarios con el mismo formulario no vean siempre el mismo texto.
+    - memoria: LRU acotado por número de claves
+    - disco (opcional): SQLite con TTL, compartido con el comando de warm-up,
+      que además registra la demanda por clave para saber qué precalcular.
+    """
+
+    def __init__(
+        self,
+        max_keys: int = RECOMMENDATION_CACHE_SIZE,
+        variants: int = RECOMMENDATION_CACHE_VARIANTS,
+        ttl: float = RECOMMENDATION_CACHE_TTL,
+        db_path: str | None = RECOMMENDATION_CACHE_DB,
+        max_demand_keys: int = RECOMMENDATION_DEMAND_KEYS,
+    ):
+        self.max_keys = max_keys
+        self.max_demand_keys = max_demand_keys
+        self.variants = variants
+        self.ttl = ttl
+        self._memory: OrderedDict[str, list[tuple[float, dict]]] = OrderedDict()
+        self._demand: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS recommendations ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " key TEXT NOT NULL,"
+                " outfit TEXT NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_recommendations_key ON recommendations (key)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS recommendation_demand ("
+                " key TEXT PRIMARY KEY,"
+                " requests INTEGER NOT NULL,"
+                " last_at REAL NOT NULL)"
+            )
+            self._db.commit()
+            logging.info(f"[RECOMMENDATION-CACHE] Disk tier at {db_path}")
+
+    # -------------------------
+    # Sync API
+    # -------------------------
+    def get(self, key: str, count: bool = True) -> tuple[dict | None, int]:
+        """Devuelve (variante al azar o None, nº de variantes vigentes)."""
+        now = time.time()
+        with self._lock:
+            if count:
+                self._count(key, now)
+            variants = self._load(key, now)
+            if not variants:
+                self.misses += 1
+                return None, 0
+            self.hits += 1
+            return random.choice(variants)[1], len(variants)
+
+    def put(self, key: str, outfit: dict):
+        now = time.time()
+        with self._lock:
+            variants = self._load(key, now)
+            if any(v["recommendation"] == outfit["recommendation"] for _, v in variants):
+                return
+            variants.append((now, outfit))
+            del variants[:-self.variants]  # se queda con las más nuevas
+            self._remember(key, variants)
+
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT INTO recommendations (key, outfit, created_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(outfit, ensure_ascii=False), now),
+                )
+                self._db.execute(
+                    "DELETE FROM recommendations WHERE key = ? AND id NOT IN ("
+                    " SELECT id FROM recommendations WHERE key = ? ORDER BY created_at DESC LIMIT ?)",
+                    (key, key, self.variants),
+                )
+                self._db.commit()
+
+    def top_keys(self, limit: int) -> list[str]:
+        """Claves más pedidas (disco si hay, si no las de este proceso)."""
+        with self._lock:
+            if self._db is not None:
+                rows = self._db.execute(
+                    "SELECT key FROM recommendation_demand ORDER BY requests DESC LIMIT ?", (limit,)
+                ).fetchall()
+                return [row[0] for row in rows]
+            return sorted(self._demand, key=self._demand.get, reverse=True)[:limit]
+
+    def purge(self):
+        """Borra del disco las variantes vencidas."""
+        if self._db is None:
+            return
+        with self._lock:
+            self._db.execute("DELETE FROM recommendations WHERE created_at < ?", (time.time() - self.ttl,))
+            self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "memory_keys": len(self._memory),
+                "demand_keys": len(self._demand),
+                "variants_per_key": self.variants,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "disk_enabled": self._db is not None,
+            }
+
+    # -------------------------
+    # Async API (no bloquea el event loop con SQLite)
+    # -------------------------
+    async def aget(self, key: str) -> tuple[dict | None, int]:
+        if self._db is None:
+            return self.get(key)
+        return await asyncio.to_thread(self.get, key)
+
+    async def aput(self, key: str, outfit: dict):
+        if self._db is None:
+            return self.put(key, outfit)
+        await asyncio.to_thread(self.put, key, outfit)
+
+    # -------------------------
+    # Internals
+    # -------------------------
+    def _load(self, key: str, now: float) -> list[tuple[float, dict]]:
+        variants = self._memory.get(key) or []
+        # claves incompletas se releen: el warm-up puede haber escrito variantes nuevas
+        if len(variants) < self.variants and self._db is not None:
+            rows = self._db.execute(
+                "SELECT created_at, outfit FROM recommendations WHERE key = ? ORDER BY created_at",
+                (key,),
+            ).fetchall()
+            variants = [(created_at, json.loads(outfit)) for created_at, outfit in rows]
+        variants = [v for v in variants if now - v[0] <= self.ttl]
+        if variants or key in self._memory:
+            self._remember(key, variants)
+        return variants
+
+    def _remember(self, key: str, variants: list[tuple[float, dict]]):
+        self._memory[key] = variants
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_keys:
+            self._memory.popitem(last=False)
+
+    def _count(self, key: str, now: float):
+        self._demand[key] = self._demand.get(key, 0) + 1
+        if len(self._demand) > self.max_demand_keys:
+            # se quedan las más pedidas (la mitad del tope), como el top de SQLite
+            top = sorted(self._demand.items(), key=lambda item: item[1], reverse=True)
+            self._demand = dict(top[:max(1, self.max_demand_keys // 2)])
+        if self._db is not None:
+            self._db.execute(
+                "INSERT INTO recommendation_demand (key, requests, last_at) VALUES (?, 1, ?)"
+                " ON CONFLICT(key) DO UPDATE SET requests = requests + 1, last_at = excluded.last_at",
+                (key, now),
+            )
+            self._db.commit()
+
+
+recommendation_cache = RecommendationCache()
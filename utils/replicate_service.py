@@ -1,36 +1,156 @@
 # utils/replicate_service.py
 import os
-import replicate
-import requests
+import asyncio
 import base64
-import traceback
+import logging
+from fastapi import HTTPException
+from utils.admission import limited
+from utils.upstream import get_replicate_client, get_http_client
+from utils.image_ingest import image_mime
+from utils.result_store import result_store, result_url
 
-# Inicializar cliente con token de entorno
-REPLICATE_API_TOKEN = os.getenv("REPLICATE_API_TOKEN")
-replicate_client = replicate.Client(api_token=REPLICATE_API_TOKEN)
+# =========================
+# Config
+# =========================
+REPLICATE_GENERATE_MODEL = os.getenv("REPLICATE_GENERATE_MODEL", "stability-ai/stable-diffusion-3.5-medium")
+REPLICATE_EDIT_MODEL = os.getenv("REPLICATE_EDIT_MODEL", "black-forest-labs/flux-kontext-pro")
+REPLICATE_POLL_INTERVAL = float(os.getenv("REPLICATE_POLL_INTERVAL", "1"))
+REPLICATE_TIMEOUT = float(os.getenv("REPLICATE_TIMEOUT", "180"))
+# output_format que acepta el modelo de edición; lo demás (p. ej. webp) sale en png
+REPLICATE_EDIT_FORMATS = {"png": "png", "jpeg": "jpg", "jpg": "jpg"}
 
-async def replicate_generate_image(prompt: str, width=512, height=512):
+_TERMINAL = ("succeeded", "failed", "canceled")
+
+
+# =========================
+# Predicciones
+# =========================
+async def _cancel_prediction(prediction):
     try:
-        # Ejecuta el modelo Stable Diffusion
-        output_urls = replicate_client.run(
-            "stability-ai/stable-diffusion-3.5-medium",
-            input={"prompt": prompt, "width": width, "height": height}
-        )
+        await prediction.async_cancel()
+        logging.info(f"[REPLICATE] Prediction {prediction.id} canceled")
+    except Exception as e:
+        logging.warning(f"[REPLICATE] Could not cancel {prediction.id}: {e}")
 
-        if not output_urls or len(output_urls) == 0:
-            return None
 
-        # Descargar la primera imagen resultante
-        image_url = output_urls[0]
-        resp = requests.get(image_url)
-        if resp.status_code != 200:
+async def _wait_prediction(prediction):
+    while prediction.status not in _TERMINAL:
+        await asyncio.sleep(REPLICATE_POLL_INTERVAL)
+        await prediction.async_reload()
+
+
+async def run_prediction(model: str, input: dict) -> str | None:
+    """
+    Crea la predicción y hace polling con el cliente async compartido.
+    Si el llamador se cancela (cliente desconectado) o vence REPLICATE_TIMEOUT
+    la predicción se cancela también en Replicate, para no pagar GPU de más.
+    Devuelve la URL de la primera salida.
+    """
+    client = get_replicate_client()
+    if client is None:
+        return None
+
+    prediction = await client.predictions.async_create(model=model, input=input)
+    try:
+        await asyncio.wait_for(_wait_prediction(prediction), REPLICATE_TIMEOUT)
+    except (asyncio.CancelledError, asyncio.TimeoutError):
+        if prediction.status not in _TERMINAL:
+            # shield: la cancelación en Replicate termina aunque esta tarea ya esté cancelada
+            await asyncio.shield(asyncio.create_task(_cancel_prediction(prediction)))
+        raise
+
+    if prediction.status != "succeeded":
+        logging.warning(f"[REPLICATE] {model} {prediction.status}: {prediction.error}")
+        return None
+
+    output = prediction.output
+    if not output:
+        return None
+    return output if isinstance(output, str) else output[0]
+
+
+# =========================
+# Descarga en streaming
+# =========================
+async def download_to_store(url: str) -> str:
+    """Vuelca la salida al result store sin tenerla entera en memoria."""
+    async with get_http_client().stream("GET", url) as resp:
+        resp.raise_for_status()
+        mime = resp.headers.get("content-type", "image/png").split(";")[0]
+        return await result_store.aput_stream(resp.aiter_bytes(), mime)
+
+
+async def download_bytes(url: str) -> bytes:
+    async with get_http_client().stream("GET", url) as resp:
+        resp.raise_for_status()
+        data = bytearray()
+        async for chunk in resp.aiter_bytes():
+            data += chunk
+        return bytes(data)
+
+
+# =========================
+# API
+# =========================
+async def replicate_generate_image_url(prompt: str, width=512, height=512) -> str | None:
+    """Texto -> imagen. Devuelve la URL en el result store o None."""
+    try:
+        image_url = await limited("replicate", REPLICATE_GENERATE_MODEL, run_prediction(
+            REPLICATE_GENERATE_MODEL,
+            {"prompt": prompt, "width": width, "height": height}
+        ))
+        if not image_url:
             return None
+        return result_url(await download_to_store(image_url))
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print("⚠️ Replicate image error:", e)
+        return None
+
 
-        image_bytes = resp.content
-        image_b64 = "data:image/png;base64," + base64.b64encode(image_bytes).decode()
-        return image_b64
+async def replicate_generate_image(prompt: str, width=512, height=512):
+    """Igual que replicate_generate_image_url pero como data URL (contrato original)."""
+    try:
+        image_url = await limited("replicate", REPLICATE_GENERATE_MODEL, run_prediction(
+            REPLICATE_GENERATE_MODEL,
+            {"prompt": prompt, "width": width, "height": height}
+        ))
+        if not image_url:
+            return None
+        return "data:image/png;base64," + base64.b64encode(await download_bytes(image_url)).decode()
 
+    except HTTPException:
+        raise
     except Exception as e:
         print("⚠️ Replicate image error:", e)
-        print(traceback.format_exc())
+        return None
+
+
+async def replicate_edit_image(image_bytes: bytes, prompt: str, output_format: str = "png"):
+    """
+    Edición imagen + prompt (fallback del try-on). Devuelve la imagen en base64
+    sin prefijo data:, o None si Replicate no está configurado o falla.
+    La descarga llega en streaming; el base64 (contrato del router de
+    proveedores) se codifica fuera del event loop.
+    """
+    if get_replicate_client() is None:
+        return None
+
+    try:
+        image_uri = f"data:{image_mime()};base64," + base64.b64encode(image_bytes).decode()
+        image_url = await limited("replicate", REPLICATE_EDIT_MODEL, run_prediction(
+            REPLICATE_EDIT_MODEL,
+            {"prompt": prompt, "input_image": image_uri, "output_format": REPLICATE_EDIT_FORMATS.get(output_format, "png")}
+        ))
+        if not image_url:
+            return None
+        data = await download_bytes(image_url)
+        return await asyncio.to_thread(lambda: base64.b64encode(data).decode())
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print("⚠️ Replicate edit error:", e)
         return None
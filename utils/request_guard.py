@@ -0,0 +1,84 @@
+# utils/request_guard.py
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime
+from fastapi import Header, HTTPException, Request
+
+# =========================
+# Config
+# =========================
+# Deadline por defecto si el cliente no manda X-Request-Deadline (0 = sin límite)
+REQUEST_DEADLINE_DEFAULT = float(os.getenv("REQUEST_DEADLINE_DEFAULT", "0"))
+REQUEST_DEADLINE_MAX = float(os.getenv("REQUEST_DEADLINE_MAX", "300"))
+DISCONNECT_POLL_INTERVAL = float(os.getenv("DISCONNECT_POLL_INTERVAL", "0.5"))
+
+
+def parse_deadline(value: str | None) -> float | None:
+    """
+    X-Request-Deadline -> segundos que quedan. Acepta un presupuesto relativo
+    en segundos ("25"), un timestamp Unix absoluto en s o ms, o una fecha ISO 8601.
+    """
+    if not value:
+        return REQUEST_DEADLINE_DEFAULT or None
+    value = value.strip()
+    try:
+        number = float(value)
+    except ValueError:
+        try:
+            number = datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid X-Request-Deadline header")
+    if number > 1e12:  # epoch en milisegundos
+        number /= 1000
+    if number > 1e9:  # epoch en segundos
+        number -= time.time()
+    return min(number, REQUEST_DEADLINE_MAX)
+
+
+class RequestGuard:
+    """
+    Ejecuta el trabajo de un endpoint como tarea propia y la cancela si el
+    cliente se desconecta o vence su deadline. La cancelación baja hasta las
+    llamadas upstream (httpx aborta la petición) y libera el slot de admission
+    o el puesto en su cola; el trabajo compartido vía single-flight solo se
+    cancela si nadie más lo espera.
+    """
+
+    def __init__(self, request: Request, timeout: float | None):
+        self.request = request
+        self.timeout = timeout
+        self.name = request.url.path
+
+    async def _wait_disconnect(self):
+        while not await self.request.is_disconnected():
+            await asyncio.sleep(DISCONNECT_POLL_INTERVAL)
+
+    async def run(self, coro):
+        if self.timeout is not None and self.timeout <= 0:
+            coro.close()
+            raise HTTPException(status_code=504, detail="Request deadline already expired")
+
+        work = asyncio.create_task(coro)
+        watcher = asyncio.create_task(self._wait_disconnect())
+        try:
+            done, _ = await asyncio.wait({work, watcher}, timeout=self.timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            watcher.cancel()
+            if not work.done():
+                work.cancel()
+                await asyncio.gather(work, return_exceptions=True)
+
+        if work in done:
+            return work.result()
+        if watcher in done:
+            logging.info(f"[REQUEST-GUARD] Client disconnected, canceled {self.name}")
+            # nadie va a leer la respuesta; 499 como en nginx, para los logs
+            raise HTTPException(status_code=499, detail="Client closed request")
+        logging.info(f"[REQUEST-GUARD] Deadline exceeded ({self.timeout:.1f}s), canceled {self.name}")
+        raise HTTPException(status_code=504, detail="Request deadline exceeded")
+
+
+def request_guard(request: Request, x_request_deadline: str | None = Header(None)) -> RequestGuard:
+    return RequestGuard(request, parse_deadline(x_request_deadline))
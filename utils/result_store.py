@@ -0,0 +1,164 @@
+# utils/result_store.py
+import os
+import uuid
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import AsyncIterator
+
+# =========================
+# Config
+# =========================
+RESULT_STORE_DIR = os.getenv("RESULT_STORE_DIR", "results")
+RESULT_STORE_MAX_BYTES = int(os.getenv("RESULT_STORE_MAX_BYTES", str(2 * 1024 ** 3)))
+# Si hay nginx delante: location interna que sirve RESULT_STORE_DIR (X-Accel-Redirect)
+RESULT_STORE_ACCEL_PREFIX = os.getenv("RESULT_STORE_ACCEL_PREFIX", "")
+RESULT_URL_PREFIX = os.getenv("RESULT_URL_PREFIX", "/api/results")
+
+_EXTENSIONS = {"image/png": "png", "image/webp": "webp", "image/jpeg": "jpg"}
+MIME_BY_EXTENSION = {ext: mime for mime, ext in _EXTENSIONS.items()}
+
+
+class ResultStore:
+    """
+    Blobs direccionados por contenido: nombre = sha256 + extensión, en
+    subdirectorios por los 2 primeros caracteres del hash. El mismo resultado
+    se guarda una sola vez; al pasar de max_bytes se borran los menos usados.
+    """
+
+    def __init__(self, root: str = RESULT_STORE_DIR, max_bytes: int = RESULT_STORE_MAX_BYTES):
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, int] = OrderedDict()  # nombre -> tamaño (orden LRU)
+        self._total = 0
+        self._loaded = False
+
+    def _load(self):
+        """Reconstruye el índice LRU desde disco (orden por mtime)."""
+        found = []
+        if os.path.isdir(self.root):
+            for shard in os.scandir(self.root):
+                if not shard.is_dir():
+                    continue
+                for entry in os.scandir(shard.path):
+                    if entry.name.startswith("."):
+                        continue
+                    stat = entry.stat()
+                    found.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, name, size in sorted(found):
+            self._entries[name] = size
+            self._total += size
+        self._loaded = True
+        logging.info(f"[RESULT-STORE] {len(self._entries)} blobs, {self._total / 1e6:.1f} MB in {self.root}")
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.root, name[:2], name)
+
+    def _tmp_path(self) -> str:
+        os.makedirs(self.root, exist_ok=True)
+        return os.path.join(self.root, f".{uuid.uuid4().hex}.tmp")
+
+    def _commit(self, tmp: str, name: str, size: int) -> str:
+        """Mueve el temporal a su nombre definitivo (o lo descarta si ya existía)."""
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            exists = name in self._entries
+            if exists:
+                self._entries.move_to_end(name)
+        if exists:
+            os.remove(tmp)
+            return name
+
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp, path)  # atómico: nunca se sirve un archivo a medias
+
+        with self._lock:
+            if name not in self._entries:
+                self._entries[name] = size
+                self._total += size
+            self._evict()
+        return name
+
+    def put(self, data: bytes, mime: str) -> str:
+        name = f"{hashlib.sha256(data).hexdigest()}.{_EXTENSIONS.get(mime, 'bin')}"
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            if name in self._entries:
+                self._entries.move_to_end(name)
+                return name
+
+        tmp = self._tmp_path()
+        with open(tmp, "wb") as f:
+            f.write(data)
+        return self._commit(tmp, name, len(data))
+
+    def touch(self, name: str) -> bool:
+        """Marca el blob como usado. False si no existe."""
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            if name not in self._entries:
+                return False
+            self._entries.move_to_end(name)
+        try:
+            os.utime(self.path(name))  # conserva el orden LRU entre reinicios
+        except OSError:
+            pass
+        return True
+
+    def _evict(self):
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            name, size = self._entries.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(self.path(name))
+            except FileNotFoundError:
+                pass
+
+    async def aput(self, data: bytes, mime: str) -> str:
+        return await asyncio.to_thread(self.put, data, mime)
+
+    async def aput_stream(self, chunks: AsyncIterator[bytes], mime: str) -> str:
+        """
+        Escribe un stream (p. ej. la descarga de un proveedor) calculando el
+        hash al vuelo: la imagen nunca está entera en memoria.
+        """
+        tmp = await asyncio.to_thread(self._tmp_path)
+        digest = hashlib.sha256()
+        size = 0
+        f = await asyncio.to_thread(open, tmp, "wb")
+        try:
+            async for chunk in chunks:
+                digest.update(chunk)
+                size += len(chunk)
+                await asyncio.to_thread(f.write, chunk)
+        except BaseException:
+            f.close()
+            os.remove(tmp)
+            raise
+        f.close()
+        name = f"{digest.hexdigest()}.{_EXTENSIONS.get(mime, 'bin')}"
+        return await asyncio.to_thread(self._commit, tmp, name, size)
+
+    async def atouch(self, name: str) -> bool:
+        return await asyncio.to_thread(self.touch, name)
+
+    def stats(self) -> dict:
+        return {
+            "items": len(self._entries),
+            "bytes": self._total,
+            "max_bytes": self.max_bytes,
+        }
+
+
+result_store = ResultStore()
+
+
+def result_url(name: str) -> str:
+    return f"{RESULT_URL_PREFIX}/{name}"
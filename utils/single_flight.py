@@ -0,0 +1,204 @@
+# utils/single_flight.py
+import os
+import time
+import asyncio
+import hashlib
+import logging
+from io import BytesIO
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+from fastapi import HTTPException, UploadFile
+from utils.admission import limited
+
+# =========================
+# Config
+# =========================
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "120"))
+IDEMPOTENCY_MAX_ITEMS = int(os.getenv("IDEMPOTENCY_MAX_ITEMS", "200"))  # resultados con imagen: pocos
+
+
+class KeyReuseError(Exception):
+    """La clave ya se usó (en vuelo o recordada) con otra huella de entrada."""
+
+    def __init__(self, key: str, in_flight: bool):
+        super().__init__(f"key {key[:12]} reused with different inputs")
+        self.in_flight = in_flight
+
+
+class _Call:
+    def __init__(self, task: asyncio.Task, fingerprint: str | None = None):
+        self.task = task
+        self.fingerprint = fingerprint
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesce llamadas idénticas en vuelo: la primera crea la tarea, las
+    siguientes con la misma clave esperan ese mismo resultado (o excepción).
+    Si todos los que esperan se cancelan, la tarea compartida se cancela.
+    Con replay_ttl > 0 además recuerda resultados terminados durante ese tiempo.
+    Con fingerprint, reusar la clave con otras entradas lanza KeyReuseError
+    en vez de devolver el resultado de otra petición.
+    """
+
+    def __init__(self, name: str, replay_ttl: float = 0, max_replay: int = 0):
+        self.name = name
+        self.replay_ttl = replay_ttl
+        self.max_replay = max_replay
+        self._calls: dict[str, _Call] = {}
+        self._done: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self.calls = 0
+        self.coalesced = 0
+        self.replayed = 0
+
+    def _replay(self, key: str):
+        entry = self._done.get(key)
+        if entry is None:
+            return None
+        expires_at = entry[0]
+        if expires_at < time.monotonic():
+            del self._done[key]
+            return None
+        return entry
+
+    def _remember(self, key: str, value: Any, fingerprint: str | None):
+        self._done[key] = (time.monotonic() + self.replay_ttl, value, fingerprint)
+        self._done.move_to_end(key)
+        while len(self._done) > self.max_replay:
+            self._done.popitem(last=False)
+
+    async def _run(self, key: str, factory: Callable[[], Awaitable[Any]], fingerprint: str | None):
+        try:
+            value = await factory()
+            if self.replay_ttl > 0:
+                self._remember(key, value, fingerprint)
+            return value
+        finally:
+            # solo si sigue siendo la llamada registrada (no un reintento posterior)
+            call = self._calls.get(key)
+            if call is not None and call.task is asyncio.current_task():
+                del self._calls[key]
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]], fingerprint: str | None = None):
+        if self.replay_ttl > 0:
+            entry = self._replay(key)
+            if entry is not None:
+                if entry[2] != fingerprint:
+                    raise KeyReuseError(key, in_flight=False)
+                self.replayed += 1
+                return entry[1]
+
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.create_task(self._run(key, factory, fingerprint)), fingerprint)
+            self._calls[key] = call
+            self.calls += 1
+        elif call.fingerprint != fingerprint:
+            raise KeyReuseError(key, in_flight=True)
+        else:
+            self.coalesced += 1
+            logging.info(f"[SINGLE-FLIGHT][{self.name}] Joined in-flight call {key[:12]}")
+
+        call.waiters += 1
+        try:
+            # shield: cancelar a un cliente no cancela el trabajo de los demás
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+                # fuera ya: un reintento no debe unirse a una tarea que se está cancelando
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._calls),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "replayed": self.replayed,
+        }
+
+
+def flight_key(*parts: bytes | str | None) -> str:
+    """sha256 de las partes, con longitud como separador (sin ambigüedades)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        data = part if isinstance(part, bytes) else str(part).encode("utf-8")
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+image_edit_flight = SingleFlight("image-edit")
+garment_analysis_flight = SingleFlight("garment-analysis")
+base_image_flight = SingleFlight("base-image")
+idempotency_flight = SingleFlight("idempotency", replay_ttl=IDEMPOTENCY_TTL, max_replay=IDEMPOTENCY_MAX_ITEMS)
+
+
+# =========================
+# Helpers
+# =========================
+def upload_bytes(image) -> bytes:
+    if isinstance(image, tuple):  # (filename, bytes, mime)
+        return image[1]
+    if isinstance(image, BytesIO):
+        return image.getvalue()
+    return image
+
+
+async def coalesced_image_edit(client, **kwargs):
+    """
+    client.images.edit compartido entre peticiones idénticas en vuelo.
+    Clave: imagen ya normalizada + prompt + modelo + parámetros de salida.
+    """
+    key = flight_key(
+        kwargs.get("model"), kwargs.get("prompt"), kwargs.get("size"),
+        kwargs.get("output_format"), upload_bytes(kwargs["image"]),
+    )
+    return await image_edit_flight.do(
+        key, lambda: limited("openai", kwargs.get("model"), client.images.edit(**kwargs))
+    )
+
+
+async def request_fingerprint(*inputs) -> str:
+    """
+    Huella de las entradas de una petición: archivos subidos (se leen y se
+    rebobinan), handles de imagen base, bytes, strings y listas de ellos.
+    """
+    parts = []
+    for value in inputs:
+        if isinstance(value, (list, tuple)):
+            parts.append(await request_fingerprint(*value))
+        elif isinstance(value, UploadFile):
+            parts.append(await value.read())
+            await value.seek(0)
+        elif hasattr(value, "handle"):  # BaseImageRef
+            parts.append(f"handle:{value.handle}")
+        else:
+            parts.append(value)
+    return flight_key(*parts)
+
+
+async def idempotent(idempotency_key: str | None, kind: str, factory: Callable[[], Awaitable[Any]], inputs: tuple = ()):
+    """
+    Con header Idempotency-Key: los reintentos se unen a la petición en vuelo
+    o reciben el resultado ya terminado durante IDEMPOTENCY_TTL segundos.
+    Reusar la clave con otras entradas (inputs) es un error del cliente:
+    409 si la primera sigue en curso, 422 si ya terminó.
+    """
+    if not idempotency_key:
+        return await factory()
+    fingerprint = await request_fingerprint(*inputs)
+    try:
+        return await idempotency_flight.do(f"{kind}:{idempotency_key}", factory, fingerprint)
+    except KeyReuseError as e:
+        raise HTTPException(
+            status_code=409 if e.in_flight else 422,
+            detail="Idempotency-Key already used with a different request",
+        )
+
+
+def single_flight_stats() -> dict:
+    return {f.name: f.stats() for f in (image_edit_flight, garment_analysis_flight, base_image_flight, idempotency_flight)}
@@ -0,0 +1,201 @@
+# utils/stylist.py
+import os
+import json
+import asyncio
+import logging
+import contextvars
+from openai import AsyncOpenAI
+from utils.admission import limited, mark_background
+from utils.progress import emit
+from utils.recommendation_cache import recommendation_cache, recommendation_key
+
+# =========================
+# Config
+# =========================
+STYLIST_MODEL = os.getenv("STYLIST_MODEL", "gpt-4.1-mini")
+STYLIST_MAX_TOKENS = int(os.getenv("STYLIST_MAX_TOKENS", "200"))
+
+# Salida estructurada: "recommendation" va primero para poder arrancar la
+# imagen en cuanto se cierra, mientras todavía llega la lista de prendas.
+OUTFIT_SCHEMA = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "outfit",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "recommendation": {"type": "string"},
+                "prendas": {"type": "array", "items": {"type": "string"}},
+            },
+            "required": ["recommendation", "prendas"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+
+def stylist_prompt(profile: dict) -> str:
+    return f"""
+Eres un estilista profesional.
+
+Perfil del usuario:
+- Género: {profile["gender"]}
+- Estilo: {profile["style"]}
+- Ocasión: {profile["occasion"]}
+- Clima: {profile["climate"]}
+- Colores preferidos: {profile["colors"]}
+
+En "recommendation" describe UN outfit completo en español de manera concisa ({profile["lines"]} líneas).
+En "prendas" lista las prendas mencionadas, ejemplo: ["vestido", "zapatos", "bolso"]
+"""
+
+
+def partial_string_field(buffer: str, key: str) -> tuple[str, bool] | None:
+    """
+    Valor del campo string 'key' de un JSON que todavía está llegando.
+    Devuelve (texto decodificado hasta ahora, cerrado?) o None si aún no empezó.
+    """
+    start = buffer.find(f'"{key}"')
+    if start < 0:
+        return None
+    i = buffer.find(":", start + len(key) + 2)
+    if i < 0:
+        return None
+    i += 1
+    while i < len(buffer) and buffer[i] in " \t\r\n":
+        i += 1
+    if i >= len(buffer) or buffer[i] != '"':
+        return None
+
+    j = i + 1
+    while j < len(buffer):
+        if buffer[j] == "\\":
+            j += 2
+            continue
+        if buffer[j] == '"':
+            return json.loads(buffer[i:j + 1]), True
+        j += 1
+
+    raw = buffer[i + 1:]
+    # no cortar un escape a medias (\ o \uXXXX incompleto)
+    cut = raw.rfind("\\")
+    if cut >= 0 and (cut == len(raw) - 1 or (raw[cut + 1] == "u" and len(raw) - cut < 6)):
+        raw = raw[:cut]
+    try:
+        return json.loads(f'"{raw}"'), False
+    except ValueError:
+        return None
+
+
+async def _stream_outfit(client: AsyncOpenAI, text_prompt: str, ready: asyncio.Future) -> dict:
+    stream = await client.chat.completions.create(
+        model=STYLIST_MODEL,
+        messages=[
+            {"role": "system", "content": "Eres un estilista profesional. Responde en español."},
+            {"role": "user", "content": text_prompt}
+        ],
+        max_tokens=STYLIST_MAX_TOKENS,
+        response_format=OUTFIT_SCHEMA,
+        stream=True
+    )
+
+    buffer = ""
+    sent = 0
+    async for chunk in stream:
+        if not chunk.choices or not chunk.choices[0].delta.content:
+            continue
+        buffer += chunk.choices[0].delta.content
+        if ready.done():
+            continue
+        field = partial_string_field(buffer, "recommendation")
+        if field is None:
+            continue
+        text, closed = field
+        if len(text) > sent:
+            emit("recommendation_delta", text=text[sent:])
+            sent = len(text)
+        if closed:
+            ready.set_result(text)
+
+    try:
+        outfit = json.loads(buffer)
+        return {"recommendation": outfit["recommendation"].strip(), "prendas": list(outfit["prendas"])}
+    except (ValueError, KeyError, TypeError):
+        # truncado por max_tokens o JSON inválido: se usa lo que llegó del texto
+        logging.warning("[STYLIST] Invalid structured output, using partial recommendation")
+        field = partial_string_field(buffer, "recommendation")
+        return {"recommendation": (field[0] if field else buffer).strip(), "prendas": []}
+
+
+async def generate_outfit(client: AsyncOpenAI, profile: dict, ready: asyncio.Future | None = None) -> dict:
+    """Llama al modelo y guarda el resultado como nueva variante si es válido."""
+    if ready is None:
+        ready = asyncio.get_running_loop().create_future()
+    outfit = await limited("openai", STYLIST_MODEL, _stream_outfit(client, stylist_prompt(profile), ready))
+    if outfit["prendas"]:  # vacío = salida truncada o inválida: no se cachea
+        await recommendation_cache.aput(recommendation_key(profile), outfit)
+    return outfit
+
+
+_refilling: dict[str, asyncio.Task] = {}
+
+
+async def _refill(client: AsyncOpenAI, profile: dict) -> dict:
+    # prioridad de fondo: la variante extra cede los slots al tráfico interactivo
+    mark_background()
+    return await generate_outfit(client, profile)
+
+
+def _schedule_refill(client: AsyncOpenAI, profile: dict, key: str):
+    """Completa las variantes de una clave en segundo plano (una a la vez por clave)."""
+    if key in _refilling:
+        return
+    # contexto limpio: sus eventos no deben llegar al stream del cliente actual
+    task = contextvars.Context().run(asyncio.create_task, _refill(client, profile))
+    _refilling[key] = task
+
+    def done(t: asyncio.Task):
+        _refilling.pop(key, None)
+        if not t.cancelled() and t.exception() is not None:
+            logging.warning(f"[STYLIST] Variant refill failed: {t.exception()}")
+
+    task.add_done_callback(done)
+
+
+async def recommend_outfit(client: AsyncOpenAI, profile: dict, use_cache: bool = True) -> tuple[str, asyncio.Future]:
+    """
+    Recomendación del estilista en streaming. Retorna en cuanto el texto de la
+    recomendación está completo, junto con la tarea que termina de recibir la
+    lista de prendas (await para obtener {"recommendation", "prendas"}).
+    Cada fragmento de texto se emite como 'recommendation_delta'.
+    Con cache: perfiles ya vistos responden al instante con una variante al
+    azar, y si aún faltan variantes se genera otra en segundo plano.
+    """
+    loop = asyncio.get_running_loop()
+    if use_cache:
+        key = recommendation_key(profile)
+        outfit, variants = await recommendation_cache.aget(key)
+        if outfit is not None:
+            if variants < recommendation_cache.variants:
+                _schedule_refill(client, profile, key)
+            emit("recommendation_delta", text=outfit["recommendation"])
+            emit("recommendation", text=outfit["recommendation"], cached=True)
+            done = loop.create_future()
+            done.set_result(outfit)
+            return outfit["recommendation"], done
+
+    ready = loop.create_future()
+    task = asyncio.create_task(generate_outfit(client, profile, ready))
+    try:
+        await asyncio.wait({ready, task}, return_when=asyncio.FIRST_COMPLETED)
+    except BaseException:
+        task.cancel()
+        raise
+
+    if ready.done():
+        recommendation = ready.result().strip()
+    else:
+        recommendation = task.result()["recommendation"]  # propaga el error si falló
+    emit("recommendation", text=recommendation)
+    return recommendation, task
@@ -0,0 +1,155 @@
+# utils/upstream.py
+import os
+import logging
+import httpx
+from openai import AsyncOpenAI
+
+# =========================
+# Config
+# =========================
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "180"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+
+UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT", "120"))
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "100"))
+UPSTREAM_MAX_KEEPALIVE = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "20"))
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "60"))
+UPSTREAM_HTTP2 = os.getenv("UPSTREAM_HTTP2", "1") not in ("0", "false", "no")
+
+CLOUDFLARE_API_KEY = os.getenv("CLOUDFLARE_API_KEY")
+CLOUDFLARE_ACCOUNT_ID = os.getenv("CLOUDFLARE_ACCOUNT_ID")
+REPLICATE_API_TOKEN = os.getenv("REPLICATE_API_TOKEN")
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "models/gemini-1.5-flash")
+
+
+def _http2_available() -> bool:
+    if not UPSTREAM_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logging.warning("[UPSTREAM] h2 not installed, falling back to HTTP/1.1")
+        return False
+    return True
+
+
+def _pool_kwargs(timeout: float) -> dict:
+    return {
+        "timeout": httpx.Timeout(timeout, connect=10.0),
+        "limits": httpx.Limits(
+            max_connections=UPSTREAM_MAX_CONNECTIONS,
+            max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE,
+            keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY,
+        ),
+        "http2": _http2_available(),
+    }
+
+
+# =========================
+# Registry
+# =========================
+class UpstreamClients:
+    """
+    Clientes compartidos (pool + keep-alive) para todos los proveedores.
+    Se crean una vez en el lifespan de la app y se cierran al apagarla,
+    así ninguna petición paga un handshake TLS nuevo.
+    """
+
+    def __init__(self):
+        self.http = httpx.AsyncClient(**_pool_kwargs(UPSTREAM_TIMEOUT))
+
+        self.openai = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            max_retries=OPENAI_MAX_RETRIES,
+            http_client=httpx.AsyncClient(**_pool_kwargs(OPENAI_TIMEOUT)),
+        )
+
+        self.cloudflare = None
+        if CLOUDFLARE_API_KEY and CLOUDFLARE_ACCOUNT_ID:
+            self.cloudflare = httpx.AsyncClient(
+                base_url=f"https://api.cloudflare.com/client/v4/accounts/{CLOUDFLARE_ACCOUNT_ID}",
+                headers={"Authorization": f"Bearer {CLOUDFLARE_API_KEY}"},
+                **_pool_kwargs(UPSTREAM_TIMEOUT),
+            )
+
+        self.replicate = None
+        self._replicate_transport = None
+        if REPLICATE_API_TOKEN:
+            import replicate
+            pool = _pool_kwargs(UPSTREAM_TIMEOUT)
+            # replicate.Client no acepta un httpx.AsyncClient, sí un transport:
+            # el pool de conexiones es nuestro y lo cerramos nosotros
+            self._replicate_transport = httpx.AsyncHTTPTransport(limits=pool["limits"], http2=pool["http2"])
+            self.replicate = replicate.Client(
+                api_token=REPLICATE_API_TOKEN,
+                timeout=pool["timeout"],
+                transport=self._replicate_transport,
+            )
+
+        self.gemini = None
+        if GEMINI_API_KEY:
+            import google.generativeai as genai
+            genai.configure(api_key=GEMINI_API_KEY)
+            self.gemini = genai.GenerativeModel(GEMINI_MODEL)
+
+    async def aclose(self):
+        await self.openai.close()
+        await self.http.aclose()
+        if self.cloudflare is not None:
+            await self.cloudflare.aclose()
+        if self._replicate_transport is not None:
+            await self._replicate_transport.aclose()
+
+
+_upstream: UpstreamClients | None = None
+
+
+async def init_upstream() -> UpstreamClients:
+    global _upstream
+    if _upstream is None:
+        _upstream = UpstreamClients()
+        logging.info("[UPSTREAM] Client registry initialized")
+    return _upstream
+
+
+async def close_upstream():
+    global _upstream
+    if _upstream is not None:
+        await _upstream.aclose()
+        _upstream = None
+        logging.info("[UPSTREAM] Client registry closed")
+
+
+def get_upstream() -> UpstreamClients:
+    """
+    Devuelve el registro activo. Si el lifespan no corrió (scripts, tests)
+    se crea bajo demanda.
+    """
+    global _upstream
+    if _upstream is None:
+        _upstream = UpstreamClients()
+    return _upstream
+
+
+# =========================
+# Dependencies (FastAPI Depends)
+# =========================
+def get_openai_client() -> AsyncOpenAI:
+    return get_upstream().openai
+
+
+def get_http_client() -> httpx.AsyncClient:
+    return get_upstream().http
+
+
+def get_cloudflare_client() -> httpx.AsyncClient | None:
+    return get_upstream().cloudflare
+
+
+def get_replicate_client():
+    return get_upstream().replicate
+
+
+def get_gemini_model():
+    return get_upstream().gemini